@@ -0,0 +1,82 @@
+"""
+Per-render overhead of building chart pages, for growing payloads.
+
+Compares the precompiled page template (Template / render_page) with the chain of
+str.replace calls the server used before, and times a full heatmap render through
+TOOLS (page build, hashing and the file write, fsync off) at each size. The json
+column is json.dumps of the payload alone, the floor both page builders share.
+
+    python bench_templates.py [--sizes 100,300,1000] [--repeat 5]
+
+The size is the side of a square heatmap matrix; the payload size is printed.
+"""
+import argparse
+import html
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SCRATCH = None if 'D3_OUTDIR' in os.environ else tempfile.mkdtemp(prefix='d3-bench-')
+os.environ.setdefault('D3_OUTDIR', SCRATCH or '')
+os.environ.setdefault('D3_DURABILITY', 'none')
+os.environ.setdefault('D3_ASSETS', 'cdn')  # page building is measured, not the vendored libraries
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import mcp_d3_stdio_server as server
+
+
+def legacy_page(title, payload):
+    """Page assembly as it was: to_js_var + script + two replaces over the document."""
+    script = server.to_js_var(payload, 'data') + server.script_heatmap.__wrapped__('data')
+    head, libs = server.asset_tags()
+    return (server.BASE_HTML.replace('{title}', html.escape(title)).replace('{head}', head)
+            .replace('{libs}', libs).replace('{script}', script))
+
+
+def compiled_page(title, payload):
+    return server.render_page(title, server.script_heatmap('data'), payload)
+
+
+def best_ms(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def heatmap(n):
+    return {'xLabels': [f'x{i}' for i in range(n)], 'yLabels': [f'y{i}' for i in range(n)],
+            'values': [[(i * 31 + j * 17) % 997 for j in range(n)] for i in range(n)]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='100,300,1000')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    server.render_cache = server.RenderCache(max_entries=0)
+
+    print(f"{'matrix':>10} {'payload':>10} {'json ms':>8} {'replace ms':>11} {'compiled ms':>12} {'full render ms':>15}")
+    for n in (int(v) for v in args.sizes.split(',')):
+        payload = heatmap(n)
+        assert legacy_page('Bench', payload) == compiled_page('Bench', payload)
+        size = len(server.js_json(payload))
+        encode = best_ms(lambda: json.dumps(payload, ensure_ascii=False), args.repeat)
+        legacy = best_ms(lambda: legacy_page('Bench', payload), args.repeat)
+        compiled = best_ms(lambda: compiled_page('Bench', payload), args.repeat)
+        full = best_ms(lambda: server.TOOLS['heatmap']({'title': 'Bench', 'data': payload}), args.repeat)
+        print(f"{n:>4}x{n:<5} {size / 1e6:>8.2f}MB {encode:>8.2f} {legacy:>11.2f} {compiled:>12.2f} {full:>15.2f}")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    finally:
+        if SCRATCH:
+            shutil.rmtree(SCRATCH, ignore_errors=True)
@@ -0,0 +1,37 @@
+"""
+Download the JavaScript libraries the chart pages use into ./vendor (or D3_VENDOR_DIR),
+so the server can publish them into html-charts/assets/ and pages render offline.
+
+    python fetch_vendor_assets.py [--force]
+
+Run it once on a machine with network access and commit the vendor/ files.
+"""
+import argparse
+import sys
+import urllib.request
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from mcp_d3_stdio_server import VENDOR_DIR, VENDOR_LIBS
+
+
+def fetch(force: bool = False):
+    VENDOR_DIR.mkdir(parents=True, exist_ok=True)
+    for name, (filename, url) in VENDOR_LIBS.items():
+        target = VENDOR_DIR / filename
+        if target.exists() and not force:
+            print(f"{name}: {target} (kept)")
+            continue
+        with urllib.request.urlopen(url, timeout=60) as resp:
+            data = resp.read()
+        tmp = target.with_suffix(target.suffix + '.part')
+        tmp.write_bytes(data)
+        tmp.replace(target)
+        print(f"{name}: {url} -> {target} ({len(data)} bytes)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Vendor the chart JavaScript libraries for offline pages')
+    parser.add_argument('--force', action='store_true', help='download again even if the file exists')
+    fetch(parser.parse_args().force)
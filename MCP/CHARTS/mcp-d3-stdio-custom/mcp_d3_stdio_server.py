@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 """
-Simple STDIO MCP-like server that accepts JSON tool calls on stdin and writes JSON responses to stdout.
+STDIO MCP server that renders D3 charts. It speaks MCP (JSON-RPC: initialize, tools/list,
+tools/call, ping) and the older line protocol of plain {"tool":..., "arguments":...} requests
+on the same stdin, one JSON message per line, and writes one JSON response per line to stdout.
 Saves generated HTML files to ./html-charts and returns the path in the tool response.
 
 Supported D3 chart types (overview):
@@ -47,6 +49,7 @@ If a chart type is unrecognized, the server falls back to a line chart. To expli
 from __future__ import annotations
 import sys
 import json
+import math
 import os
 from pathlib import Path
 from datetime import datetime
@@ -54,10 +57,15 @@ import hashlib
 import html
 import traceback
 import re
+import queue
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 from chart_renderer import render_chart_html_from_dataset, extract_json_from_text
 
 ROOT = Path(__file__).resolve().parent
-OUTDIR = ROOT / 'html-charts'
+# D3_OUTDIR redirects the generated files (load tests, sandboxes); default ./html-charts
+OUTDIR = Path(os.getenv('D3_OUTDIR') or ROOT / 'html-charts')
 OUTDIR.mkdir(parents=True, exist_ok=True)
 
 # Load external resources and prompts if available
@@ -67,31 +75,135 @@ PROMPTS_FILE = ROOT / 'prompts' / 'chart_prompts.txt'
 resources_text = RESOURCES_FILE.read_text(encoding='utf-8') if RESOURCES_FILE.exists() else ''
 prompts_text = PROMPTS_FILE.read_text(encoding='utf-8') if PROMPTS_FILE.exists() else ''
 
-# Basic helper to save html safely
+# Durability of the saved artifacts (D3_DURABILITY):
+#   fsync - fsync every file before the response goes back (default)
+#   batch - respond once the bytes are in the page cache; a writer thread fsyncs the files
+#           in batches every D3_FSYNC_BATCH_MS, so a crash can lose the last batch
+#   none  - never fsync, for ephemeral previews
+# Every mode writes to a temporary name and renames it into place, so a reader of the
+# returned path never sees a partial file.
+DURABILITY = os.getenv('D3_DURABILITY', 'fsync').strip().lower()
+if DURABILITY not in ('fsync', 'batch', 'none'):
+    raise ValueError(f"D3_DURABILITY must be fsync, batch or none, not {DURABILITY!r}")
+FSYNC_BATCH_MS = int(os.getenv('D3_FSYNC_BATCH_MS', '50'))
+
+
+def _fsync_path(path, directory=False):
+    try:
+        fd = os.open(path, os.O_RDONLY | (getattr(os, 'O_DIRECTORY', 0) if directory else 0))
+    except OSError:
+        return  # gone already, or a directory that cannot be opened (Windows)
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class _BatchSyncer:
+    """Background thread that fsyncs saved files in batches, then their directories once."""
+
+    def __init__(self, interval_s: float):
+        self.interval_s = interval_s
+        self._pending = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._queued = 0
+        self._synced = 0
+        self._waiters = 0
+
+    def submit(self, path):
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='d3-fsync', daemon=True)
+                self._thread.start()
+            self._pending.append(path)
+            self._queued += 1
+            self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """Block until every file submitted so far has been fsynced."""
+        with self._cond:
+            target = self._queued
+            self._waiters += 1
+            self._cond.notify_all()
+            try:
+                return self._cond.wait_for(lambda: self._synced >= target, timeout)
+            finally:
+                self._waiters -= 1
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending)
+                # let a batch gather, unless somebody is waiting in flush()
+                self._cond.wait_for(lambda: self._waiters, self.interval_s)
+                batch, self._pending = self._pending, []
+            for path in batch:
+                _fsync_path(path)
+            for directory in {os.path.dirname(p) for p in batch}:
+                _fsync_path(directory, directory=True)
+            with self._cond:
+                self._synced += len(batch)
+                self._cond.notify_all()
+
+
+_syncer = _BatchSyncer(FSYNC_BATCH_MS / 1000.0)
+
+
+def flush_writes(timeout=None):
+    """Wait for batched fsyncs to finish (a no-op unless D3_DURABILITY=batch)."""
+    return _syncer.flush(timeout)
+
+
 def save_html(html_text: str, prefix: str = 'chart') -> str:
-    slug = hashlib.sha1(html_text.encode('utf-8')).hexdigest()[:8]
+    data = html_text.encode('utf-8')
+    slug = hashlib.sha1(data).hexdigest()[:8]
     ts = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
     filename = f"{prefix}_{ts}_{slug}.html"
     path = OUTDIR / filename
-    with open(path, 'wb') as f:
-        data = html_text.encode('utf-8')
-        f.write(data)
-        f.flush()
+    tmp = OUTDIR / f".{filename}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(data)
+            if DURABILITY == 'fsync':
+                f.flush()
+                try:
+                    os.fsync(f.fileno())
+                except OSError:
+                    pass
+        os.replace(tmp, path)
+    except BaseException:
         try:
-            os.fsync(f.fileno())
-        except Exception:
+            os.remove(tmp)
+        except OSError:
             pass
+        raise
+    if DURABILITY == 'fsync':
+        _fsync_path(str(OUTDIR), directory=True)
+    elif DURABILITY == 'batch':
+        _syncer.submit(str(path))
     return str(path)
 
-# D3 templates
-BASE_HTML = """<!doctype html>
-<html>
-<head>
-<meta charset='utf-8'>
-<meta name='viewport' content='width=device-width,initial-scale=1'>
-<title>{title}</title>
-<link href="https://fonts.googleapis.com/css2?family=Inter:wght@300;400;600&display=swap" rel="stylesheet">
-<style>
+# Static assets. Pages reference a shared bundle written once into html-charts/assets/
+# (D3_ASSETS=local, the default), carry it inline as a single self-contained file (inline),
+# or load the libraries from the public CDNs (cdn). Bundle files are named after a hash of
+# their content, so they never change under a name and browsers can cache them for good. The
+# JavaScript libraries are read from D3_VENDOR_DIR (./vendor, filled by fetch_vendor_assets.py);
+# local and inline renders fail with a message naming the missing file rather than quietly
+# reaching out to a CDN. local pages only work next to their assets/ directory, so a caller
+# that gets the HTML itself is always given an inline page. No mode loads web fonts: the
+# stylesheet uses Inter when it is installed and falls back to system fonts.
+ASSET_MODES = ('local', 'inline', 'cdn')
+ASSET_MODE = os.getenv('D3_ASSETS', 'local').strip().lower()
+VENDOR_DIR = Path(os.getenv('D3_VENDOR_DIR') or ROOT / 'vendor')
+VENDOR_LIBS = {
+    # name: (vendored file, CDN url)
+    'd3': ('d3.v7.min.js', 'https://d3js.org/d3.v7.min.js'),
+    'chartjs': ('chart.umd.min.js', 'https://cdn.jsdelivr.net/npm/chart.js@4.4.0/dist/chart.umd.min.js'),
+}
+CHART_CSS = """
     body{font-family:Inter,Segoe UI,Arial,sans-serif;margin:20px;background:#f6f7fb;color:#111}
     .container{max-width:1100px;margin:0 auto;background:#fff;padding:20px;border-radius:8px;box-shadow:0 6px 30px rgba(20,30,60,0.08)}
     h2{margin:0 0 12px 0;font-size:18px}
@@ -99,7 +211,95 @@ BASE_HTML = """<!doctype html>
     .legend{display:flex;gap:10px;flex-wrap:wrap;margin-top:12px}
     .legend-item{display:flex;align-items:center;gap:8px;font-size:13px}
     .sw{width:14px;height:14px;border-radius:3px}
-</style>
+"""
+
+
+class AssetBundle:
+    """The shared stylesheet and vendored libraries, published once per output directory."""
+
+    def __init__(self, vendor_dir: Path):
+        self.vendor_dir = vendor_dir
+        self._lock = threading.Lock()
+        self._published = {}  # outdir -> {name: (href, text)}
+
+    def _sources(self):
+        yield 'css', 'charts.css', CHART_CSS.encode('utf-8')
+        for name, (filename, _) in VENDOR_LIBS.items():
+            vendored = self.vendor_dir / filename
+            if not vendored.is_file():
+                raise FileNotFoundError(f"{vendored} is missing: run fetch_vendor_assets.py, or set D3_ASSETS=cdn")
+            yield name, filename, vendored.read_bytes()
+
+    def files(self, outdir: Path):
+        with self._lock:
+            files = self._published.get(outdir)
+            if files is None:
+                files = self._published[outdir] = self._publish(outdir)
+            return files
+
+    def _publish(self, outdir: Path):
+        target = outdir / 'assets'
+        target.mkdir(parents=True, exist_ok=True)
+        files = {}
+        for name, filename, data in self._sources():
+            stem, dot, ext = filename.rpartition('.')
+            hashed = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}.{ext}"
+            path = target / hashed
+            if not path.exists():
+                tmp = target / f".{hashed}.{os.getpid()}.tmp"
+                tmp.write_bytes(data)
+                os.replace(tmp, path)
+            files[name] = (f"assets/{hashed}", data.decode('utf-8'))
+        return files
+
+
+assets = AssetBundle(VENDOR_DIR)
+
+
+def asset_tags(mode=None):
+    """(head, libraries) HTML for a page: stylesheet tags and the d3 script tag."""
+    mode = mode or ASSET_MODE
+    if mode == 'cdn':
+        return f"<style>{CHART_CSS}</style>", f"<script src='{VENDOR_LIBS['d3'][1]}'></script>"
+    files = assets.files(OUTDIR)
+    if mode == 'inline':
+        head = f"<style>{CHART_CSS}</style>"
+    else:
+        head = f"<link rel='stylesheet' href='{files['css'][0]}'>"
+    return head, library_tag('d3', mode, files)
+
+
+def library_tag(name, mode=None, files=None):
+    mode = mode or ASSET_MODE
+    if mode == 'cdn':
+        return f"<script src='{VENDOR_LIBS[name][1]}'></script>"
+    files = files if files is not None else assets.files(OUTDIR)
+    href, text = files[name]
+    if mode == 'inline':
+        return "<script>" + text.replace('</script', '<\\/script') + "</script>"
+    return f"<script src='{href}'></script>"
+
+
+def localize_assets(html_text: str, mode=None) -> str:
+    """Point the CDN script tags of a page built elsewhere (chart_renderer) at the bundle."""
+    mode = mode or ASSET_MODE
+    if mode == 'cdn':
+        return html_text
+    for name, (_, url) in VENDOR_LIBS.items():
+        for tag in (f"<script src='{url}'></script>", f'<script src="{url}"></script>'):
+            if tag in html_text:
+                html_text = html_text.replace(tag, library_tag(name, mode))
+    return html_text
+
+
+# D3 templates
+BASE_HTML = """<!doctype html>
+<html>
+<head>
+<meta charset='utf-8'>
+<meta name='viewport' content='width=device-width,initial-scale=1'>
+<title>{title}</title>
+{head}
 </head>
 <body>
 <div class='container'>
@@ -108,7 +308,7 @@ BASE_HTML = """<!doctype html>
 <div id='legend' class='legend' aria-hidden='false'></div>
 <div style='margin-top:8px;color:#666;font-size:13px'>Generated by local D3 MCP server</div>
 </div>
-<script src='https://d3js.org/d3.v7.min.js'></script>
+{libs}
 <script>
 {script}
 </script>
@@ -117,13 +317,55 @@ BASE_HTML = """<!doctype html>
 """
 
 # Utility: safe JSON -> JS variable
-def to_js_var(obj, varname='data'):
+def js_json(obj):
     j = json.dumps(obj, ensure_ascii=False)
     # escape special </ to avoid HTML issues
-    j = j.replace('</', '<\/')
-    return f"const {varname} = {j};\n"
+    return j.replace('</', '<\\/')
+
+
+def to_js_var(obj, varname='data'):
+    return f"const {varname} = {js_json(obj)};\n"
+
+
+class Template:
+    """A template split once into static segments and named slots.
+
+    render() fills the slots and joins everything in one pass, instead of a chain of
+    str.replace calls that each copy the whole document. A slot value may be a string
+    or a sequence of strings, which are spliced in without being concatenated first.
+    """
+
+    def __init__(self, text: str, slots):
+        pattern = '(' + '|'.join(re.escape(slot) for slot in slots) + ')'
+        parts = re.split(pattern, text)
+        # re.split with a group alternates static text and slot names
+        self.static = parts[0::2]
+        self.slots = parts[1::2]
+
+    def render(self, **values) -> str:
+        out = [self.static[0]]
+        for slot, text in zip(self.slots, self.static[1:]):
+            value = values[slot]
+            if isinstance(value, str):
+                out.append(value)
+            else:
+                out.extend(value)
+            out.append(text)
+        return ''.join(out)
+
+
+PAGE = Template(BASE_HTML, ('{title}', '{head}', '{libs}', '{script}'))
+_NO_DATA = object()
+
+
+def render_page(title: str, script: str, payload=_NO_DATA, assets_mode=None) -> str:
+    """The full HTML document: BASE_HTML with the title, assets, the `data` variable and the chart script."""
+    data = () if payload is _NO_DATA else ('const data = ', js_json(payload), ';\n')
+    head, libs = asset_tags(assets_mode)
+    return PAGE.render(**{'{title}': html.escape(title), '{head}': head, '{libs}': libs, '{script}': (*data, script)})
 
 # Chart scripts implementations
+@lru_cache(maxsize=None)
 def script_line(data_var='data', opts=None):
     # data: {labels:[], datasets:[{label,data:[]}]}
     tpl = """
@@ -145,12 +387,14 @@ let allValues = [];
 datasets.forEach(d=>allValues = allValues.concat(d.data));
 y.domain([0, d3.max(allValues) || 0]);
 const line = d3.line().x((d,i)=>x(labels[i])).y(d=>y(d)).curve(d3.curveMonotoneX);
-svg.append('g').attr('transform',`translate(0,${height})`).call(d3.axisBottom(x)).selectAll('text').style('font-size','12px');
+const tickEvery = Math.max(1, Math.ceil(labels.length / Math.max(2, Math.floor(width / 70))));
+svg.append('g').attr('transform',`translate(0,${height})`).call(d3.axisBottom(x).tickValues(labels.filter((d,i)=>i % tickEvery === 0))).selectAll('text').style('font-size','12px');
 svg.append('g').call(d3.axisLeft(y)).selectAll('text').style('font-size','12px');
+const markers = __DATA_VAR__.markers !== false;
 datasets.forEach(function(ds, idx){
    const color = ds.backgroundColor || ds.borderColor || d3.schemeTableau10[idx%10];
    svg.append('path').datum(ds.data).attr('fill','none').attr('stroke',color).attr('stroke-width',2).attr('d',line);
-   svg.selectAll('.dot'+idx).data(ds.data).enter().append('circle').attr('class','dot'+idx).attr('cx',(d,i)=>x(labels[i])).attr('cy',d=>y(d)).attr('r',3).attr('fill',color).attr('stroke','#fff').attr('stroke-width',1);
+   if(markers) svg.selectAll('.dot'+idx).data(ds.data).enter().append('circle').attr('class','dot'+idx).attr('cx',(d,i)=>x(labels[i])).attr('cy',d=>y(d)).attr('r',3).attr('fill',color).attr('stroke','#fff').attr('stroke-width',1);
    // legend
    d3.select('#legend').append('div').attr('class','legend-item').html(`<div class='sw' style='background:${color}'></div><div>${ds.label}</div>`);
 });
@@ -158,6 +402,7 @@ datasets.forEach(function(ds, idx){
 """
     return tpl.replace('__DATA_VAR__', data_var)
 
+@lru_cache(maxsize=None)
 def script_bar(data_var='data', stacked=False):
     tpl = """
 (function(){
@@ -200,6 +445,7 @@ if(__STACKED__){
 """
     return tpl.replace('__DATA_VAR__', data_var).replace('__STACKED__', 'true' if stacked else 'false')
 
+@lru_cache(maxsize=None)
 def script_pie(data_var='data', donut=False):
     tpl = """
 (function(){
@@ -228,6 +474,7 @@ data.forEach(d=>{ legend.append('div').attr('class','legend-item').html(`<div cl
     return tpl.replace('__DATA_VAR__', data_var).replace('{INNER}', inner)
 
 
+@lru_cache(maxsize=None)
 def script_bubble(data_var='data'):
         # Expects payload: { datasets: [ { label: 'series', data: [ {x:.., y:.., r:..}, ... ], backgroundColor: [] } ] }
         tpl = """
@@ -269,50 +516,78 @@ d3.select('#legend').append('div').attr('class','legend-item').html(`<div class=
         return tpl.replace('__DATA_VAR__', data_var)
 
 
+@lru_cache(maxsize=None)
 def script_heatmap(data_var='data'):
-        # Expects payload: { xLabels:[], yLabels:[], values: [[...]] } where values[y][x]
+        # Expects payload prepared by prepare_heatmap: {xLabels, yLabels, q: one character per cell
+        # (row-major colour level, see HEATMAP_ALPHABET), values:[value per cell], levels, min, max, canvas}. Large matrices are painted on a canvas;
+        # either way one pointer handler on the grid finds the cell under the mouse.
         tpl = """
 (function(){
 const container = d3.select('#viz');
 const payload = __DATA_VAR__ || {};
-const xLabels = payload.xLabels || payload.labels || [];
-const yLabels = payload.yLabels || payload.labelsY || [];
-const values = payload.values || payload.matrix || payload.data || [];
-if(!xLabels.length || !yLabels.length || !values.length){ container.append('div').text('No heatmap data (expect xLabels,yLabels,values matrix)'); return; }
+const xLabels = payload.xLabels || [];
+const yLabels = payload.yLabels || [];
+const q = payload.q || '';
+const alphabet = '__ALPHABET__';
+const codes = new Int8Array(128); for(let i=0;i<alphabet.length;i++){ codes[alphabet.charCodeAt(i)] = i; }
+const level = i=>codes[q.charCodeAt(i)];
+const values = payload.values || [];
+const nx = xLabels.length, ny = yLabels.length;
+if(!nx || !ny || !q.length){ container.append('div').text('No heatmap data (expect xLabels,yLabels,values matrix)'); return; }
 const margin = {top:20,right:20,bottom:80,left:80};
 const rect = container.node().getBoundingClientRect();
 const width = Math.max(320, rect.width || container.node().clientWidth || window.innerWidth) - margin.left - margin.right;
 const height = Math.max(240, rect.height || container.node().clientHeight || window.innerHeight) - margin.top - margin.bottom;
-const gridWidth = width / xLabels.length;
-const gridHeight = height / yLabels.length;
+const gridWidth = width / nx;
+const gridHeight = height / ny;
+const levels = payload.levels || 1;
+const palette = d3.range(levels).map(i=>d3.interpolateYlOrRd(levels > 1 ? i / (levels - 1) : 0));
+container.style('position','relative');
 const svg = container.append('svg').attr('width', width + margin.left + margin.right).attr('height', height + margin.top + margin.bottom)
     .append('g').attr('transform',`translate(${margin.left},${margin.top})`);
-// color scale
-const flat = [].concat.apply([], values.map(r=>r.map(v=>+v||0)));
-const minV = d3.min(flat), maxV = d3.max(flat);
-const color = d3.scaleSequential(d3.interpolateYlOrRd).domain([minV||0, maxV||1]);
-// cells
-for(var yi=0;yi<yLabels.length;yi++){
-    for(var xi=0;xi<xLabels.length;xi++){
-        var v = values[yi] && values[yi][xi] != null ? values[yi][xi] : 0;
-        svg.append('rect').attr('x', xi*gridWidth).attr('y', yi*gridHeight).attr('width', Math.max(1, gridWidth-1)).attr('height', Math.max(1, gridHeight-1)).style('fill', color(+v)).style('stroke','#fff').style('stroke-width',0.3)
-            .on('mouseover', (function(xi,yi,v){ return function(event){ var tip = d3.select('body').append('div').attr('id','tmpTip').style('position','absolute').style('padding','6px 8px').style('background','#222').style('color','#fff').style('border-radius','6px').style('pointer-events','none'); tip.html(xLabels[xi] + ' / ' + yLabels[yi] + ': ' + v); }; })(xi,yi,v))
-            .on('mousemove', function(event){ d3.select('#tmpTip').style('left',(event.pageX+12)+'px').style('top',(event.pageY+12)+'px'); })
-            .on('mouseout', function(){ d3.select('#tmpTip').remove(); });
+let grid;
+if(payload.canvas){
+    const ratio = window.devicePixelRatio || 1;
+    grid = container.append('canvas').style('position','absolute').style('left', margin.left+'px').style('top', margin.top+'px')
+        .style('width', width+'px').style('height', height+'px').attr('width', Math.round(width*ratio)).attr('height', Math.round(height*ratio));
+    const ctx = grid.node().getContext('2d');
+    ctx.scale(ratio, ratio);
+    for(let yi=0; yi<ny; yi++){
+        for(let xi=0; xi<nx; xi++){
+            ctx.fillStyle = palette[level(yi*nx+xi)];
+            ctx.fillRect(xi*gridWidth, yi*gridHeight, gridWidth + 0.5, gridHeight + 0.5);
+        }
     }
+} else {
+    grid = svg.append('g');
+    grid.selectAll('rect').data(d3.range(nx*ny)).enter().append('rect').attr('x',(d,i)=>(i % nx)*gridWidth).attr('y',(d,i)=>Math.floor(i / nx)*gridHeight)
+        .attr('width', Math.max(1, gridWidth-1)).attr('height', Math.max(1, gridHeight-1)).style('fill', i=>palette[level(i)]).style('stroke','#fff').style('stroke-width',0.3);
 }
-// axes labels
+// one delegated hover handler: the cell comes from the pointer position
+const tip = d3.select('body').append('div').style('position','absolute').style('padding','6px 8px').style('background','#222').style('color','#fff')
+    .style('border-radius','6px').style('pointer-events','none').style('display','none');
+grid.on('mousemove', function(event){
+    const [mx, my] = d3.pointer(event, this);
+    const xi = Math.floor(mx / gridWidth), yi = Math.floor(my / gridHeight);
+    if(xi < 0 || yi < 0 || xi >= nx || yi >= ny){ tip.style('display','none'); return; }
+    tip.style('display','block').html(xLabels[xi] + ' / ' + yLabels[yi] + ': ' + values[yi*nx+xi])
+        .style('left',(event.pageX+12)+'px').style('top',(event.pageY+12)+'px');
+}).on('mouseleave', function(){ tip.style('display','none'); });
+// axes labels, thinned to the space available
+const xEvery = Math.max(1, Math.ceil(nx / Math.max(1, Math.floor(width / 40))));
+const yEvery = Math.max(1, Math.ceil(ny / Math.max(1, Math.floor(height / 14))));
 const xg = svg.append('g').attr('transform',`translate(0,${height})`);
-xg.selectAll('text').data(xLabels).enter().append('text').attr('x', (d,i)=>i*gridWidth + gridWidth/2).attr('y',12).attr('text-anchor','middle').text(d=>d).style('font-size','11px');
+xg.selectAll('text').data(xLabels.map((d,i)=>[d,i]).filter(d=>d[1] % xEvery === 0)).enter().append('text').attr('x', d=>d[1]*gridWidth + gridWidth/2).attr('y',12).attr('text-anchor','middle').text(d=>d[0]).style('font-size','11px');
 const yg = svg.append('g');
-yg.selectAll('text').data(yLabels).enter().append('text').attr('x', -8).attr('y', (d,i)=>i*gridHeight + gridHeight/2).attr('text-anchor','end').text(d=>d).style('font-size','11px');
+yg.selectAll('text').data(yLabels.map((d,i)=>[d,i]).filter(d=>d[1] % yEvery === 0)).enter().append('text').attr('x', -8).attr('y', d=>d[1]*gridHeight + gridHeight/2).attr('text-anchor','end').text(d=>d[0]).style('font-size','11px');
 // legend swatches: simple gradient
-var legend = d3.select('#legend'); legend.append('div').text('Heatmap scale');
+var legend = d3.select('#legend'); legend.append('div').text('Heatmap scale: ' + payload.min + ' – ' + payload.max);
 })();
 """
-        return tpl.replace('__DATA_VAR__', data_var)
+        return tpl.replace('__DATA_VAR__', data_var).replace('__ALPHABET__', HEATMAP_ALPHABET)
 
 
+@lru_cache(maxsize=None)
 def script_packed(data_var='data'):
     # Expects payload: { items: [ {id: 'A', label: 'A label', value: 123, color: '#...' }, ... ] }
     tpl = """
@@ -341,27 +616,29 @@ const legend = d3.select('#legend'); items.slice(0,8).forEach(function(it,i){ le
     return tpl.replace('__DATA_VAR__', data_var)
 
 
+@lru_cache(maxsize=None)
 def script_histogram(data_var='data'):
-    # Expects payload: {values: [10,20,30,...], bins: 10}
+    # Expects payload binned by the server (histogram_tool): {edges:[...], counts:[...], log: bool}
     tpl = """
 (function(){
 const container = d3.select('#viz'); const payload = __DATA_VAR__||{};
-const values = payload.values || payload.data || [];
-if(!values.length){ container.append('div').text('No histogram data (expect values: [])'); return; }
-const bins = payload.bins || 10;
+const edges = payload.edges || []; const counts = payload.counts || [];
+if(!counts.length){ container.append('div').text('No histogram data (expect values: [])'); return; }
+const binsData = counts.map((c,i)=>({x0: edges[i], x1: edges[i+1], length: c}));
 const rect = container.node().getBoundingClientRect(); const width = Math.max(320, rect.width)-40; const height = Math.max(240, rect.height)-40;
-const svg = container.append('svg').attr('width', width).attr('height', height).append('g').attr('transform','translate(20,10)');
-const x = d3.scaleLinear().domain(d3.extent(values)).range([0, width-60]);
-const histogram = d3.bin().domain(x.domain()).thresholds(bins);
-const binsData = histogram(values);
-const y = d3.scaleLinear().domain([0, d3.max(binsData, d=>d.length)||1]).range([height-60,0]);
-svg.selectAll('rect').data(binsData).enter().append('rect').attr('x', d=>x(d.x0)).attr('y', d=>y(d.length)).attr('width', d=>Math.max(1, x(d.x1)-x(d.x0)-1)).attr('height', d=>height-60 - y(d.length)).attr('fill','#69b3a2');
-svg.append('g').attr('transform',`translate(0,${height-60})`).call(d3.axisBottom(x));
+const svg = container.append('svg').attr('width', width).attr('height', height).append('g').attr('transform','translate(40,10)');
+const x = (payload.log ? d3.scaleLog() : d3.scaleLinear()).domain([edges[0], edges[edges.length-1]]).range([0, width-60]);
+const y = d3.scaleLinear().domain([0, d3.max(counts)||1]).range([height-60,0]);
+svg.selectAll('rect').data(binsData).enter().append('rect').attr('x', d=>x(d.x0)).attr('y', d=>y(d.length)).attr('width', d=>Math.max(1, x(d.x1)-x(d.x0)-1)).attr('height', d=>height-60 - y(d.length)).attr('fill','#69b3a2')
+  .append('title').text(d=>`${d.x0} – ${d.x1}: ${d.length}`);
+svg.append('g').attr('transform',`translate(0,${height-60})`).call(payload.log ? d3.axisBottom(x).ticks(6, '~g') : d3.axisBottom(x));
+svg.append('g').call(d3.axisLeft(y).ticks(6));
 })();
 """
     return tpl.replace('__DATA_VAR__', data_var)
 
 
+@lru_cache(maxsize=None)
 def script_horizontal_bar(data_var='data'):
     # Expects payload: {labels:[], values:[]}
     tpl = """
@@ -379,6 +656,7 @@ svg.append('g').call(d3.axisLeft(y));
     return tpl.replace('__DATA_VAR__', data_var)
 
 
+@lru_cache(maxsize=None)
 def script_grouped_bar(data_var='data'):
     # Expects payload: {labels:[], datasets:[{label:'A', data:[]}, ...]}
     tpl = """
@@ -398,6 +676,7 @@ svg.append('g').attr('transform',`translate(0,${height-80})`).call(d3.axisBottom
     return tpl.replace('__DATA_VAR__', data_var)
 
 
+@lru_cache(maxsize=None)
 def script_scatter(data_var='data'):
     # Expects payload: [{x:.., y:.., label:?}, ...] or {points:[...]}
     tpl = """
@@ -414,6 +693,7 @@ svg.selectAll('circle').data(pts).enter().append('circle').attr('cx',d=>x(+d.x||
     return tpl.replace('__DATA_VAR__', data_var)
 
 
+@lru_cache(maxsize=None)
 def script_treemap_placeholder(data_var='data'):
     # Expects hierarchical payload like {name:'root', children:[{name:'A', value:10}, ...]}
     tpl = """
@@ -432,6 +712,7 @@ nodes.append('text').attr('x',4).attr('y',14).text(d=>d.data.name||'');
     return tpl.replace('__DATA_VAR__', data_var)
 
 
+@lru_cache(maxsize=None)
 def script_tree(data_var='data'):
     # Expects hierarchical payload: {name:'root', children:[...]} -> renders a simple dendrogram
     tpl = """
@@ -449,6 +730,7 @@ svg.selectAll('text').data(root.descendants()).enter().append('text').attr('x',d
     return tpl.replace('__DATA_VAR__', data_var)
 
 
+@lru_cache(maxsize=None)
 def script_force(data_var='data'):
     # Expects payload: {nodes:[{id:...}], links:[{source:..., target:...}]}
     tpl = """
@@ -465,6 +747,7 @@ sim.on('tick', ()=>{ link.attr('x1',d=>d.source.x).attr('y1',d=>d.source.y).attr
     return tpl.replace('__DATA_VAR__', data_var)
 
 
+@lru_cache(maxsize=None)
 def script_chord_placeholder(data_var='data'):
     # Placeholder: expects adjacency matrix; implementing full chord diagram is left as an exercise
     tpl = """
@@ -473,6 +756,7 @@ def script_chord_placeholder(data_var='data'):
     return tpl.replace('__DATA_VAR__', data_var)
 
 
+@lru_cache(maxsize=None)
 def script_sankey_placeholder(data_var='data'):
     tpl = """
 (function(){ d3.select('#viz').append('div').text('Sankey placeholder - requires d3-sankey plugin and proper payload'); })();
@@ -480,6 +764,7 @@ def script_sankey_placeholder(data_var='data'):
     return tpl.replace('__DATA_VAR__', data_var)
 
 
+@lru_cache(maxsize=None)
 def script_choropleth_placeholder(data_var='data'):
     tpl = """
 (function(){ d3.select('#viz').append('div').text('Choropleth placeholder - requires GeoJSON + value mapping'); })();
@@ -487,6 +772,7 @@ def script_choropleth_placeholder(data_var='data'):
     return tpl.replace('__DATA_VAR__', data_var)
 
 
+@lru_cache(maxsize=None)
 def script_radar_placeholder(data_var='data'):
     tpl = """
 (function(){ d3.select('#viz').append('div').text('Radar chart placeholder - consider using d3.lineRadial'); })();
@@ -494,6 +780,7 @@ def script_radar_placeholder(data_var='data'):
     return tpl.replace('__DATA_VAR__', data_var)
 
 
+@lru_cache(maxsize=None)
 def script_calendar_heatmap_placeholder(data_var='data'):
     tpl = """
 (function(){ d3.select('#viz').append('div').text('Calendar heatmap placeholder - expects date,value array'); })();
@@ -501,6 +788,7 @@ def script_calendar_heatmap_placeholder(data_var='data'):
     return tpl.replace('__DATA_VAR__', data_var)
 
 
+@lru_cache(maxsize=None)
 def script_parallel_coords_placeholder(data_var='data'):
     tpl = """
 (function(){ d3.select('#viz').append('div').text('Parallel coordinates placeholder - expects array of records with same keys'); })();
@@ -508,6 +796,347 @@ def script_parallel_coords_placeholder(data_var='data'):
     return tpl.replace('__DATA_VAR__', data_var)
 
 
+# Downsampling of long line series (Largest-Triangle-Three-Buckets). A multi-year daily
+# series is tens of thousands of points, each an SVG vertex plus a marker circle; above
+# MAX_POINTS_PER_SERIES every series is reduced to the points that keep its visual shape.
+# Series share the labels, so the kept indices of all series are merged and every series
+# keeps its true value at each of them; when the merged set is over the budget, LTTB runs
+# again with a smaller per-series count until it fits. Markers are left out (pointRadius 0
+# on Chart.js pages) when a series still has more than MARKER_MAX_POINTS points. NumPy is
+# used when installed, pure Python otherwise.
+MAX_POINTS_PER_SERIES = int(os.getenv('D3_MAX_POINTS_PER_SERIES', '1000'))
+MARKER_MAX_POINTS = int(os.getenv('D3_MARKER_MAX_POINTS', '200'))
+_np = None
+
+
+def _numpy():
+    global _np
+    if _np is None:
+        try:
+            import numpy
+            _np = numpy
+        except ImportError:
+            _np = False
+    return _np or None
+
+
+def _lttb_buckets(n, n_out):
+    # n_out - 2 buckets over points 1..n-2; the first and last points are always kept
+    step = (n - 2) / (n_out - 2)
+    return [1 + int(i * step) for i in range(n_out - 2)] + [n - 1]
+
+
+def lttb_indices(values, n_out):
+    """Indices of the n_out points of `values` (evenly spaced x) that LTTB keeps."""
+    n = len(values)
+    if n_out >= n or n_out < 3:
+        return list(range(n))
+    edges = _lttb_buckets(n, n_out)
+    np = _numpy()
+    out = [0]
+    a = 0
+    if np is not None and n >= 32 * n_out:
+        # big buckets: the per-bucket triangle areas are one vector op each
+        y = np.asarray(values, dtype=float)
+        bounds = np.asarray(edges + [n])
+        sums = np.concatenate(([0.0], np.cumsum(y)))
+        avg_x = (bounds[1:-1] + bounds[2:] - 1) / 2.0
+        avg_y = (sums[bounds[2:]] - sums[bounds[1:-1]]) / (bounds[2:] - bounds[1:-1])
+        xs = np.arange(n, dtype=float)
+        for i in range(n_out - 2):
+            lo, hi = edges[i], edges[i + 1]
+            ya = y[a]
+            area = np.abs((a - avg_x[i]) * (y[lo:hi] - ya) - (a - xs[lo:hi]) * (avg_y[i] - ya))
+            a = lo + int(area.argmax())
+            out.append(a)
+    else:
+        y = values
+        for i in range(n_out - 2):
+            lo, hi = edges[i], edges[i + 1]
+            nxt = edges[i + 2] if i + 2 < len(edges) else n
+            avg_x = (hi + nxt - 1) / 2.0
+            avg_y = sum(y[hi:nxt]) / (nxt - hi)
+            ya = y[a]
+            best, best_area = lo, -1.0
+            for j in range(lo, hi):
+                area = abs((a - avg_x) * (y[j] - ya) - (a - j) * (avg_y - ya))
+                if area > best_area:
+                    best, best_area = j, area
+            a = best
+            out.append(a)
+    out.append(n - 1)
+    return out
+
+
+def _finite_floats(data):
+    """`data` as a list of floats, or None when an entry is not a finite number."""
+    np = _numpy()
+    try:
+        if np is not None and len(data) >= 4096:
+            arr = np.asarray(data, dtype=float)
+            return arr.tolist() if bool(np.isfinite(arr).all()) else None
+        values = [float(v) for v in data]
+    except (TypeError, ValueError):
+        return None
+    return values if all(map(math.isfinite, values)) else None
+
+
+def downsample_series(payload, max_points=None):
+    """(payload, points_dropped) with every long series of {labels, datasets} reduced by LTTB.
+
+    Series that are not all numbers are left alone (their kept points still follow the
+    others); the input payload is never modified.
+    """
+    max_points = MAX_POINTS_PER_SERIES if max_points is None else int(max_points)
+    if not isinstance(payload, dict):
+        return payload, 0
+    labels = payload.get('labels')
+    datasets = payload.get('datasets')
+    if not isinstance(labels, list) or not isinstance(datasets, list):
+        return payload, 0
+    n = len(labels)
+    keep = None
+    if max_points > 0 and n > max_points:
+        series = []
+        for ds in datasets:
+            data = ds.get('data') if isinstance(ds, dict) else None
+            if isinstance(data, list) and len(data) == n:
+                values = _finite_floats(data)
+                if values is not None:
+                    series.append(values)
+        budget = max(max_points, 3)
+        while series:
+            keep = set()
+            for values in series:
+                keep.update(lttb_indices(values, budget))
+            if len(keep) <= max_points or budget == 3:
+                break
+            budget = max(3, min(budget - 1, budget * max_points // len(keep)))
+    out = dict(payload)
+    dropped = 0
+    if keep:
+        idx = sorted(keep)
+        out['labels'] = [labels[i] for i in idx]
+        out['datasets'] = []
+        for ds in datasets:
+            data = ds.get('data') if isinstance(ds, dict) else None
+            if isinstance(data, list) and len(data) == n:
+                dropped += n - len(idx)
+                ds = dict(ds, data=[data[i] for i in idx])
+            out['datasets'].append(ds)
+    if len(out['labels']) > MARKER_MAX_POINTS:
+        out['markers'] = False
+    return out, dropped
+
+
+# Histogram binning. The histogram tool bins on the server and embeds only the bin edges
+# and counts, so the page size depends on the number of bins, not of samples. Bins are a
+# fixed count (an integer "bins") or a rule: "fd" (Freedman-Diaconis), "sturges", or "auto"
+# (the larger of the two, as numpy does). With "log": true the bins are evenly spaced in
+# log10 and non-positive values are dropped. NumPy is used when installed.
+HISTOGRAM_DEFAULT_BINS = 10
+HISTOGRAM_MAX_BINS = int(os.getenv('D3_HISTOGRAM_MAX_BINS', '1000'))
+HISTOGRAM_RULES = ('fd', 'sturges', 'auto')
+
+
+def _quantile(sorted_values, q):
+    pos = (len(sorted_values) - 1) * q
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+def _bin_count(rule, n, lo, hi, iqr):
+    sturges = math.ceil(math.log2(n)) + 1 if n > 0 else 1
+    if rule == 'sturges':
+        return sturges
+    width = 2.0 * iqr / n ** (1.0 / 3.0) if n > 0 else 0.0
+    fd = math.ceil((hi - lo) / width) if width > 0 else 1
+    return fd if rule == 'fd' else max(fd, sturges)
+
+
+def _float_or_nan(v):
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def histogram_bins(values, bins=HISTOGRAM_DEFAULT_BINS, log=False):
+    """{edges, counts, samples, dropped, rule} for `values`; edges has one entry more than counts.
+
+    Nulls, non-numeric and non-finite values (and values <= 0 with log) are counted in dropped.
+    """
+    if isinstance(bins, str):
+        rule = bins.strip().lower()
+        if rule not in HISTOGRAM_RULES:
+            raise ValueError(f"bins must be a positive integer or one of {', '.join(HISTOGRAM_RULES)}")
+    else:
+        rule = 'fixed'
+        if isinstance(bins, bool) or int(bins) < 1:
+            raise ValueError('bins must be a positive integer')
+    np = _numpy()
+    if np is not None:
+        try:
+            arr = np.asarray(values, dtype=float).ravel()
+        except (TypeError, ValueError):
+            arr = np.array([_float_or_nan(v) for v in values], dtype=float)
+        keep = np.isfinite(arr) & (arr > 0) if log else np.isfinite(arr)
+        arr = arr[keep]
+        if log:
+            arr = np.log10(arr)
+        n = int(arr.size)
+        lo, hi = (float(arr.min()), float(arr.max())) if n else (0.0, 1.0)
+        iqr = float(np.subtract(*np.percentile(arr, [75, 25]))) if n and rule in ('fd', 'auto') else 0.0
+    else:
+        arr = []
+        for v in values:
+            v = _float_or_nan(v)
+            if math.isfinite(v) and (v > 0 or not log):
+                arr.append(math.log10(v) if log else v)
+        arr.sort()
+        n = len(arr)
+        lo, hi = (arr[0], arr[-1]) if n else (0.0, 1.0)
+        iqr = _quantile(arr, 0.75) - _quantile(arr, 0.25) if n and rule in ('fd', 'auto') else 0.0
+    dropped = len(values) - n
+    count = int(bins) if rule == 'fixed' else _bin_count(rule, n, lo, hi, iqr)
+    count = max(1, min(count, HISTOGRAM_MAX_BINS))
+    if hi <= lo:
+        lo, hi = lo - 0.5, hi + 0.5
+    if np is not None:
+        counts, edges = np.histogram(arr, bins=count, range=(lo, hi))
+        counts, edges = counts.tolist(), edges.tolist()
+    else:
+        width = (hi - lo) / count
+        edges = [lo + i * width for i in range(count)] + [hi]
+        counts = [0] * count
+        for v in arr:
+            counts[min(int((v - lo) / width), count - 1)] += 1
+    if log:
+        edges = [10 ** e for e in edges]
+    return {'edges': edges, 'counts': counts, 'samples': n, 'dropped': dropped, 'rule': rule}
+
+
+def histogram_tool(args):
+    """Bin the values server-side and render only the edges and counts."""
+    args = args if isinstance(args, dict) else {'data': args}
+    payload = args.get('data') or args.get('payload') or args.get('dataset') or args
+    if isinstance(payload, list):
+        payload = {'values': payload}
+    values = payload.get('values') or payload.get('data') or []
+    log = bool(payload.get('log', args.get('log', False)))
+    bins = payload.get('bins', args.get('bins', HISTOGRAM_DEFAULT_BINS))
+    try:
+        binned = histogram_bins(values, bins, log) if values else {'edges': [], 'counts': [], 'samples': 0, 'dropped': 0}
+    except (TypeError, ValueError) as e:
+        return {'status':'error','message':'invalid_histogram','error':str(e)}
+    resp = render_using_script(script_histogram, dict(args, data=dict(binned, log=log)), prefix='histogram')
+    resp.update(samples=binned['samples'], bins=len(binned['counts']), values_dropped=binned['dropped'])
+    return resp
+
+
+# Heatmap preparation. One SVG rect per cell does not scale (500 x 500 resources x weeks is
+# 250k DOM nodes), so the server reduces a matrix larger than the display to at most
+# HEATMAP_MAX_ROWS x HEATMAP_MAX_COLS cells by aggregating blocks of rows/columns (mean, max
+# or sum), quantizes every cell to one of HEATMAP_LEVELS colours (sent as one character per
+# cell), and asks the page to paint on a canvas above HEATMAP_CANVAS_CELLS cells. NumPy is
+# used when installed.
+HEATMAP_MAX_ROWS = int(os.getenv('D3_HEATMAP_MAX_ROWS', '400'))
+HEATMAP_MAX_COLS = int(os.getenv('D3_HEATMAP_MAX_COLS', '1000'))
+HEATMAP_LEVELS = int(os.getenv('D3_HEATMAP_LEVELS', '64'))
+HEATMAP_CANVAS_CELLS = int(os.getenv('D3_HEATMAP_CANVAS_CELLS', '2500'))
+HEATMAP_AGGREGATES = ('mean', 'max', 'sum')
+HEATMAP_ALPHABET = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz-_'
+
+
+def _cell(v):
+    if v is None:
+        return 0.0
+    try:
+        v = float(v)
+    except (TypeError, ValueError):
+        return 0.0
+    return v if math.isfinite(v) else 0.0
+
+
+def _block_labels(labels, factor):
+    if factor == 1:
+        return list(labels)
+    return [str(labels[i]) if i + 1 >= min(i + factor, len(labels)) else f"{labels[i]} – {labels[min(i + factor, len(labels)) - 1]}"
+            for i in range(0, len(labels), factor)]
+
+
+def prepare_heatmap(payload, max_rows=None, max_cols=None, levels=None, aggregate='mean'):
+    """(payload for script_heatmap, info) for {xLabels, yLabels, values[y][x]}; None if there is no matrix."""
+    max_rows = max(1, int(max_rows or HEATMAP_MAX_ROWS))
+    max_cols = max(1, int(max_cols or HEATMAP_MAX_COLS))
+    levels = max(1, min(int(levels or HEATMAP_LEVELS), len(HEATMAP_ALPHABET)))
+    if aggregate not in HEATMAP_AGGREGATES:
+        raise ValueError(f"aggregate must be one of {', '.join(HEATMAP_AGGREGATES)}")
+    if not isinstance(payload, dict):
+        return None, None
+    x_labels = payload.get('xLabels') or payload.get('labels') or []
+    y_labels = payload.get('yLabels') or payload.get('labelsY') or []
+    matrix = payload.get('values') or payload.get('matrix') or payload.get('data') or []
+    nx, ny = len(x_labels), len(y_labels)
+    if not nx or not ny or not isinstance(matrix, list) or not matrix:
+        return None, None
+    fy, fx = math.ceil(ny / max_rows), math.ceil(nx / max_cols)
+    by, bx = math.ceil(ny / fy), math.ceil(nx / fx)
+    np = _numpy()
+    if np is not None:
+        grid = np.zeros((by * fy, bx * fx))
+        mask = np.zeros(grid.shape, dtype=bool)
+        mask[:ny, :nx] = True
+        for yi in range(min(ny, len(matrix))):
+            row = matrix[yi] if isinstance(matrix[yi], list) else []
+            row = row[:nx]
+            try:
+                grid[yi, :len(row)] = np.nan_to_num(np.asarray(row, dtype=float), nan=0.0, posinf=0.0, neginf=0.0)
+            except (TypeError, ValueError):
+                grid[yi, :len(row)] = [_cell(v) for v in row]
+        blocks = grid.reshape(by, fy, bx, fx)
+        counts = mask.reshape(by, fy, bx, fx).sum(axis=(1, 3))
+        if aggregate == 'max':
+            agg = np.where(mask, grid, -np.inf).reshape(by, fy, bx, fx).max(axis=(1, 3))
+        else:
+            agg = blocks.sum(axis=(1, 3))
+            if aggregate == 'mean':
+                agg = agg / counts
+        lo, hi = float(agg.min()), float(agg.max())
+        span = hi - lo
+        q = np.zeros(agg.shape, dtype=int) if span <= 0 else np.minimum(((agg - lo) / span * levels).astype(int), levels - 1)
+        digits = max(0, 4 - (int(math.floor(math.log10(max(abs(lo), abs(hi))))) + 1)) if max(abs(lo), abs(hi)) > 0 else 0
+        values = np.round(agg, digits).ravel().tolist()
+        q = np.frombuffer(HEATMAP_ALPHABET.encode('ascii'), dtype=np.uint8)[q.ravel()].tobytes().decode('ascii')
+    else:
+        cells = [[0.0] * nx for _ in range(ny)]
+        for yi in range(min(ny, len(matrix))):
+            row = matrix[yi] if isinstance(matrix[yi], list) else []
+            for xi, v in enumerate(row[:nx]):
+                cells[yi][xi] = _cell(v)
+        agg = []
+        for y0 in range(0, ny, fy):
+            for x0 in range(0, nx, fx):
+                block = [cells[yi][xi] for yi in range(y0, min(y0 + fy, ny)) for xi in range(x0, min(x0 + fx, nx))]
+                agg.append(max(block) if aggregate == 'max' else sum(block) / (len(block) if aggregate == 'mean' else 1))
+        lo, hi = min(agg), max(agg)
+        span = hi - lo
+        q = [0] * len(agg) if span <= 0 else [min(int((v - lo) / span * levels), levels - 1) for v in agg]
+        digits = max(0, 4 - (int(math.floor(math.log10(max(abs(lo), abs(hi))))) + 1)) if max(abs(lo), abs(hi)) > 0 else 0
+        values = [round(v, digits) for v in agg]
+        q = ''.join(HEATMAP_ALPHABET[i] for i in q)
+    prepared = {
+        'xLabels': _block_labels(x_labels, fx), 'yLabels': _block_labels(y_labels, fy),
+        'q': q, 'values': values, 'levels': levels,
+        'min': round(lo, digits), 'max': round(hi, digits),
+        'canvas': bx * by > HEATMAP_CANVAS_CELLS,
+    }
+    info = {'cells': bx * by, 'source_cells': nx * ny, 'aggregated': [fy, fx],
+            'renderer': 'canvas' if prepared['canvas'] else 'svg'}
+    return prepared, info
+
+
 # Main request handler
 def render_using_script(script_fn, args, title=None, prefix='chart'):
     """Render payload using a raw script function (script_fn returns JS code)."""
@@ -521,8 +1150,7 @@ def render_using_script(script_fn, args, title=None, prefix='chart'):
     if payload is None:
         payload = {}
     title_text = title_text or title or 'D3 Chart'
-    script = to_js_var(payload, 'data') + script_fn('data')
-    html_text = BASE_HTML.replace('{title}', html.escape(title_text)).replace('{script}', script)
+    html_text = render_page(title_text, script_fn('data'), payload, args.get('assets') if isinstance(args, dict) else None)
     path = save_html(html_text, prefix=prefix)
     return {'status': 'ok', 'path': path, 'html': html_text}
 
@@ -538,7 +1166,7 @@ TOOLS = {
     'bubble': lambda args: handle_template(args, chart_type='bubble'),
     'heatmap': lambda args: handle_template(args, chart_type='heatmap'),
     'packed': lambda args: handle_template(args, chart_type='packed'),
-    'histogram': lambda args: render_using_script(script_histogram, args, prefix='histogram'),
+    'histogram': lambda args: histogram_tool(args),
     'horizontal_bar': lambda args: render_using_script(script_horizontal_bar, args, prefix='hbar'),
     'grouped_bar': lambda args: render_using_script(script_grouped_bar, args, prefix='grouped_bar'),
     'scatter': lambda args: render_using_script(script_scatter, args, prefix='scatter'),
@@ -556,6 +1184,90 @@ TOOLS = {
 }
 
 
+# JSON schemas for the TOOLS registry, published through MCP tools/list
+RESPONSE_MODES = ('path', 'html', 'both')
+_RESPONSE_MODE_PROPERTY = {'type': 'string', 'enum': list(RESPONSE_MODES),
+                           'description': 'Return the saved file path (default), the HTML document, or both'}
+_ASSETS_PROPERTY = {'type': 'string', 'enum': list(ASSET_MODES),
+                    'description': 'local: shared html-charts/assets bundle (default); inline: one self-contained file; cdn: public CDNs'}
+
+
+_MAX_POINTS_PROPERTY = {'type': 'integer', 'minimum': 0,
+                        'description': 'Downsample longer series to this many points (LTTB); 0 keeps every point'}
+
+
+def _chart_schema(data_description, data_type=('object', 'array'), **extra):
+    return {
+        'type': 'object',
+        'properties': {
+            'title': {'type': 'string', 'description': 'Chart title'},
+            'data': {'type': list(data_type), 'description': data_description},
+            'response_mode': _RESPONSE_MODE_PROPERTY,
+            'assets': _ASSETS_PROPERTY,
+            **extra,
+        },
+        'required': ['data'],
+    }
+
+_SERIES = "{labels:[...], datasets:[{label, data:[...], backgroundColor?}]}"
+TOOL_SCHEMAS = {
+    'line': ('Line chart of one or more series.', _chart_schema(_SERIES, max_points=_MAX_POINTS_PROPERTY)),
+    'multi_line': ('Line chart of several series sharing the labels.', _chart_schema(_SERIES, max_points=_MAX_POINTS_PROPERTY)),
+    'bar': ('Vertical bar chart.', _chart_schema(_SERIES)),
+    'multi_bar': ('Bar chart with a bar per dataset for each label.', _chart_schema(_SERIES)),
+    'stacked_bar': ('Stacked bar chart, one layer per dataset.', _chart_schema(_SERIES)),
+    'pie': ('Pie chart of the first dataset.', _chart_schema(_SERIES)),
+    'donut': ('Donut chart of the first dataset.', _chart_schema(_SERIES)),
+    'bubble': ('Bubble chart.', _chart_schema("{datasets:[{label, data:[{x, y, r}], backgroundColor?}]}")),
+    'heatmap': ('Heatmap of a matrix; large matrices are aggregated to the display size and drawn on a canvas.',
+                _chart_schema("{xLabels:[...], yLabels:[...], values:[[...]]} with values[y][x]",
+                              max_rows={'type': 'integer', 'minimum': 1}, max_cols={'type': 'integer', 'minimum': 1},
+                              levels={'type': 'integer', 'minimum': 1, 'maximum': 64, 'description': 'Colour levels'},
+                              aggregate={'type': 'string', 'enum': ['mean', 'max', 'sum']})),
+    'packed': ('Circle packing, circle area proportional to value.', _chart_schema("{items:[{id, label, value, color?}]}")),
+    'histogram': ('Histogram of numeric values, binned on the server.',
+                  _chart_schema("{values:[...], bins?: integer | 'fd' | 'sturges' | 'auto', log?: boolean}")),
+    'horizontal_bar': ('Horizontal bar chart.', _chart_schema("{labels:[...], values:[...]}")),
+    'grouped_bar': ('Grouped bar chart.', _chart_schema(_SERIES)),
+    'scatter': ('Scatter plot.', _chart_schema("{points:[{x, y, r?, color?}]}")),
+    'treemap': ('Treemap of a hierarchy.', _chart_schema("{name, children:[{name, value, color?}]}")),
+    'tree': ('Tree / dendrogram of a hierarchy.', _chart_schema("{name, children:[...]}")),
+    'force': ('Force-directed network.', _chart_schema("{nodes:[{id}], links:[{source, target}]}")),
+    'chord': ('Chord diagram (placeholder).', _chart_schema('adjacency matrix')),
+    'sankey': ('Sankey diagram (placeholder).', _chart_schema('nodes and links')),
+    'choropleth': ('Choropleth map (placeholder).', _chart_schema('GeoJSON with per-feature values')),
+    'radar': ('Radar chart (placeholder).', _chart_schema('records with the same keys')),
+    'calendar_heatmap': ('Calendar heatmap (placeholder).', _chart_schema('[{date, value}]')),
+    'parallel_coords': ('Parallel coordinates (placeholder).', _chart_schema('records with the same keys')),
+    'render_from_dataset': (
+        'Render a normalized payload, picking the chart from chart_type or the data shape; html is saved as-is.',
+        {
+            'type': 'object',
+            'properties': {
+                'title': {'type': 'string'},
+                'chart_type': {'type': 'string', 'description': 'Hint such as pie, donut, bar, line or packed'},
+                'data': {'type': ['object', 'array'], 'description': _SERIES},
+                'html': {'type': 'string', 'description': 'Complete HTML document to save'},
+                'response_mode': _RESPONSE_MODE_PROPERTY,
+                'assets': _ASSETS_PROPERTY,
+                'max_points': _MAX_POINTS_PROPERTY,
+            },
+        },
+    ),
+    'merge_timeseries': (
+        'Merge several time series into one {labels, datasets} payload with aligned labels.',
+        {
+            'type': 'object',
+            'properties': {
+                'series': {'type': 'array', 'description': "[{label, labels:[...], data:[...], color?}]"},
+                'items': {'type': 'array', 'description': "[{id, result:[{month, value}, ...]}]"},
+                'response_mode': _RESPONSE_MODE_PROPERTY,
+            },
+        },
+    ),
+}
+
+
 def merge_timeseries_tool(args: dict):
     """Merge multiple timeseries (list of series or dict of plan results) into normalized {labels, datasets}.
     Expected input shapes:
@@ -718,22 +1430,24 @@ def handle_template(args, chart_type='line', stacked=False):
     ct = chart_type.lower() if isinstance(chart_type, str) else None
     # explicit packed/proportional
     if ct in ('packed', 'pack', 'proportional') or (isinstance(payload, dict) and 'items' in payload):
-        script = to_js_var(payload, 'data') + script_packed('data')
-        html_text = BASE_HTML.replace('{title}', html.escape(title)).replace('{script}', script)
+        html_text = render_page(title, script_packed('data'), payload, args.get('assets'))
         path = save_html(html_text, prefix='packed')
         return {'status':'ok', 'path': path, 'html': html_text}
     # explicit bubble
     if ct == 'bubble':
-        script = to_js_var(payload, 'data') + script_bubble('data')
-        html_text = BASE_HTML.replace('{title}', html.escape(title)).replace('{script}', script)
+        html_text = render_page(title, script_bubble('data'), payload, args.get('assets'))
         path = save_html(html_text, prefix='bubble')
         return {'status':'ok', 'path': path, 'html': html_text}
     # explicit heatmap
     if ct == 'heatmap':
-        script = to_js_var(payload, 'data') + script_heatmap('data')
-        html_text = BASE_HTML.replace('{title}', html.escape(title)).replace('{script}', script)
+        try:
+            prepared, info = prepare_heatmap(payload, args.get('max_rows'), args.get('max_cols'),
+                                             args.get('levels'), args.get('aggregate') or 'mean')
+        except (TypeError, ValueError) as e:
+            return {'status':'error','message':'invalid_heatmap','error':str(e)}
+        html_text = render_page(title, script_heatmap('data'), prepared if prepared is not None else payload, args.get('assets'))
         path = save_html(html_text, prefix='heatmap')
-        return {'status':'ok', 'path': path, 'html': html_text}
+        return dict({'status':'ok', 'path': path, 'html': html_text}, **(info or {}))
 
     # fallback ensure payload has labels/datasets
     labels = payload.get('labels') if isinstance(payload, dict) else None
@@ -745,31 +1459,36 @@ def handle_template(args, chart_type='line', stacked=False):
             datasets = [{'label':'Value','data':payload['values']}]
         else:
             # as last resort return an error html (use replace to avoid formatting CSS braces)
-            html_text = BASE_HTML.replace('{title}', html.escape(title)).replace('{script}', "console.error('No data provided to render chart')")
+            html_text = render_page(title, "console.error('No data provided to render chart')", assets_mode=args.get('assets'))
             path = save_html(html_text, prefix='error_chart')
             return {'status':'error','message':'no_data','path':path,'html':html_text}
     # select script
+    points_dropped = None
     if chart_type=='line':
-        script = to_js_var(payload,'data') + script_line('data')
+        payload, points_dropped = downsample_series(payload, args.get('max_points'))
+        script = script_line('data')
     elif chart_type=='bar' and not stacked:
-        script = to_js_var(payload,'data') + script_bar('data', stacked=False)
+        script = script_bar('data', stacked=False)
     elif chart_type=='bar' and stacked:
-        script = to_js_var(payload,'data') + script_bar('data', stacked=True)
+        script = script_bar('data', stacked=True)
     elif chart_type=='pie' or chart_type=='donut':
-        script = to_js_var(payload,'data') + script_pie('data', donut=(chart_type=='donut'))
+        script = script_pie('data', donut=(chart_type=='donut'))
     elif chart_type=='bubble':
-        script = to_js_var(payload,'data') + script_bubble('data')
+        script = script_bubble('data')
     elif chart_type=='heatmap':
-        script = to_js_var(payload,'data') + script_heatmap('data')
+        script = script_heatmap('data')
     elif isinstance(chart_type, str) and chart_type.lower() in ('packed','pack','proportional'):
-        script = to_js_var(payload,'data') + script_packed('data')
+        script = script_packed('data')
     else:
-        script = to_js_var(payload,'data') + script_line('data')
-    # Use simple replace to inject title and script. Avoid str.format because the
-    # JavaScript template contains many braces which interfere with Python formatting.
-    html_text = BASE_HTML.replace('{title}', html.escape(title)).replace('{script}', script)
+        script = script_line('data')
+    # The page template is precompiled (see Template); str.format would trip over the
+    # many braces in the CSS and JavaScript.
+    html_text = render_page(title, script, payload, args.get('assets'))
     path = save_html(html_text, prefix=chart_type)
-    return {'status':'ok','path':path,'html':html_text}
+    resp = {'status':'ok','path':path,'html':html_text}
+    if points_dropped is not None:
+        resp['points_dropped'] = points_dropped
+    return resp
 
 
 def render_from_dataset_tool(args: dict):
@@ -811,7 +1530,7 @@ def render_from_dataset_tool(args: dict):
         # If the caller explicitly asked for a packed/proportional chart, route to handle_template
         if isinstance(chart_type_hint, str) and str(chart_type_hint).strip().lower() in ('packed', 'pack', 'proportional'):
             # Use handle_template which selects the D3 packed template when chart_type='packed'
-            html_result = handle_template({'data': payload, 'title': args.get('title') or args.get('chart_title') or 'Chart'}, chart_type='packed')
+            html_result = handle_template({'data': payload, 'title': args.get('title') or args.get('chart_title') or 'Chart', 'assets': args.get('assets')}, chart_type='packed')
             return html_result
 
         # Heuristic: if caller passed a normalized Chart.js-style payload (labels + single numeric dataset)
@@ -841,42 +1560,301 @@ def render_from_dataset_tool(args: dict):
                             if colors and i < len(colors):
                                 item['color'] = colors[i]
                             items.append(item)
-                        html_result = handle_template({'data': {'items': items}, 'title': args.get('title') or args.get('chart_title') or 'Chart'}, chart_type='packed')
+                        html_result = handle_template({'data': {'items': items}, 'title': args.get('title') or args.get('chart_title') or 'Chart', 'assets': args.get('assets')}, chart_type='packed')
                         return html_result
         except Exception:
             # fall through to default renderer
             pass
 
+        points_dropped = None
+        if chart_type_hint is None or str(chart_type_hint).strip().lower() in ('line', 'multi_line', 'area'):
+            payload, points_dropped = downsample_series(payload, args.get('max_points'))
+            if isinstance(payload, dict):
+                # Chart.js pages draw a point per value unless the dataset sets pointRadius;
+                # payload may still be the caller's dict, so it is copied, not edited
+                markers = payload.get('markers', True)
+                payload = {k: v for k, v in payload.items() if k != 'markers'}
+                if markers is False and isinstance(payload.get('datasets'), list):
+                    payload['datasets'] = [dict(ds, pointRadius=0) if isinstance(ds, dict) and 'pointRadius' not in ds
+                                           else ds for ds in payload['datasets']]
         html_text = render_chart_html_from_dataset(payload, title_text=args.get('title') or args.get('chart_title') or 'Chart', chart_type=chart_type_hint)
+        html_text = localize_assets(html_text, args.get('assets'))
         path = save_html(html_text, prefix='render')
-        return {'status':'ok','path':path,'html':html_text}
+        resp = {'status':'ok','path':path,'html':html_text}
+        if points_dropped:
+            resp['points_dropped'] = points_dropped
+        return resp
     except Exception as e:
         tb = traceback.format_exc()
         return {'status':'error','message':'render_failed','error':str(e),'trace':tb}
 
-# Main loop: read lines from stdin
-if __name__ == '__main__':
-    for line in sys.stdin:
+# Request handling: one JSON request per stdin line, one JSON response per stdout line.
+# Requests are rendered by a small worker pool. A request carrying an "id" gets it echoed
+# in its response and may be answered out of order; requests without one (the legacy
+# protocol) can only be matched by position, so their responses keep arrival order.
+D3_WORKERS = max(1, int(os.getenv('D3_WORKERS', '4')))
+# requests read but not yet answered; stdin is not read further while this many are pending
+D3_MAX_INFLIGHT = max(1, int(os.getenv('D3_MAX_INFLIGHT', '32')))
+# smaller requests with an id overtake bigger ones: a request of N bytes yields to at most
+# N // D3_OVERTAKE_BYTES requests that arrive after it, so big renders are delayed but never starved
+D3_OVERTAKE_BYTES = max(1, int(os.getenv('D3_OVERTAKE_BYTES', '4096')))
+
+
+# Render cache: clients re-request identical charts all the time. Successful renders are
+# remembered under a hash of the canonical (tool, arguments) JSON; a repeat call returns the
+# saved artifact without building the template or touching the disk. Bounded by entries and
+# by the size of the cached html, least recently used first out. Evicting never deletes files.
+RENDER_CACHE_ENTRIES = int(os.getenv('D3_RENDER_CACHE_ENTRIES', '256'))
+RENDER_CACHE_BYTES = int(os.getenv('D3_RENDER_CACHE_BYTES', str(64 * 1024 * 1024)))
+
+
+def render_key(tool, args) -> str:
+    canonical = json.dumps([tool, args], sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class RenderCache:
+    def __init__(self, max_entries: int = RENDER_CACHE_ENTRIES, max_bytes: int = RENDER_CACHE_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = OrderedDict()  # key -> (response, size)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+        # the artifact may have been moved away by the client since (see move_chart_to_client)
+        if not os.path.exists(entry[0]['path']):
+            self.discard(key)
+            return None
+        return dict(entry[0], cached=True)
+
+    def put(self, key, resp):
+        size = len(resp.get('html') or '')
+        if self.max_entries <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (resp, size)
+            self.nbytes += size
+            while len(self._entries) > self.max_entries or self.nbytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.nbytes -= evicted
+
+    def discard(self, key):
+        with self._lock:
+            self._discard(key)
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.nbytes -= entry[1]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+render_cache = RenderCache()
+
+# What a render returns: the saved file path, the HTML document, or both. File-based callers
+# only read the path, and echoing the whole document (dataset included) over stdout costs a
+# second JSON encode/decode of it per render, so path is the default. Per request, set
+# "response_mode" next to "tool" or inside the arguments.
+RESPONSE_MODE = os.getenv('D3_RESPONSE_MODE', 'path').strip().lower()
+
+
+def _shape_response(resp, mode):
+    if not isinstance(resp, dict) or mode == 'both':
+        return resp
+    drop = 'html' if mode == 'path' else 'path'
+    return {k: v for k, v in resp.items() if k != drop} if drop in resp else resp
+
+
+def handle_request(req):
+    """Dispatch one decoded request {tool, arguments[, id][, response_mode]} and return the response dict."""
+    tool = req.get('tool') or req.get('name')
+    args = req.get('arguments') or req.get('args') or req.get('payload') or {}
+    mode = req.get('response_mode') or RESPONSE_MODE
+    if isinstance(args, dict) and 'response_mode' in args:
+        mode = args['response_mode']
+        args = {k: v for k, v in args.items() if k != 'response_mode'}
+    handler = TOOLS.get(tool)
+    if mode not in RESPONSE_MODES:
+        resp = {'status':'error','message':'invalid_response_mode','response_mode':mode,
+                'expected':list(RESPONSE_MODES)}
+    elif isinstance(args, dict) and args.get('assets') not in (None, *ASSET_MODES):
+        resp = {'status':'error','message':'invalid_assets','assets':args['assets'],
+                'expected':list(ASSET_MODES)}
+    elif not handler:
+        resp = {'status':'error','message':'unknown_tool','tool':tool}
+    else:
+        if mode != 'path' and isinstance(args, dict) and (args.get('assets') or ASSET_MODE) == 'local':
+            # relative assets/ links break wherever the caller puts the document
+            args = dict(args, assets='inline')
+        key = render_key(tool, args)
+        resp = render_cache.get(key)
+        if resp is None:
+            try:
+                resp = handler(args)
+            except Exception as e:
+                tb = traceback.format_exc()
+                resp = {'status':'error','message':'handler_exception','error':str(e), 'trace': tb}
+            if isinstance(resp, dict) and resp.get('status') == 'ok' and resp.get('path'):
+                render_cache.put(key, resp)
+        resp = _shape_response(resp, mode)
+    if 'id' in req and isinstance(resp, dict):
+        resp = dict(resp, id=req['id'])
+    return resp
+
+
+# MCP over stdio: JSON-RPC 2.0 messages on the same line-delimited stream. A line with
+# "jsonrpc" is answered as MCP, anything else as the legacy {tool, arguments} protocol,
+# so one long-lived MCP session can serve many renders and old callers keep working.
+SERVER_INFO = {'name': 'd3-charts', 'version': '1.0.0'}
+PROTOCOL_VERSIONS = ('2025-06-18', '2025-03-26', '2024-11-05')
+
+
+def _rpc_error(msg_id, code, message):
+    return {'jsonrpc': '2.0', 'id': msg_id, 'error': {'code': code, 'message': message}}
+
+
+def _rpc_tools_call(params):
+    name = params.get('name')
+    if name not in TOOLS:
+        return {'content': [{'type': 'text', 'text': f'Unknown tool: {name}'}], 'isError': True}
+    resp = handle_request({'tool': name, 'arguments': params.get('arguments') or {}})
+    return {
+        'content': [{'type': 'text', 'text': json.dumps(resp)}],
+        'structuredContent': resp,
+        'isError': not (isinstance(resp, dict) and resp.get('status') == 'ok'),
+    }
+
+
+def handle_rpc(msg):
+    """Answer one JSON-RPC message; notifications (no id) get no response."""
+    msg_id = msg.get('id')
+    method = msg.get('method')
+    params = msg.get('params') or {}
+    if 'id' not in msg:
+        return None
+    if not isinstance(method, str) or not isinstance(params, dict):
+        return _rpc_error(msg_id, -32600, 'Invalid Request')
+    if method == 'initialize':
+        requested = params.get('protocolVersion')
+        result = {
+            'protocolVersion': requested if requested in PROTOCOL_VERSIONS else PROTOCOL_VERSIONS[0],
+            'capabilities': {'tools': {'listChanged': False}},
+            'serverInfo': SERVER_INFO,
+            'instructions': 'Render D3 charts to HTML files; each tool returns the saved path.',
+        }
+    elif method == 'ping':
+        result = {}
+    elif method == 'tools/list':
+        result = {'tools': [{'name': name, 'description': desc, 'inputSchema': schema}
+                            for name, (desc, schema) in TOOL_SCHEMAS.items() if name in TOOLS]}
+    elif method == 'tools/call':
+        result = _rpc_tools_call(params)
+    else:
+        return _rpc_error(msg_id, -32601, f'Method not found: {method}')
+    return {'jsonrpc': '2.0', 'id': msg_id, 'result': result}
+
+
+def parse_line(line: str):
+    """Decode one request line; returns (request, None) or (None, error response)."""
+    try:
+        req = json.loads(line)
+    except Exception as e:
+        if '"jsonrpc"' in line:
+            return None, _rpc_error(None, -32700, f'Parse error: {e}')
+        return None, {'status':'error','message':'invalid_json','error':str(e)}
+    if not isinstance(req, dict):
+        return None, {'status':'error','message':'invalid_request','error':'expected a JSON object'}
+    return req, None
+
+
+def dispatch(req: dict):
+    if 'jsonrpc' in req:
+        return handle_rpc(req)
+    return handle_request(req)
+
+
+def handle_line(line: str):
+    req, error = parse_line(line)
+    return error if req is None else dispatch(req)
+
+
+def serve(stdin=None, stdout=None, workers: int = None, max_inflight: int = None):
+    """Read requests from stdin until EOF and answer them from a pool of worker threads."""
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    workers = workers or D3_WORKERS
+    inflight = threading.BoundedSemaphore(max_inflight or D3_MAX_INFLIGHT)
+    pending = queue.PriorityQueue()
+    write_lock = threading.Lock()
+    # id-less responses are held back until every earlier id-less one is written;
+    # a held response keeps its in-flight slot so the backlog stays bounded
+    held = {}
+    next_turn = [0]
+
+    def write(resp):
+        if resp is not None:
+            stdout.write(json.dumps(resp) + '\n')
+            stdout.flush()
+
+    def work():
+        while True:
+            _, _, job = pending.get()
+            if job is None:
+                return
+            turn, req, resp = job
+            try:
+                if req is not None:
+                    resp = dispatch(req)
+            except Exception as e:
+                # every request must be answered, or the id-less responses behind it would stall
+                if 'jsonrpc' in req:
+                    resp = _rpc_error(req.get('id'), -32603, f'Internal error: {e}')
+                else:
+                    resp = {'status':'error','message':'internal_error','error':str(e)}
+            with write_lock:
+                if turn is None:
+                    write(resp)
+                    inflight.release()
+                    continue
+                held[turn] = resp
+                while next_turn[0] in held:
+                    write(held.pop(next_turn[0]))
+                    next_turn[0] += 1
+                    inflight.release()
+
+    threads = [threading.Thread(target=work, name=f'd3-worker-{n}', daemon=True) for n in range(workers)]
+    for t in threads:
+        t.start()
+    seq = turns = 0
+    for line in stdin:
         line = line.strip()
         if not line:
             continue
-        try:
-            req = json.loads(line)
-        except Exception as e:
-            resp = {'status':'error','message':'invalid_json','error':str(e)}
-            print(json.dumps(resp), flush=True)
-            continue
-        tool = req.get('tool') or req.get('name')
-        args = req.get('arguments') or req.get('args') or req.get('payload') or {}
-        handler = TOOLS.get(tool)
-        if not handler:
-            resp = {'status':'error','message':'unknown_tool','tool':tool}
-            print(json.dumps(resp), flush=True)
-            continue
-        try:
-            result = handler(args)
-            print(json.dumps(result), flush=True)
-        except Exception as e:
-            tb = traceback.format_exc()
-            resp = {'status':'error','message':'handler_exception','error':str(e), 'trace': tb}
-            print(json.dumps(resp), flush=True)
+        inflight.acquire()
+        seq += 1
+        req, error = parse_line(line)
+        if req is not None and req.get('id') is not None:
+            pending.put((seq + len(line) // D3_OVERTAKE_BYTES, seq, (None, req, None)))
+        else:
+            pending.put((seq, seq, (turns, req, error)))
+            turns += 1
+    # EOF: the stop markers sort after every request still queued
+    for _ in threads:
+        seq += 1
+        pending.put((float('inf'), seq, None))
+    for t in threads:
+        t.join()
+    flush_writes()
+
+
+if __name__ == '__main__':
+    serve()
@@ -0,0 +1,353 @@
+"""The D3 stdio server: line and MCP protocols, render cache and artifact writes."""
+import json
+import math
+import os
+import re
+import stat
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent
+SERVER = ROOT / 'mcp_d3_stdio_server.py'
+sys.path.insert(0, str(ROOT))
+
+
+def _vendor(path):
+    """A vendor directory with small stand-ins for the libraries, enough to publish a bundle."""
+    path.mkdir(exist_ok=True)
+    (path / 'd3.v7.min.js').write_text('/* d3 */ var d3 = {}; "</script>";')
+    (path / 'chart.umd.min.js').write_text('/* chart.js */ var Chart = function () {};')
+    return path
+
+
+@pytest.fixture
+def server(tmp_path, tmp_path_factory, monkeypatch):
+    import mcp_d3_stdio_server as server
+
+    monkeypatch.setattr(server, 'OUTDIR', tmp_path)
+    monkeypatch.setattr(server, 'render_cache', server.RenderCache())
+    monkeypatch.setattr(server, 'assets', server.AssetBundle(_vendor(tmp_path_factory.mktemp('vendor'))))
+    return server
+
+
+def _spawn(tmp_path, **env):
+    env.setdefault('D3_VENDOR_DIR', str(_vendor(tmp_path / 'vendor')))
+    return subprocess.Popen([sys.executable, str(SERVER)], cwd=ROOT, text=True,
+                            env=dict(os.environ, D3_OUTDIR=str(tmp_path), **env),
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+
+def _exchange(proc, requests):
+    out, _ = proc.communicate(''.join(json.dumps(r) + '\n' for r in requests), timeout=60)
+    return [json.loads(line) for line in out.splitlines()]
+
+
+def _heatmap(n):
+    return {'xLabels': [f'x{i}' for i in range(n)], 'yLabels': [f'y{i}' for i in range(n)],
+            'values': [[i * j for j in range(n)] for i in range(n)]}
+
+
+PIE = {'labels': ['A', 'B'], 'datasets': [{'data': [60, 40]}]}
+
+
+def test_ids_are_echoed_and_small_requests_overtake_big_ones(tmp_path):
+    big = [{'id': f'big-{n}', 'tool': 'heatmap', 'arguments': {'title': f'Big {n}', 'data': _heatmap(300)}}
+           for n in range(4)]
+    small = {'id': 'small', 'tool': 'pie', 'arguments': {'title': 'Pie', 'data': PIE}}
+    responses = _exchange(_spawn(tmp_path, D3_WORKERS='1'), big + [small])
+
+    assert sorted(r['id'] for r in responses) == ['big-0', 'big-1', 'big-2', 'big-3', 'small']
+    assert all(r['status'] == 'ok' for r in responses)
+    assert [r['id'] for r in responses].index('small') < 4
+
+
+def test_legacy_requests_without_id_still_get_one_answer_each(tmp_path):
+    proc = _spawn(tmp_path)
+    responses = _exchange(proc, [{'tool': 'pie', 'arguments': {'data': PIE}}, {'tool': 'nope'}])
+    assert sorted(r['status'] for r in responses) == ['error', 'ok']
+    assert all('id' not in r for r in responses)
+    assert proc.returncode == 0
+
+
+def test_legacy_requests_without_id_are_answered_in_request_order(tmp_path):
+    requests = [{'tool': 'heatmap', 'arguments': {'title': 'Big', 'data': _heatmap(300)}},
+                {'tool': 'pie', 'arguments': {'title': 'Pie', 'data': PIE}},
+                {'tool': 'nope'},
+                {'id': 'tagged', 'tool': 'donut', 'arguments': {'title': 'Donut', 'data': PIE}},
+                {'tool': 'bar', 'arguments': {'title': 'Bar', 'data': PIE}}]
+    responses = _exchange(_spawn(tmp_path, D3_WORKERS='4', D3_OVERTAKE_BYTES='1'), requests)
+
+    untagged = [r for r in responses if 'id' not in r]
+    assert [Path(r['path']).name.split('_')[0] if r['status'] == 'ok' else r['status'] for r in untagged] == [
+        'heatmap', 'pie', 'error', 'bar']
+    # a request with an id is still free to overtake the big render
+    assert [r.get('id') for r in responses].index('tagged') < responses.index(untagged[0])
+
+
+def test_mcp_session_lists_tools_and_serves_pipelined_renders(tmp_path):
+    import anyio
+    from mcp import ClientSession, StdioServerParameters
+    from mcp.client.stdio import stdio_client
+
+    params = StdioServerParameters(command=sys.executable, args=[str(SERVER)], cwd=str(ROOT),
+                                   env=dict(os.environ, D3_OUTDIR=str(tmp_path),
+                                            D3_VENDOR_DIR=str(_vendor(tmp_path / 'vendor'))))
+
+    async def session_run():
+        async with stdio_client(params) as (reader, writer):
+            async with ClientSession(reader, writer) as session:
+                init = await session.initialize()
+                tools = {t.name: t for t in (await session.list_tools()).tools}
+                results = {}
+
+                async def call(n):
+                    results[n] = await session.call_tool('pie', {'title': f'Pie {n}', 'data': PIE})
+
+                async with anyio.create_task_group() as tg:
+                    for n in range(6):
+                        tg.start_soon(call, n)
+                missing = await session.call_tool('nope', {})
+                await session.send_ping()
+                return init, tools, results, missing
+
+    init, tools, results, missing = anyio.run(session_run)
+    assert init.serverInfo.name == 'd3-charts'
+    assert tools['heatmap'].inputSchema['required'] == ['data']
+    assert {'line', 'pie', 'render_from_dataset', 'merge_timeseries'} <= set(tools)
+    assert len(results) == 6 and not any(r.isError for r in results.values())
+    assert all(Path(r.structuredContent['path']).exists() for r in results.values())
+    assert missing.isError
+
+
+def test_repeat_renders_are_served_from_the_cache(server, tmp_path, monkeypatch):
+    first = server.handle_request({'tool': 'pie', 'arguments': {'title': 'Pie', 'data': PIE}})
+    save_html = server.save_html
+    saves = []
+    monkeypatch.setattr(server, 'save_html', lambda *a, **k: saves.append(a) or str(tmp_path / 'x.html'))
+    # canonical key: argument order does not matter
+    again = server.handle_request({'tool': 'pie', 'arguments': {'data': {'datasets': PIE['datasets'], 'labels': PIE['labels']},
+                                                                'title': 'Pie'}})
+    assert again['path'] == first['path'] and again['cached'] and saves == []
+    assert 'cached' not in first
+
+    other = server.handle_request({'tool': 'donut', 'arguments': {'title': 'Pie', 'data': PIE}})
+    assert len(saves) == 1 and not other.get('cached')
+
+    # a moved-away artifact is rendered again
+    monkeypatch.setattr(server, 'save_html', save_html)
+    os.remove(first['path'])
+    redone = server.handle_request({'tool': 'pie', 'arguments': {'title': 'Pie', 'data': PIE}})
+    assert not redone.get('cached') and os.path.exists(redone['path'])
+
+
+def test_render_cache_evicts_least_recently_used(tmp_path):
+    import mcp_d3_stdio_server as server
+
+    cache = server.RenderCache(max_entries=2, max_bytes=10)
+    for key in 'abc':
+        (tmp_path / key).write_text(key)
+    cache.put('a', {'path': str(tmp_path / 'a'), 'html': 'aaaa'})
+    cache.put('b', {'path': str(tmp_path / 'b'), 'html': 'bbbb'})
+    assert cache.get('a')['cached']
+    cache.put('c', {'path': str(tmp_path / 'c'), 'html': 'cccc'})
+    assert cache.get('b') is None and cache.get('a') and cache.get('c')
+    cache.put('d', {'path': str(tmp_path / 'c'), 'html': 'd' * 8})
+    assert len(cache) == 1 and cache.nbytes == 8
+
+
+@pytest.mark.parametrize('mode, file_syncs', [('fsync', 3), ('batch', 3), ('none', 0)])
+def test_durability_modes_write_atomically(server, tmp_path, monkeypatch, mode, file_syncs):
+    synced = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(server, 'DURABILITY', mode)
+    monkeypatch.setattr(server, '_syncer', server._BatchSyncer(0.01))
+    monkeypatch.setattr(os, 'fsync', lambda fd: synced.append(os.fstat(fd).st_mode) or real_fsync(fd))
+
+    paths = [server.save_html(f'<html>{n}</html>', prefix='p') for n in range(3)]
+    server.flush_writes(timeout=5)
+    assert [Path(p).read_text() for p in paths] == [f'<html>{n}</html>' for n in range(3)]
+    assert sorted(os.listdir(tmp_path)) == sorted(Path(p).name for p in paths)  # no temp files left
+    assert sum(stat.S_ISREG(m) for m in synced) == file_syncs
+
+
+def test_response_mode_selects_path_html_or_both(server):
+    # cdn pages are the same on disk and inline; local ones are inlined when returned
+    call = {'tool': 'pie', 'arguments': {'title': 'Pie', 'data': PIE, 'assets': 'cdn'}}
+    by_path = server.handle_request(call)
+    assert by_path['status'] == 'ok' and 'html' not in by_path
+
+    by_html = server.handle_request(dict(call, response_mode='html'))
+    assert 'path' not in by_html and by_html['html'] == Path(by_path['path']).read_text(encoding='utf-8')
+
+    both = server.handle_request({'tool': 'pie', 'arguments': dict(call['arguments'], response_mode='both')})
+    assert both['path'] == by_path['path'] and both['html'] == by_html['html'] and both['cached']
+
+    bad = server.handle_request(dict(call, response_mode='inline'))
+    assert bad['status'] == 'error' and bad['message'] == 'invalid_response_mode'
+
+
+def test_precompiled_page_matches_the_replace_chain(server):
+    payload = {'labels': ['</script>', 'B'], 'datasets': [{'data': [1, 2]}]}
+    head, libs = server.asset_tags('cdn')
+    expected = server.BASE_HTML.replace('{title}', 'A &amp; B').replace('{head}', head).replace('{libs}', libs).replace(
+        '{script}', server.to_js_var(payload, 'data') + server.script_pie('data', donut=True))
+    assert server.render_page('A & B', server.script_pie('data', donut=True), payload, 'cdn') == expected
+    assert server.Template('{a}-{b}-{a}', ('{a}', '{b}')).render(**{'{a}': 'x', '{b}': ['y', 'z']}) == 'x-yz-x'
+
+
+def test_pages_use_the_hashed_asset_bundle_or_inline_it(server, tmp_path):
+    call = {'tool': 'pie', 'arguments': {'title': 'Pie', 'data': PIE}, 'response_mode': 'html'}
+
+    local = Path(server.handle_request(dict(call, response_mode='path'))['path']).read_text(encoding='utf-8')
+    published = sorted(p.name for p in (tmp_path / 'assets').iterdir())
+    assert [re.sub('[0-9a-f]{12}', 'H', name) for name in published] == ['chart.umd.min.H.js', 'charts.H.css',
+                                                                           'd3.v7.min.H.js']
+    assert "assets/charts." in local and "assets/d3.v7.min." in local
+    assert 'https://' not in local
+
+    inline = server.handle_request(dict(call, arguments=dict(call['arguments'], assets='inline')))['html']
+    assert 'var d3 = {}; "<\\/script>";' in inline and 'assets/' not in inline
+
+    cdn = server.handle_request(dict(call, arguments=dict(call['arguments'], assets='cdn')))['html']
+    assert "<script src='https://d3js.org/d3.v7.min.js'></script>" in cdn and 'assets/' not in cdn
+    assert 'googleapis' not in cdn
+
+    # pages built by chart_renderer (Chart.js and d3) are pointed at the bundle too
+    for chart_type in ('donut', 'line'):
+        page = server.localize_assets(server.render_chart_html_from_dataset(PIE, chart_type=chart_type), 'local')
+        assert 'https://' not in page and 'assets/' in page
+    assert server.handle_request({'tool': 'pie', 'arguments': {'data': PIE, 'assets': 'web'}})['message'] == 'invalid_assets'
+
+
+def test_missing_vendored_library_fails_the_render_loudly(server):
+    (server.assets.vendor_dir / 'chart.umd.min.js').unlink()
+    for assets in ('local', 'inline'):
+        resp = server.handle_request({'tool': 'pie', 'arguments': {'data': PIE, 'assets': assets}})
+        assert resp['status'] == 'error' and 'chart.umd.min.js is missing' in resp['error']
+    assert server.handle_request({'tool': 'pie', 'arguments': {'data': PIE, 'assets': 'cdn'}})['status'] == 'ok'
+
+
+def test_returned_html_is_self_contained_and_styled(server):
+    call = {'tool': 'pie', 'arguments': {'title': 'Pie', 'data': PIE}, 'response_mode': 'html'}
+    assert server.ASSET_MODE == 'local'
+    for mode in ('html', 'both'):
+        page = server.handle_request(dict(call, response_mode=mode))['html']
+        assert server.CHART_CSS in page and 'assets/' not in page
+    on_disk = Path(server.handle_request(dict(call, response_mode='path'))['path']).read_text(encoding='utf-8')
+    assert "<link rel='stylesheet' href='assets/charts." in on_disk
+
+
+def _long_series(n):
+    import math
+    values = [round(math.sin(i / 50.0) * 10, 3) for i in range(n)]
+    values[n // 3] = 500  # a spike LTTB has to keep
+    return {'labels': [f'd{i}' for i in range(n)],
+            'datasets': [{'label': 'a', 'data': values}, {'label': 'b', 'data': [i % 7 for i in range(n)]}]}
+
+
+def test_lttb_matches_with_and_without_numpy(server, monkeypatch):
+    values = _long_series(20000)['datasets'][0]['data']
+    with_numpy = server.lttb_indices(values, 500)
+    monkeypatch.setattr(server, '_np', False)
+    assert server.lttb_indices(values, 500) == with_numpy
+    assert len(with_numpy) == 500 and with_numpy[0] == 0 and with_numpy[-1] == 19999
+    assert 20000 // 3 in with_numpy
+    assert server.lttb_indices(values[:10], 500) == list(range(10))
+
+
+def test_max_points_holds_per_series_when_series_disagree(server):
+    n = 5000
+    payload = {'labels': list(range(n)),
+               'datasets': [{'data': [math.sin(i / (7 + k)) * (i % (11 + k)) for i in range(n)]} for k in range(4)]}
+    out, dropped = server.downsample_series(payload, 250)
+    assert 200 < len(out['labels']) <= 250 and dropped == 4 * (n - len(out['labels']))
+    assert all(len(ds['data']) == len(out['labels']) for ds in out['datasets'])
+    assert out['labels'][0] == 0 and out['labels'][-1] == n - 1
+
+
+def test_long_line_series_are_downsampled_and_lose_their_markers(server):
+    payload = _long_series(20000)
+    resp = server.handle_request({'tool': 'line', 'arguments': {'data': payload, 'max_points': 400}, 'response_mode': 'both'})
+    kept = 20000 * 2 - resp['points_dropped']
+    assert resp['status'] == 'ok' and kept % 2 == 0 and 300 < kept // 2 <= 400
+    assert '"markers": false' in resp['html'] and '"d6666"' in resp['html']
+    assert len(payload['labels']) == 20000  # the caller's payload is untouched
+
+    short = server.handle_request({'tool': 'multi_line', 'arguments': {'data': _long_series(50)}})
+    assert short['points_dropped'] == 0
+
+    dataset = server.handle_request({'tool': 'render_from_dataset', 'arguments': {'data': payload, 'chart_type': 'line'},
+                                     'response_mode': 'both'})
+    assert 0 < dataset['points_dropped'] < resp['points_dropped']  # default budget of 1000 points
+    assert 20000 - dataset['points_dropped'] // 2 <= 1000
+    assert '"pointRadius": 0' in dataset['html'] and '"markers"' not in dataset['html']
+    few = server.handle_request({'tool': 'render_from_dataset', 'arguments': {'data': _long_series(50), 'chart_type': 'line'},
+                                 'response_mode': 'html'})
+    assert '"pointRadius"' not in few['html']
+
+    # nothing to downsample: the caller's own dict reaches the renderer and must not be edited
+    unlabeled = {'datasets': [{'label': 'a', 'data': [1, 2, 3]}], 'markers': True}
+    resp = server.handle_request({'tool': 'render_from_dataset', 'arguments': {'data': unlabeled, 'chart_type': 'line'}})
+    assert resp['status'] == 'ok' and unlabeled['markers'] is True
+
+
+def test_histogram_is_binned_on_the_server(server, monkeypatch):
+    import random
+    rnd = random.Random(7)
+    values = [rnd.lognormvariate(3, 1) for _ in range(200000)] + [float('nan'), -1.0]
+
+    small = server.handle_request({'tool': 'histogram', 'arguments': {'data': {'values': values[:1000], 'bins': 'fd'}},
+                                   'response_mode': 'both'})
+    big = server.handle_request({'tool': 'histogram', 'arguments': {'data': {'values': values, 'bins': 20}},
+                                 'response_mode': 'both'})
+    assert big['bins'] == 20 and big['samples'] == 200001 and big['values_dropped'] == 1
+    assert abs(len(big['html']) - len(small['html'])) < 4000  # page size does not grow with the samples
+
+    for bins in (12, 'fd', 'sturges', 'auto'):
+        for log in (False, True):
+            with_numpy = server.histogram_bins(values[:5000], bins, log)
+            monkeypatch.setattr(server, '_np', False)
+            without = server.histogram_bins(values[:5000], bins, log)
+            monkeypatch.setattr(server, '_np', None)
+            assert without['counts'] == with_numpy['counts'] and without['edges'] == pytest.approx(with_numpy['edges'])
+            assert sum(with_numpy['counts']) == with_numpy['samples'] == 5000
+    assert server.histogram_bins(values[:5000], 'sturges')['rule'] == 'sturges'
+    assert len(server.histogram_bins(values[:5000], 'sturges')['counts']) == 14
+    assert server.histogram_bins(values[:5000], 'auto', log=True)['edges'][0] > 0
+
+    messy = [1, 2, None, 3, 'n/a', '4', float('inf')]
+    with_numpy = server.histogram_bins(messy, 5)
+    with monkeypatch.context() as m:
+        m.setattr(server, '_numpy', lambda: None)
+        assert server.histogram_bins(messy, 5) == with_numpy and with_numpy['dropped'] == 3
+
+    bad = server.handle_request({'tool': 'histogram', 'arguments': {'data': {'values': [1, 2], 'bins': 'many'}}})
+    assert bad['status'] == 'error' and bad['message'] == 'invalid_histogram'
+
+
+def test_large_heatmaps_are_aggregated_quantized_and_drawn_on_canvas(server, monkeypatch):
+    big = server.handle_request({'tool': 'heatmap', 'arguments': {'data': _heatmap(500)}, 'response_mode': 'both'})
+    assert big['status'] == 'ok' and big['renderer'] == 'canvas'
+    assert big['source_cells'] == 250000 and big['aggregated'] == [2, 1] and big['cells'] == 250 * 500
+    assert '"y0 – y1"' in big['html'] and '"canvas": true' in big['html']
+
+    small = server.handle_request({'tool': 'heatmap', 'arguments': {'data': {
+        'xLabels': ['Mon', 'Tue'], 'yLabels': ['W1', 'W2'], 'values': [[1, None], [3, 'x']]}}})
+    assert small['renderer'] == 'svg' and small['aggregated'] == [1, 1]
+
+    ragged = {'xLabels': [f'x{i}' for i in range(37)], 'yLabels': [f'y{i}' for i in range(23)],
+              'values': [[(i * 7 + j * 3) % 11 if (i + j) % 5 else None for j in range(37 - i % 3)] for i in range(23)]}
+    for aggregate in ('mean', 'max', 'sum'):
+        with_numpy, _ = server.prepare_heatmap(ragged, max_rows=5, max_cols=8, levels=16, aggregate=aggregate)
+        monkeypatch.setattr(server, '_np', False)
+        without, info = server.prepare_heatmap(ragged, max_rows=5, max_cols=8, levels=16, aggregate=aggregate)
+        monkeypatch.setattr(server, '_np', None)
+        assert without['q'] == with_numpy['q'] and without['values'] == pytest.approx(with_numpy['values'])
+        assert len(without['q']) == len(without['xLabels']) * len(without['yLabels']) == info['cells']
+        assert max(without['q']) == 'F' and min(without['q']) == '0'
+
+    bad = server.handle_request({'tool': 'heatmap', 'arguments': {'data': _heatmap(3), 'aggregate': 'median'}})
+    assert bad['message'] == 'invalid_heatmap'
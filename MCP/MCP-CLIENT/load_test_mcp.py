@@ -0,0 +1,485 @@
+"""
+Load generator for the PMO and D3 MCP servers.
+
+Starts the local PMO stand-in backend, then ramps N simulated clients per target
+through the stages given on the command line. Every client issues a weighted mix
+of tool calls until its stage ends:
+
+- pmo-stdio: each client spawns its own `pmo.py` over stdio (how the chat clients
+  use it) and talks MCP through the SDK client.
+- pmo-http: one `pmo.py --transport streamable-http` server shared by all clients.
+- d3-stdio:  each client spawns `mcp_d3_stdio_server.py` and sends chart renders in
+  its line protocol ({"tool", "arguments"} in, one JSON line out).
+- d3-mcp:    each client spawns `mcp_d3_stdio_server.py`, opens an MCP session
+  (initialize, notifications/initialized) and keeps --pipeline `tools/call`
+  requests in flight on it, matching JSON-RPC responses by id.
+
+Per stage and target it reports calls, throughput, p50/p95/p99 latency and error
+rate, plus the peak resident memory of the server processes (read from /proc, so
+RSS figures are Linux only). Charts are written to a temporary directory.
+
+Usage:
+    python load_test_mcp.py --stages 1,2,4,8 --stage-seconds 15
+    python load_test_mcp.py --targets pmo-http --stages 4,16,64 --json load.json
+    python load_test_mcp.py --targets d3-stdio,d3-mcp --pipeline 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+from mcp.client.streamable_http import streamablehttp_client
+
+HERE = Path(__file__).resolve().parent
+PMO_DIR = HERE.parent / "PMO"
+D3_DIR = HERE.parent / "CHARTS" / "mcp-d3-stdio-custom"
+sys.path.insert(0, str(PMO_DIR))
+
+from pmo_stand_in_backend import PORTFOLIOS, ROLES, StandInBackend  # noqa: E402
+
+TARGETS = ("pmo-stdio", "pmo-http", "d3-stdio", "d3-mcp")
+PROTOCOL_VERSION = "2025-06-18"
+
+Call = Tuple[str, Dict[str, Any]]
+
+
+def _pmo_mix(resources: int) -> List[Tuple[int, Callable[[random.Random], Call]]]:
+    """Weighted PMO tool calls: mostly small lookups, some rollups, a few bulk reads."""
+    return [
+        (4, lambda r: ("find_resources", {"resource_role": r.choice(ROLES), "limit": 10})),
+        (3, lambda r: ("get_filtered_projects", {
+            "fields": ["project_name", "rag_status"],
+            "filters": [{"column": "strategic_portfolio", "operator": "=", "value": r.choice(list(PORTFOLIOS))}],
+        })),
+        (2, lambda r: ("revenue_rollup", {"group_by": ["strategic_portfolio"]})),
+        (2, lambda r: ("get_resource_allocation_planned_actual", {
+            "resource_id": r.randint(1, resources), "start_date": "2025-01-01", "end_date": "2025-12-31",
+        })),
+        (1, lambda r: ("get_all_projects", {})),
+        (1, lambda r: ("forecast_capacity", {"periods": 8, "as_of": "2025-09-01"})),
+    ]
+
+
+def _d3_mix() -> List[Tuple[int, Callable[[random.Random], Call]]]:
+    def series(r: random.Random, n: int) -> Dict[str, Any]:
+        return {"labels": [f"W{i}" for i in range(n)], "datasets": [{"label": "hours", "data": [round(r.uniform(0, 40), 1) for _ in range(n)]}]}
+
+    return [
+        (3, lambda r: ("bar", {"title": "Load bar", "data": series(r, 12)})),
+        (3, lambda r: ("line", {"title": "Load line", "data": series(r, 200)})),
+        (2, lambda r: ("pie", {"title": "Load pie", "data": series(r, 5)})),
+        (1, lambda r: ("histogram", {"title": "Load histogram", "data": [r.gauss(30, 8) for _ in range(2000)]})),
+    ]
+
+
+def _pick(mix, rnd: random.Random) -> Call:
+    return rnd.choices([make for _, make in mix], weights=[w for w, _ in mix])[0](rnd)
+
+
+class Recorder:
+    """Collects (target, operation, stage, start offset, latency, ok) samples."""
+
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.samples: List[Tuple[str, str, int, float, float, bool]] = []
+        self.rss: List[Dict[str, Any]] = []
+        self.stage = 0
+
+    def add(self, target: str, op: str, started: float, ok: bool) -> None:
+        now = time.perf_counter()
+        self.samples.append((target, op, self.stage, started - self.t0, now - started, ok))
+
+
+class StageClock:
+    """Starts a stage's timed window once every client has connected (or failed to)."""
+
+    def __init__(self, clients: int, seconds: float):
+        self.pending = clients
+        self.seconds = seconds
+        self.started = 0.0
+        self.stop_at = float("inf")
+        self.go = asyncio.Event()
+
+    def connected(self) -> None:
+        self.pending -= 1
+        if self.pending <= 0 and not self.go.is_set():
+            self.started = time.perf_counter()
+            self.stop_at = self.started + self.seconds
+            self.go.set()
+
+    async def ready(self) -> float:
+        self.connected()
+        await self.go.wait()
+        return self.stop_at
+
+
+def _tool_failed(result) -> bool:
+    if result.isError:
+        return True
+    first = result.content[0].text if result.content and hasattr(result.content[0], "text") else ""
+    return first.lstrip().startswith('{"error"')
+
+
+async def _pmo_calls(session: ClientSession, target: str, stop_at: float, rec: Recorder, rnd: random.Random, mix) -> None:
+    while time.perf_counter() < stop_at:
+        tool, args = _pick(mix, rnd)
+        started = time.perf_counter()
+        try:
+            ok = not _tool_failed(await session.call_tool(tool, args))
+        except Exception:
+            ok = False
+        rec.add(target, tool, started, ok)
+
+
+async def pmo_stdio_client(clock: StageClock, rec: Recorder, rnd: random.Random, env: Dict[str, str], mix) -> None:
+    params = StdioServerParameters(command=sys.executable, args=[str(PMO_DIR / "pmo.py")], env=env, cwd=str(PMO_DIR))
+    started = time.perf_counter()
+    with open(os.devnull, "w") as errlog:
+        try:
+            async with stdio_client(params, errlog=errlog) as (read, write):
+                async with ClientSession(read, write) as session:
+                    await session.initialize()
+                    rec.add("pmo-stdio", "connect", started, True)
+                    await _pmo_calls(session, "pmo-stdio", await clock.ready(), rec, rnd, mix)
+        except Exception:
+            rec.add("pmo-stdio", "connect", started, False)
+            if not clock.go.is_set():
+                clock.connected()
+
+
+async def pmo_http_client(clock: StageClock, rec: Recorder, rnd: random.Random, url: str, mix) -> None:
+    started = time.perf_counter()
+    try:
+        async with streamablehttp_client(url) as (read, write, _):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                rec.add("pmo-http", "connect", started, True)
+                await _pmo_calls(session, "pmo-http", await clock.ready(), rec, rnd, mix)
+    except Exception:
+        rec.add("pmo-http", "connect", started, False)
+        if not clock.go.is_set():
+            clock.connected()
+
+
+async def _spawn_d3(env: Dict[str, str]) -> asyncio.subprocess.Process:
+    # responses carry the saved chart path (D3_RESPONSE_MODE=path, the default); the
+    # line limit only leaves room for a caller that switched to returning the HTML
+    return await asyncio.create_subprocess_exec(
+        sys.executable, str(D3_DIR / "mcp_d3_stdio_server.py"), cwd=str(D3_DIR), env=env,
+        stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL,
+        limit=1 << 24,
+    )
+
+
+async def _close_d3(proc: asyncio.subprocess.Process) -> None:
+    proc.stdin.close()
+    try:
+        await asyncio.wait_for(proc.wait(), 5)
+    except asyncio.TimeoutError:
+        proc.kill()
+
+
+async def d3_stdio_client(clock: StageClock, rec: Recorder, rnd: random.Random, env: Dict[str, str]) -> None:
+    started = time.perf_counter()
+    proc = await _spawn_d3(env)
+    rec.add("d3-stdio", "connect", started, True)
+    mix = _d3_mix()
+    stop_at = await clock.ready()
+    try:
+        while time.perf_counter() < stop_at:
+            tool, args = _pick(mix, rnd)
+            started = time.perf_counter()
+            try:
+                proc.stdin.write((json.dumps({"tool": tool, "arguments": args}) + "\n").encode("utf-8"))
+                await proc.stdin.drain()
+                line = await proc.stdout.readline()
+                ok = json.loads(line).get("status") == "ok"
+            except Exception:
+                ok = False
+            rec.add("d3-stdio", tool, started, ok)
+    finally:
+        await _close_d3(proc)
+
+
+class RpcPipe:
+    """JSON-RPC over a server's stdin/stdout with any number of requests in flight."""
+
+    def __init__(self, proc: asyncio.subprocess.Process):
+        self.proc = proc
+        self.next_id = 0
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.reader = asyncio.create_task(self._read())
+
+    async def _read(self) -> None:
+        try:
+            while True:
+                line = await self.proc.stdout.readline()
+                if not line:
+                    break
+                msg = json.loads(line)
+                waiter = self.pending.pop(msg.get("id"), None)
+                if waiter is not None and not waiter.done():
+                    waiter.set_result(msg)
+        finally:
+            for waiter in self.pending.values():
+                if not waiter.done():
+                    waiter.set_exception(ConnectionError("server closed its output"))
+
+    async def send(self, method: str, params: Dict[str, Any], notify: bool = False) -> Optional[Dict[str, Any]]:
+        msg: Dict[str, Any] = {"jsonrpc": "2.0", "method": method, "params": params}
+        waiter = None
+        if not notify:
+            self.next_id += 1
+            msg["id"] = self.next_id
+            waiter = self.pending[self.next_id] = asyncio.get_running_loop().create_future()
+        self.proc.stdin.write((json.dumps(msg) + "\n").encode("utf-8"))
+        await self.proc.stdin.drain()
+        return await waiter if waiter is not None else None
+
+    def close(self) -> None:
+        self.reader.cancel()
+
+
+async def d3_mcp_client(clock: StageClock, rec: Recorder, rnd: random.Random, env: Dict[str, str], pipeline: int) -> None:
+    started = time.perf_counter()
+    proc = await _spawn_d3(env)
+    _d3_mcp_pids.add(proc.pid)
+    rpc = RpcPipe(proc)
+    try:
+        try:
+            init = await rpc.send("initialize", {"protocolVersion": PROTOCOL_VERSION, "capabilities": {},
+                                                 "clientInfo": {"name": "load-test", "version": "0"}})
+            await rpc.send("notifications/initialized", {}, notify=True)
+            connected = "result" in init
+        except Exception:
+            connected = False
+        rec.add("d3-mcp", "connect", started, connected)
+        if not connected:
+            if not clock.go.is_set():
+                clock.connected()
+            return
+        mix = _d3_mix()
+        stop_at = await clock.ready()
+
+        async def lane() -> None:
+            while time.perf_counter() < stop_at:
+                tool, args = _pick(mix, rnd)
+                call_started = time.perf_counter()
+                try:
+                    response = await rpc.send("tools/call", {"name": tool, "arguments": args})
+                    ok = "result" in response and not response["result"].get("isError")
+                except Exception:
+                    ok = False
+                rec.add("d3-mcp", tool, call_started, ok)
+
+        await asyncio.gather(*(lane() for _ in range(max(1, pipeline))))
+    finally:
+        rpc.close()
+        await _close_d3(proc)
+        _d3_mcp_pids.discard(proc.pid)
+
+
+# --- server memory ------------------------------------------------------------
+
+# d3-stdio and d3-mcp clients spawn the same server script; these pids are the d3-mcp ones
+_d3_mcp_pids: set = set()
+
+
+def _server_kind(pid: int, cmdline: str) -> Optional[str]:
+    if "mcp_d3_stdio_server.py" in cmdline:
+        return "d3-mcp" if pid in _d3_mcp_pids else "d3-stdio"
+    if "pmo.py" in cmdline:
+        return "pmo-http" if "streamable-http" in cmdline else "pmo-stdio"
+    return None
+
+
+def _server_processes() -> Dict[str, List[int]]:
+    """Descendant processes of this one running a PMO or D3 server, by target."""
+    children: Dict[int, List[int]] = {}
+    cmdlines: Dict[int, str] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            with open(f"/proc/{entry}/cmdline", "rb") as f:
+                cmdlines[int(entry)] = f.read().replace(b"\0", b" ").decode("utf-8", "replace")
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    found: Dict[str, List[int]] = {target: [] for target in TARGETS}
+    stack = list(children.get(os.getpid(), []))
+    while stack:
+        pid = stack.pop()
+        stack.extend(children.get(pid, []))
+        kind = _server_kind(pid, cmdlines.get(pid, ""))
+        if kind:
+            found[kind].append(pid)
+    return found
+
+
+def _rss_mb(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+async def sample_rss(rec: Recorder, interval: float) -> None:
+    if not os.path.isdir("/proc"):
+        return
+    while True:
+        for kind, pids in _server_processes().items():
+            sizes = [_rss_mb(pid) for pid in pids]
+            rec.rss.append({"t": round(time.perf_counter() - rec.t0, 2), "stage": rec.stage, "server": kind,
+                            "processes": len(pids), "rss_mb_total": round(sum(sizes), 1),
+                            "rss_mb_max": round(max(sizes, default=0.0), 1)})
+        await asyncio.sleep(interval)
+
+
+# --- setup and reporting ------------------------------------------------------
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_http_server(env: Dict[str, str]) -> Tuple[subprocess.Popen, str]:
+    port = _free_port()
+    proc = subprocess.Popen([sys.executable, "pmo.py", "--transport", "streamable-http", "--port", str(port)],
+                            cwd=PMO_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return proc, f"http://127.0.0.1:{port}/mcp"
+        except OSError:
+            if proc.poll() is not None:
+                break
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("pmo.py did not start its HTTP transport")
+
+
+def _percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered) + 0.5)) - 1))]
+
+
+def summarize(rec: Recorder, stages: List[int], walls: List[float], targets: List[str]) -> List[Dict[str, Any]]:
+    rows = []
+    for index, (clients, wall) in enumerate(zip(stages, walls), start=1):
+        for target in targets:
+            # connects happen before the timed window; calls and throughput are measured inside it
+            calls = [s for s in rec.samples if s[0] == target and s[2] == index and s[1] != "connect"]
+            connects = [s[4] for s in rec.samples if s[0] == target and s[2] == index and s[1] == "connect"]
+            latencies = [s[4] * 1000 for s in calls]
+            errors = sum(1 for s in calls if not s[5])
+            rss = [r for r in rec.rss if r["stage"] == index and r["server"] == target]
+            rows.append({
+                "stage": index, "clients": clients, "target": target, "calls": len(calls),
+                "throughput_per_s": round(len(calls) / wall, 1) if wall else 0.0,
+                "p50_ms": round(_percentile(latencies, 50), 1),
+                "p95_ms": round(_percentile(latencies, 95), 1),
+                "p99_ms": round(_percentile(latencies, 99), 1),
+                "error_rate": round(errors / len(calls), 4) if calls else 0.0,
+                "connect_p50_ms": round(_percentile([c * 1000 for c in connects], 50), 1),
+                "rss_mb_peak": max((r["rss_mb_total"] for r in rss), default=None),
+                "servers": max((r["processes"] for r in rss), default=None),
+            })
+    return rows
+
+
+def print_report(rows: List[Dict[str, Any]]) -> None:
+    columns = ["stage", "clients", "target", "calls", "throughput_per_s", "p50_ms", "p95_ms", "p99_ms",
+               "error_rate", "connect_p50_ms", "rss_mb_peak", "servers"]
+    widths = {c: max(len(c), *(len(str(r[c])) for r in rows)) for c in columns}
+    print("  ".join(c.rjust(widths[c]) for c in columns))
+    for r in rows:
+        print("  ".join(str(r[c]).rjust(widths[c]) for c in columns))
+
+
+async def run_load(stages: List[int], stage_seconds: float, targets: List[str], projects: int = 200,
+                   resources: int = 50, backend_latency: float = 0.0, sample_interval: float = 0.5,
+                   seed: int = 1, pipeline: int = 4) -> Dict[str, Any]:
+    rec = Recorder()
+    rnd = random.Random(seed)
+    pmo_mix = _pmo_mix(resources)
+    with StandInBackend(projects=projects, resources=resources) as backend, tempfile.TemporaryDirectory() as outdir:
+        backend.latency = backend_latency
+        env = dict(os.environ, PMO_API_URL=backend.url, D3_OUTDIR=outdir, PYTHONUNBUFFERED="1")
+        env.setdefault("D3_ASSETS", "cdn")  # runs without the vendored libraries fetched
+        http_proc, http_url = _start_http_server(env) if "pmo-http" in targets else (None, "")
+        sampler = asyncio.create_task(sample_rss(rec, sample_interval))
+        walls = []
+        try:
+            for index, clients in enumerate(stages, start=1):
+                rec.stage = index
+                clock = StageClock(clients * len(targets), stage_seconds)
+                jobs = []
+                for _ in range(clients):
+                    client_rnd = random.Random(rnd.random())
+                    if "pmo-stdio" in targets:
+                        jobs.append(pmo_stdio_client(clock, rec, client_rnd, env, pmo_mix))
+                    if "pmo-http" in targets:
+                        jobs.append(pmo_http_client(clock, rec, client_rnd, http_url, pmo_mix))
+                    if "d3-stdio" in targets:
+                        jobs.append(d3_stdio_client(clock, rec, client_rnd, env))
+                    if "d3-mcp" in targets:
+                        jobs.append(d3_mcp_client(clock, rec, client_rnd, env, pipeline))
+                await asyncio.gather(*jobs)
+                walls.append(time.perf_counter() - clock.started if clock.started else 0.0)
+        finally:
+            sampler.cancel()
+            if http_proc is not None:
+                http_proc.terminate()
+                http_proc.wait(10)
+    return {"stages": summarize(rec, stages, walls, targets), "rss": rec.rss}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Ramp simulated MCP clients against the PMO and D3 servers")
+    parser.add_argument("--stages", default="1,2,4,8", help="comma separated client counts per target, one stage each")
+    parser.add_argument("--stage-seconds", type=float, default=15.0)
+    parser.add_argument("--targets", default=",".join(TARGETS), help=f"any of {', '.join(TARGETS)}")
+    parser.add_argument("--projects", type=int, default=200, help="projects served by the stand-in backend")
+    parser.add_argument("--resources", type=int, default=50, help="resources served by the stand-in backend")
+    parser.add_argument("--backend-latency", type=float, default=0.0, help="seconds added to every backend response")
+    parser.add_argument("--sample-interval", type=float, default=0.5, help="seconds between RSS samples")
+    parser.add_argument("--pipeline", type=int, default=4, help="tools/call requests each d3-mcp client keeps in flight")
+    parser.add_argument("--json", help="also write stage results and the RSS time series to this file")
+    args = parser.parse_args(argv)
+
+    targets = [t.strip() for t in args.targets.split(",") if t.strip()]
+    unknown = set(targets) - set(TARGETS)
+    if unknown:
+        parser.error(f"unknown targets {sorted(unknown)}")
+    stages = [int(s) for s in args.stages.split(",") if s.strip()]
+    result = asyncio.run(run_load(stages, args.stage_seconds, targets, args.projects, args.resources,
+                                  args.backend_latency, args.sample_interval, pipeline=args.pipeline))
+    print_report(result["stages"])
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -175,6 +175,13 @@ def move_chart_to_client(server_path: str | Path, chart_type: str = 'chart', que
             except Exception as e:
                 print('Failed to move/copy chart into client html-charts:', e)
                 return None
+        # pages reference the server's shared asset bundle (assets/<name>.<hash>.js) relatively
+        assets_dir = server_p.parent / 'assets'
+        if assets_dir.is_dir():
+            try:
+                shutil.copytree(str(assets_dir), str(outdir / 'assets'), dirs_exist_ok=True)
+            except Exception as e:
+                print('Failed to copy chart assets into client html-charts:', e)
         return str(dest)
     except Exception as e:
         print('Failed to move chart into client html-charts:', e)
@@ -0,0 +1,15 @@
+"""Smoke run of the load generator: one short stage against every target."""
+import asyncio
+
+from load_test_mcp import TARGETS, run_load
+
+
+def test_single_stage_reports_every_target():
+    result = asyncio.run(run_load([1], 1.5, list(TARGETS), projects=20, resources=5, sample_interval=0.2))
+    rows = {r["target"]: r for r in result["stages"]}
+    assert set(rows) == set(TARGETS)
+    for row in rows.values():
+        assert row["calls"] > 0
+        assert row["error_rate"] == 0.0
+        assert row["p50_ms"] <= row["p95_ms"] <= row["p99_ms"]
+    assert any(sample["rss_mb_total"] > 0 for sample in result["rss"])
@@ -0,0 +1,52 @@
+"""
+Build dist/pmo.pyz, a single-file launch artifact for the PMO MCP server.
+
+The archive holds pmo.py precompiled to bytecode together with the resources/ and
+prompts/ text files, so a client that spawns the server for every query skips
+compiling pmo.py on each start (a script run as __main__ is never cached).
+
+Bytecode only loads on the Python version that built it. pmo.py is shipped next to
+pmo.pyc, and zipimport falls back to it when the magic number does not match, so
+the archive still runs (just without the saved compile) on any other interpreter.
+
+Docstrings are kept (no -OO): FastMCP uses them as tool descriptions.
+
+Build and run:
+    python build_pmo_pyz.py
+    python dist/pmo.pyz
+"""
+import argparse
+import os
+import py_compile
+import shutil
+import tempfile
+import zipapp
+
+PMO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+MAIN = "import pmo\n\npmo.main()\n"
+
+
+def build(target: str = os.path.join(PMO_DIR, "dist", "pmo.pyz"), interpreter: str = "/usr/bin/env python3") -> str:
+    with tempfile.TemporaryDirectory() as staging:
+        source = os.path.join(PMO_DIR, "pmo.py")
+        py_compile.compile(source, cfile=os.path.join(staging, "pmo.pyc"),
+                           doraise=True, optimize=0,
+                           invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH)
+        shutil.copy2(source, os.path.join(staging, "pmo.py"))
+        for subdir in ("resources", "prompts"):
+            shutil.copytree(os.path.join(PMO_DIR, subdir), os.path.join(staging, subdir))
+        with open(os.path.join(staging, "__main__.py"), "w", encoding="utf-8") as f:
+            f.write(MAIN)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # stored, not deflated: the archive is small and reading it should cost nothing at startup
+        zipapp.create_archive(staging, target, interpreter=interpreter, compressed=False)
+    return target
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the single-file PMO MCP server archive")
+    parser.add_argument("--output", default=os.path.join(PMO_DIR, "dist", "pmo.pyz"))
+    parser.add_argument("--python", default="/usr/bin/env python3", help="interpreter line written to the archive")
+    args = parser.parse_args()
+    print(build(args.output, args.python))
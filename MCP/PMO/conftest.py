@@ -0,0 +1,44 @@
+"""Shared fixtures of the PMO server tests.
+
+pmo.py runs in-process against pmo_stand_in_backend, so no real PMO API or
+subprocess is needed.
+"""
+import sys
+from collections import OrderedDict
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent
+sys.path.insert(0, str(ROOT))
+
+import pmo
+from pmo_stand_in_backend import StandInBackend
+
+
+@pytest.fixture
+def start_backend(monkeypatch):
+    """Start a stand-in backend and point pmo at it; stopped again after the test.
+
+    Takes StandInBackend's arguments plus:
+    refresh: collections to download right away (refresh_pmo_data).
+    default: make it pmo.api_url; pass False for extra shards wired up via pmo.BACKENDS.
+    Every test starts with an empty allocation cache.
+    """
+    started = []
+    monkeypatch.setattr(pmo, "_allocation_cache", OrderedDict())
+
+    def start(refresh=(), default=True, **options):
+        backend = StandInBackend(**options).start()
+        started.append(backend)
+        if default:
+            monkeypatch.setattr(pmo, "api_url", backend.url)
+        if refresh:
+            pmo.refresh_pmo_data(list(refresh))
+        return backend
+
+    try:
+        yield start
+    finally:
+        for backend in started:
+            backend.stop()
@@ -1,28 +1,496 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import bisect
+import contextlib
+import functools
+import hashlib
+import heapq
+import importlib
 import json
 import os
+import threading
+import time
+import weakref
+from collections import Counter, OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+import anyio
+from mcp import types
 from mcp.server.fastmcp import FastMCP
-from typing import Any, Dict, List, Optional
-import requests
+from mcp.server.lowlevel import NotificationOptions, Server
+from pydantic import AnyUrl
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from urllib.parse import quote
 
-api_url = "http://localhost:5000"
+
+class _LazyModule:
+    """Stand-in for a module that is only imported on first attribute access.
+
+    Clients spawn pmo.py for every query, so numpy and requests stay out of the
+    startup path until a tool actually needs them.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr: str):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+np = _LazyModule("numpy")
+requests = _LazyModule("requests")
+
+api_url = os.getenv("PMO_API_URL", "http://localhost:5000")
 
 mcp = FastMCP("PMO")
 
-# Load resources and prompts from JSON files
+
+def _tool(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Register fn as an MCP tool. FastMCP calls plain functions on the event loop, so
+    the registered tool runs fn on a worker thread instead: upstream requests and
+    admission waits then never stall other sessions. The module keeps fn itself.
+    """
+    @functools.wraps(fn)
+    async def on_worker_thread(*args, **kwargs):
+        return await anyio.to_thread.run_sync(functools.partial(fn, *args, **kwargs))
+
+    mcp.tool()(on_worker_thread)
+    return fn
+
+# Load resources and prompts from text files, once, and again only when the file changes on disk
 PMO_DIR = os.path.dirname(os.path.abspath(__file__))
+_text_cache: Dict[str, Tuple[Optional[float], str]] = {}
+_text_cache_lock = threading.Lock()
+
+
+def _load_text(subdir: str, filename: str) -> str:
+    path = os.path.join(PMO_DIR, subdir, filename)
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        mtime = None
+    with _text_cache_lock:
+        cached = _text_cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+    if mtime is None:
+        # running from the packaged pmo.pyz: docs live inside the archive
+        loader = globals().get("__loader__")
+        if not hasattr(loader, "get_data"):
+            raise FileNotFoundError(path)
+        text = loader.get_data(path).decode("utf-8")
+    else:
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+    with _text_cache_lock:
+        _text_cache[path] = (mtime, text)
+    return text
 
 def load_resource_txt(filename: str) -> str:
-    PMO_DIR = os.path.dirname(os.path.abspath(__file__))
-    resources_dir = os.path.join(PMO_DIR, "resources")
-    with open(os.path.join(resources_dir, filename), encoding="utf-8") as f:
-        return f.read()
+    return _load_text("resources", filename)
 
 def load_prompt_txt(filename: str) -> str:
-    PMO_DIR = os.path.dirname(os.path.abspath(__file__))
-    prompts_dir = os.path.join(PMO_DIR, "prompts")
-    with open(os.path.join(prompts_dir, filename), encoding="utf-8") as f:
-        return f.read()
+    return _load_text("prompts", filename)
+
+# ================================================================================
+# COLLECTION SNAPSHOTS
+# ================================================================================
+
+# Seconds a snapshot is considered fresh before derived tools re-fetch it
+SNAPSHOT_TTL = float(os.getenv("PMO_SNAPSHOT_TTL", "60"))
+
+def _row_hash(row: Dict[str, Any]) -> str:
+    return hashlib.sha1(json.dumps(row, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+# Deletions remembered for delta sync; older deltas fall back to a full resync
+DELTA_HISTORY = int(os.getenv("PMO_DELTA_HISTORY", "10000"))
+
+def _initial_version() -> int:
+    # milliseconds since the epoch, so versions keep increasing across restarts and a
+    # since_version from an earlier process is always below the new floor
+    return time.time_ns() // 1_000_000
+
+class CollectionSnapshot:
+    """
+    Last seen copy of an upstream collection, keyed by id.
+    apply() diffs a fresh download against the previous one by row hash and
+    hands only the inserted/updated/deleted rows to registered listeners, so
+    derived structures (cubes, indexes) can be maintained incrementally.
+    The version each row was inserted/changed in, and tombstones for deleted
+    rows, let delta() answer "what changed since version N".
+    """
+
+    def __init__(self, name: str, key: Optional[str]):
+        self.name = name
+        self.key = key
+        self.rows: Dict[Any, Dict[str, Any]] = {}
+        self.hashes: Dict[Any, str] = {}
+        self.version = _initial_version()
+        # oldest version delta() can answer from; anything before needs a full resync
+        self.floor = self.version
+        self.created_in: Dict[Any, int] = {}
+        self.changed_in: Dict[Any, int] = {}
+        self.tombstones: "OrderedDict[Any, int]" = OrderedDict()
+        self.fetched_at = 0.0
+        self.listeners: List[Callable[[List[Dict[str, Any]], List[Tuple[Dict[str, Any], Dict[str, Any]]], List[Dict[str, Any]]], None]] = []
+        self.lock = threading.RLock()
+
+    def row_id(self, row: Dict[str, Any]) -> Any:
+        rid = row.get(self.key) if self.key else None
+        return rid if rid is not None else _row_hash(row)
+
+    def version_info(self) -> Dict[str, Any]:
+        return {
+            "collection": self.name,
+            "version": self.version,
+            "row_count": len(self.rows),
+            "fetched_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.fetched_at)) if self.fetched_at else None,
+        }
+
+    def is_stale(self) -> bool:
+        return not self.fetched_at or time.time() - self.fetched_at > SNAPSHOT_TTL
+
+    def add_listener(self, fn) -> None:
+        with self.lock:
+            self.listeners.append(fn)
+            # bring a late listener up to date with what is already loaded
+            if self.rows:
+                fn(list(self.rows.values()), [], [])
+
+    def apply(self, rows: List[Dict[str, Any]]) -> bool:
+        """Replace the snapshot with rows. Returns True when anything changed."""
+        with self.lock:
+            self.fetched_at = time.time()
+            inserted, updated, deleted = [], [], []
+            touched = []
+            seen = set()
+            for row in rows:
+                if not isinstance(row, dict) or "error" in row:
+                    continue
+                rid = self.row_id(row)
+                seen.add(rid)
+                h = _row_hash(row)
+                old_hash = self.hashes.get(rid)
+                if old_hash is None:
+                    inserted.append(row)
+                    self.created_in[rid] = self.version + 1
+                elif old_hash != h:
+                    updated.append((self.rows[rid], row))
+                else:
+                    continue
+                touched.append(rid)
+                self.rows[rid] = row
+                self.hashes[rid] = h
+            for rid in [r for r in self.rows if r not in seen]:
+                deleted.append(self.rows.pop(rid))
+                self.hashes.pop(rid, None)
+                self.created_in.pop(rid, None)
+                self.changed_in.pop(rid, None)
+                self.tombstones[rid] = self.version + 1
+                self.tombstones.move_to_end(rid)
+            if not (inserted or updated or deleted):
+                return False
+            self.version += 1
+            for rid in touched:
+                self.changed_in[rid] = self.version
+                self.tombstones.pop(rid, None)
+            while len(self.tombstones) > DELTA_HISTORY:
+                _, dropped_in = self.tombstones.popitem(last=False)
+                self.floor = max(self.floor, dropped_in)
+            for fn in self.listeners:
+                fn(inserted, updated, deleted)
+            return True
+
+    def delta(self, since_version: int) -> Dict[str, Any]:
+        """
+        Rows inserted/updated and ids deleted after since_version. When the version
+        is older than the history kept (or from another process) the answer is a
+        full resync: every row as inserted and full=True.
+        """
+        with self.lock:
+            result: Dict[str, Any] = {"collection": self.name, "version": self.version, "since_version": since_version}
+            if since_version < self.floor or since_version > self.version:
+                result.update(full=True, inserted=list(self.rows.values()), updated=[], deleted=[])
+                return result
+            inserted, updated = [], []
+            for rid, changed in self.changed_in.items():
+                if changed > since_version:
+                    (inserted if self.created_in.get(rid, 0) > since_version else updated).append(self.rows[rid])
+            deleted = [rid for rid, gone in self.tombstones.items() if gone > since_version]
+            result.update(full=False, inserted=inserted, updated=updated, deleted=deleted)
+            return result
+
+projects_snapshot = CollectionSnapshot("projects", "project_id")
+resources_snapshot = CollectionSnapshot("resources", "resource_id")
+# business lines have no id column, rows are keyed by their hash
+business_lines_snapshot = CollectionSnapshot("business_lines", None)
+
+# ================================================================================
+# UPSTREAM BACKENDS (sharded by strategic portfolio)
+# ================================================================================
+
+# Portfolios served by their own PMO API instance, e.g.
+#   PMO_BACKENDS='{"Market & Sell": "http://pmo-emea:5000", "Auto Insights": "http://pmo-na:5000"}'
+# Portfolios not listed (and everything when unset) are served by api_url.
+BACKENDS: Dict[str, str] = json.loads(os.getenv("PMO_BACKENDS") or "{}")
+# Connections kept open per backend
+BACKEND_POOL_SIZE = int(os.getenv("PMO_BACKEND_POOL_SIZE", "16"))
+# Parallel upstream requests when several backends or resources are needed at once
+UPSTREAM_WORKERS = int(os.getenv("PMO_UPSTREAM_WORKERS", "8"))
+
+_http_sessions: Dict[str, Any] = {}
+_http_sessions_lock = threading.Lock()
+
+# Admission control: concurrent requests allowed per backend endpoint (PMO_UPSTREAM_CONCURRENCY,
+# or per path via PMO_UPSTREAM_LIMITS='{"/projects": 2}'), how many more may wait, and how long
+UPSTREAM_CONCURRENCY = int(os.getenv("PMO_UPSTREAM_CONCURRENCY", "4"))
+UPSTREAM_LIMITS: Dict[str, int] = json.loads(os.getenv("PMO_UPSTREAM_LIMITS") or "{}")
+UPSTREAM_QUEUE_SIZE = int(os.getenv("PMO_UPSTREAM_QUEUE_SIZE", "32"))
+UPSTREAM_QUEUE_TIMEOUT = float(os.getenv("PMO_UPSTREAM_QUEUE_TIMEOUT", "5"))
+UPSTREAM_TIMEOUT = float(os.getenv("PMO_UPSTREAM_TIMEOUT", "30"))
+# Fan-out scans retry an overloaded per-resource request this many times, backing off each time
+UPSTREAM_RETRIES = int(os.getenv("PMO_UPSTREAM_RETRIES", "3"))
+UPSTREAM_BACKOFF_MAX = float(os.getenv("PMO_UPSTREAM_BACKOFF_MAX", "10"))
+# Queue priorities: small lookups are admitted ahead of bulk downloads
+PRIORITY_LOOKUP = 0
+PRIORITY_BULK = 1
+UPSTREAM_BULK_PATHS = {"/projects", "/resources"}
+
+class UpstreamOverloaded(Exception):
+    """An upstream endpoint is at its concurrency limit and its queue is full (or the wait ran out)."""
+
+    def __init__(self, endpoint: str, reason: str, retry_after: float):
+        super().__init__(f"PMO API overloaded at {endpoint}: {reason}")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+def _overloaded_error(e: UpstreamOverloaded) -> List[Dict[str, Any]]:
+    return [{"error": str(e), "overloaded": True, "retry_after_s": round(e.retry_after, 1)}]
+
+class EndpointGate:
+    """
+    Concurrency limit plus bounded priority queue for one backend endpoint.
+    Callers over the limit wait in (priority, arrival) order; when the queue is
+    full, or the wait exceeds the timeout, admission fails at once with
+    UpstreamOverloaded instead of piling more requests onto the backend.
+    """
+
+    def __init__(self, endpoint: str, limit: int, queue_size: int):
+        self.endpoint = endpoint
+        self.limit = max(1, limit)
+        self.queue_size = queue_size
+        self.active = 0
+        self.waiting: List[List[Any]] = []  # heap of [priority, seq, admitted]
+        self.seq = 0
+        self.cond = threading.Condition()
+        self.admitted = 0
+        self.rejected = 0
+        self.max_queue_depth = 0
+        self.waits = deque(maxlen=1000)
+
+    def acquire(self, priority: int = PRIORITY_LOOKUP, timeout: float = UPSTREAM_QUEUE_TIMEOUT) -> None:
+        started = time.monotonic()
+        with self.cond:
+            if self.active < self.limit and not self.waiting:
+                self.active += 1
+                self._admit(0.0)
+                return
+            if len(self.waiting) >= self.queue_size:
+                self.rejected += 1
+                raise UpstreamOverloaded(self.endpoint, f"{len(self.waiting)} requests already queued", self._retry_after())
+            entry = [priority, self.seq, False]
+            self.seq += 1
+            heapq.heappush(self.waiting, entry)
+            self.max_queue_depth = max(self.max_queue_depth, len(self.waiting))
+            deadline = started + timeout
+            while not entry[2]:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.waiting.remove(entry)
+                    heapq.heapify(self.waiting)
+                    self.rejected += 1
+                    raise UpstreamOverloaded(self.endpoint, f"no slot within {timeout:g}s", self._retry_after())
+                self.cond.wait(remaining)
+            self._admit(time.monotonic() - started)
+
+    def release(self) -> None:
+        with self.cond:
+            if self.waiting:
+                # hand the slot straight to the next waiter; active stays the same
+                heapq.heappop(self.waiting)[2] = True
+                self.cond.notify_all()
+            else:
+                self.active -= 1
+
+    def _admit(self, waited: float) -> None:
+        self.admitted += 1
+        self.waits.append(waited)
+
+    def _retry_after(self) -> float:
+        recent = sorted(self.waits)
+        return max(0.5, recent[len(recent) // 2] if recent else 1.0)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self.cond:
+            waits = sorted(self.waits)
+            def pct(p: float) -> float:
+                return round(waits[min(len(waits) - 1, int(p * len(waits)))] * 1000, 1) if waits else 0.0
+            return {
+                "endpoint": self.endpoint,
+                "limit": self.limit,
+                "active": self.active,
+                "queue_depth": len(self.waiting),
+                "max_queue_depth": self.max_queue_depth,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "wait_ms_p50": pct(0.5),
+                "wait_ms_p95": pct(0.95),
+                "wait_ms_max": pct(1.0),
+            }
+
+_gates: Dict[Tuple[str, str], EndpointGate] = {}
+_gates_lock = threading.Lock()
+
+def _with_backoff(fn: Callable[[], Any]) -> Any:
+    """
+    Call fn, retrying up to UPSTREAM_RETRIES times when admission fails. Waits the
+    gate's retry_after hint, doubled on every attempt, so one busy moment does not
+    fail a scan over many resources.
+    """
+    for attempt in range(UPSTREAM_RETRIES + 1):
+        try:
+            return fn()
+        except UpstreamOverloaded as e:
+            if attempt == UPSTREAM_RETRIES:
+                raise
+            time.sleep(min(e.retry_after * 2 ** attempt, UPSTREAM_BACKOFF_MAX))
+
+def _gate(base_url: str, path: str) -> EndpointGate:
+    with _gates_lock:
+        gate = _gates.get((base_url, path))
+        if gate is None:
+            gate = EndpointGate(f"{base_url}{path}", UPSTREAM_LIMITS.get(path, UPSTREAM_CONCURRENCY), UPSTREAM_QUEUE_SIZE)
+            _gates[(base_url, path)] = gate
+        return gate
+
+def _backend_for(portfolio: Optional[str]) -> str:
+    return BACKENDS.get(portfolio, api_url) if portfolio is not None else api_url
+
+def _all_backends() -> List[str]:
+    return list(dict.fromkeys([api_url, *BACKENDS.values()]))
+
+def _resource_backends(resource_ids: List[int]) -> Dict[int, str]:
+    """
+    Shard of each resource, from its strategic_portfolio in the resource snapshot.
+    With PMO_BACKENDS set the snapshot is refreshed first when it is stale or does
+    not know an id yet; ids that are still unknown raise ValueError rather than
+    being sent to a shard that may not hold them.
+    """
+    if not BACKENDS:
+        return dict.fromkeys(resource_ids, api_url)
+    if resources_snapshot.is_stale() or any(rid not in resources_snapshot.rows for rid in resource_ids):
+        resources_snapshot.apply(_scatter("GET", "/resources", _all_backends(), key="resource_id"))
+    unknown = [rid for rid in resource_ids if rid not in resources_snapshot.rows]
+    if unknown:
+        raise ValueError(f"Unknown resource_id(s) {unknown}: not found on any PMO backend")
+    return {rid: _backend_for(resources_snapshot.rows[rid].get("strategic_portfolio")) for rid in resource_ids}
+
+def _backend_for_resource(resource_id: int) -> str:
+    return _resource_backends([resource_id])[resource_id]
+
+def _http_session(base_url: str):
+    """One pooled requests.Session per backend so connections are reused across tool calls."""
+    with _http_sessions_lock:
+        session = _http_sessions.get(base_url)
+        if session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=BACKEND_POOL_SIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _http_sessions[base_url] = session
+        return session
+
+def _upstream(method: str, path: str, base_url: Optional[str] = None, priority: Optional[int] = None, **kwargs) -> Any:
+    """
+    Send one request to a PMO backend (api_url by default) and return the decoded JSON.
+    Goes through the endpoint's admission gate; raises UpstreamOverloaded when it is full.
+    """
+    base_url = base_url or api_url
+    if priority is None:
+        priority = PRIORITY_BULK if path in UPSTREAM_BULK_PATHS else PRIORITY_LOOKUP
+    kwargs.setdefault("timeout", UPSTREAM_TIMEOUT)
+    gate = _gate(base_url, path)
+    gate.acquire(priority)
+    try:
+        response = _http_session(base_url).request(method, f"{base_url}{path}", **kwargs)
+    finally:
+        gate.release()
+    response.raise_for_status()
+    return response.json()
+
+def _scatter(method: str, path: str, backends: List[str], key: Optional[str] = None, **kwargs) -> List[Dict[str, Any]]:
+    """
+    Send the same request to several backends concurrently and merge the row lists.
+    With more than one backend, rows are de-duplicated and sorted on key.
+    Any failing backend fails the whole call.
+    """
+    if len(backends) == 1:
+        return _upstream(method, path, base_url=backends[0], **kwargs)
+    with ThreadPoolExecutor(max_workers=max(1, min(UPSTREAM_WORKERS, len(backends)))) as pool:
+        parts = list(pool.map(lambda url: _upstream(method, path, base_url=url, **kwargs), backends))
+    merged: Dict[Any, Dict[str, Any]] = {}
+    for rows in parts:
+        for row in rows:
+            merged.setdefault(row.get(key) if key and row.get(key) is not None else _row_hash(row), row)
+    rows = list(merged.values())
+    if key:
+        rows.sort(key=lambda r: (r.get(key) is None, r.get(key) if r.get(key) is not None else 0))
+    return rows
+
+def _backends_for_filters(filters: List[Dict[str, Any]], logical_operator: str) -> List[str]:
+    """
+    Shards that can hold rows matching the filters. A strategic_portfolio "=" / "in"
+    filter narrows the set when it must hold (AND), or when every filter is one (OR);
+    anything else has to ask every backend.
+    """
+    def portfolios(flt: Dict[str, Any]) -> Optional[List[Any]]:
+        if flt.get("column") != "strategic_portfolio":
+            return None
+        op = str(flt.get("operator", "=")).lower()
+        if op in ("=", "=="):
+            return [flt.get("value")]
+        if op == "in" and isinstance(flt.get("value"), list):
+            return flt["value"]
+        return None
+
+    wanted = [portfolios(f) for f in filters or []]
+    if str(logical_operator or "AND").upper() == "OR":
+        if not wanted or any(p is None for p in wanted):
+            return _all_backends()
+        allowed = {p for ps in wanted for p in ps}
+    else:
+        constraints = [set(p) for p in wanted if p is not None]
+        if not constraints:
+            return _all_backends()
+        allowed = set.intersection(*constraints)
+    # no portfolio can match: still ask one backend so the response shape is the backend's own
+    return list(dict.fromkeys(_backend_for(p) for p in sorted(allowed, key=str))) or [api_url]
+
+@mcp.resource("pmo://metrics/upstream")
+def upstream_metrics() -> str:
+    """Admission-control metrics per upstream endpoint: limit, active, queue depth, rejections, wait times."""
+    with _gates_lock:
+        gates = list(_gates.values())
+    return json.dumps([g.metrics() for g in gates])
+
+@mcp.resource("pmo://docs/upstream_metrics")
+def upstream_metrics_doc() -> str:
+    return load_resource_txt("docs_upstream_metrics.txt")
 
 # ================================================================================
 # SERVER INSTRUCTIONS AND GENERAL RESOURCES
@@ -36,6 +504,8 @@ PMO (Project Management Office) Server - Provides access to project data and bus
 
 QUERY ROUTING:
 - For "all projects" (no filters) → use get_all_projects()
+- For overviews, counts and totals by portfolio/product line → use get_portfolio_summary()
+- For "who could staff this role/hours/dates" requests → use suggest_staffing()
 - For specific area queries → use get_business_lines() then get_all_projects_filtered()
 
 DATA HANDLING:
@@ -55,17 +525,18 @@ WORKFLOW PATTERNS:
 # BUSINESS LINES SECTION
 # ================================================================================
 
-@mcp.tool()
+@_tool
 def get_business_lines() -> List[Dict[str, Any]]:
     """
     Fetch all available business lines (strategic portfolios and product lines).
     Use this for validation and to understand the data structure before filtering.
     """
     try:
-        url = f"{api_url}/business_lines"
-        response = requests.get(url)
-        response.raise_for_status()
-        return response.json()
+        rows = _scatter("GET", "/business_lines", _all_backends())
+        business_lines_snapshot.apply(rows)
+        return rows
+    except UpstreamOverloaded as e:
+        return _overloaded_error(e)
     except requests.exceptions.RequestException as e:
         return [{"error": f"API request failed: {str(e)}"}]
     except Exception as e:
@@ -83,17 +554,25 @@ def business_lines_prompt() -> str:
 # ALL PROJECTS SECTION (Unfiltered)
 # ================================================================================
 
-@mcp.tool()
-def get_all_projects() -> List[Dict[str, Any]]:
+@_tool
+def get_all_projects(since_version: Optional[int] = None) -> List[Dict[str, Any]]:
     """
     Fetch all projects without any filters. Use for comprehensive overviews.
     Returns complete project dataset with all fields.
+    Pass since_version (a "version" from an earlier delta, or from
+    pmo://data/versions) to get only what changed since then:
+    [{"version", "since_version", "full", "inserted", "updated", "deleted"}],
+    where deleted lists project_id values. full=True means the version was too old
+    and inserted holds the whole dataset.
     """
     try:
-        url = f"{api_url}/projects"
-        response = requests.get(url)
-        response.raise_for_status()
-        return response.json()
+        rows = _scatter("GET", "/projects", _all_backends(), key="project_id")
+        projects_snapshot.apply(rows)
+        if since_version is not None:
+            return [projects_snapshot.delta(since_version)]
+        return rows
+    except UpstreamOverloaded as e:
+        return _overloaded_error(e)
     except requests.exceptions.RequestException as e:
         return [{"error": f"API request failed: {str(e)}"}]
     except Exception as e:
@@ -111,7 +590,7 @@ def all_projects_prompt() -> str:
 # FILTERED PROJECTS SECTION
 # ================================================================================
 
-@mcp.tool()
+@_tool
 def get_filtered_projects(
     fields: Optional[List[str]] = None,
     filters: Optional[List[Dict[str, Any]]] = None,
@@ -129,10 +608,11 @@ def get_filtered_projects(
             "filters": filters or [],
             "logical_operator": logical_operator or "AND"
         }
-        url = f"{api_url}/projects/dynamic_filter"
-        response = requests.post(url, json=body)
-        response.raise_for_status()
-        return response.json()
+        backends = _backends_for_filters(body["filters"], body["logical_operator"])
+        priority = PRIORITY_LOOKUP if body["filters"] else PRIORITY_BULK
+        return _scatter("POST", "/projects/dynamic_filter", backends, key="project_id", priority=priority, json=body)
+    except UpstreamOverloaded as e:
+        return _overloaded_error(e)
     except requests.exceptions.RequestException as e:
         return [{"error": f"API request failed: {str(e)}"}]
     except Exception as e:
@@ -146,21 +626,147 @@ def filtered_projects_doc() -> str:
 def filtered_projects_prompt() -> str:
     return load_prompt_txt("filtered_projects_workflow.txt")
 
+# ================================================================================
+# REVENUE ROLLUP SECTION (precomputed cube)
+# ================================================================================
+
+REVENUE_DIMENSIONS = ["strategic_portfolio", "product_line", "vitality", "strategic", "aim"]
+REVENUE_HORIZON_FIELDS = [
+    "revenue_est_current_year",
+    "revenue_est_current_year_plus_1",
+    "revenue_est_current_year_plus_2",
+    "revenue_est_current_year_plus_3",
+]
+
+# cell key (one value per REVENUE_DIMENSIONS) ->
+#   [revenue per horizon year..., project_count, growth_sum, growth_count]
+_revenue_cube: Dict[Tuple[Any, ...], List[float]] = {}
+_revenue_cube_lock = threading.Lock()
+
+def _to_float(value: Any) -> Optional[float]:
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _revenue_cube_add(row: Dict[str, Any], sign: int) -> None:
+    key = tuple(row.get(d) for d in REVENUE_DIMENSIONS)
+    cell = _revenue_cube.get(key)
+    if cell is None:
+        cell = _revenue_cube[key] = [0.0] * (len(REVENUE_HORIZON_FIELDS) + 3)
+    for i, field in enumerate(REVENUE_HORIZON_FIELDS):
+        cell[i] += sign * (_to_float(row.get(field)) or 0.0)
+    n = len(REVENUE_HORIZON_FIELDS)
+    cell[n] += sign
+    growth = _to_float(row.get("revenue_est_growth_pa"))
+    if growth is not None:
+        cell[n + 1] += sign * growth
+        cell[n + 2] += sign
+    if cell[n] <= 0:
+        del _revenue_cube[key]
+
+def _on_projects_changed(inserted, updated, deleted) -> None:
+    with _revenue_cube_lock:
+        for row in deleted:
+            _revenue_cube_add(row, -1)
+        for old, new in updated:
+            _revenue_cube_add(old, -1)
+            _revenue_cube_add(new, +1)
+        for row in inserted:
+            _revenue_cube_add(row, +1)
+
+projects_snapshot.add_listener(_on_projects_changed)
+
+@_tool
+def revenue_rollup(
+    group_by: Optional[List[str]] = None,
+    filters: Optional[Dict[str, Any]] = None,
+    horizon: Optional[List[int]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Slice the precomputed revenue cube without re-reading every project.
+    - group_by: any of strategic_portfolio, product_line, vitality, strategic, aim
+      (defaults to ["strategic_portfolio"]; pass [] for a single grand total)
+    - filters: exact-match values per dimension, e.g. {"vitality": "YES"} or
+      {"strategic_portfolio": ["Market & Sell", "Vehicles In Use"]}
+    - horizon: year offsets to include, 0 = current year .. 3 = current year + 3
+    Each row carries the revenue estimates per horizon year, their total,
+    project_count and the average revenue_est_growth_pa.
+    """
+    try:
+        group_by = ["strategic_portfolio"] if group_by is None else list(group_by)
+        filters = filters or {}
+        horizon = list(range(len(REVENUE_HORIZON_FIELDS))) if horizon is None else sorted(set(horizon))
+        unknown = [d for d in list(group_by) + list(filters) if d not in REVENUE_DIMENSIONS]
+        if unknown:
+            return [{"error": f"Unknown revenue dimension(s): {unknown}. Use {REVENUE_DIMENSIONS}"}]
+        bad_years = [h for h in horizon if not 0 <= h < len(REVENUE_HORIZON_FIELDS)]
+        if bad_years:
+            return [{"error": f"Horizon year offsets must be between 0 and {len(REVENUE_HORIZON_FIELDS) - 1}"}]
+        if projects_snapshot.is_stale():
+            fresh = get_all_projects()
+            if fresh and isinstance(fresh[0], dict) and "error" in fresh[0] and not projects_snapshot.rows:
+                return fresh
+
+        wanted = {}
+        for dim, value in filters.items():
+            wanted[REVENUE_DIMENSIONS.index(dim)] = set(value) if isinstance(value, (list, tuple, set)) else {value}
+        group_idx = [REVENUE_DIMENSIONS.index(d) for d in group_by]
+        n = len(REVENUE_HORIZON_FIELDS)
+
+        totals: Dict[Tuple[Any, ...], List[float]] = {}
+        with _revenue_cube_lock:
+            for key, cell in _revenue_cube.items():
+                if any(key[i] not in values for i, values in wanted.items()):
+                    continue
+                gkey = tuple(key[i] for i in group_idx)
+                acc = totals.setdefault(gkey, [0.0] * len(cell))
+                for i, v in enumerate(cell):
+                    acc[i] += v
+
+        result = []
+        for gkey, acc in totals.items():
+            row: Dict[str, Any] = dict(zip(group_by, gkey))
+            for h in horizon:
+                row[REVENUE_HORIZON_FIELDS[h]] = round(acc[h], 2)
+            row["revenue_total"] = round(sum(acc[h] for h in horizon), 2)
+            row["project_count"] = int(acc[n])
+            row["avg_revenue_est_growth_pa"] = round(acc[n + 1] / acc[n + 2], 4) if acc[n + 2] else None
+            result.append(row)
+        result.sort(key=lambda r: tuple(str(r.get(d) or "") for d in group_by))
+        return result
+    except Exception as e:
+        return [{"error": f"Unexpected error in revenue_rollup: {str(e)}"}]
+
+@mcp.resource("pmo://docs/revenue_rollup")
+def revenue_rollup_doc() -> str:
+    return load_resource_txt("docs_revenue_rollup.txt")
+
 # ================================================================================
 # ALL RESOURCES SECTION
 # ================================================================================
 
-@mcp.tool()
-def get_all_resources() -> List[Dict[str, Any]]:
+@_tool
+def get_all_resources(since_version: Optional[int] = None) -> List[Dict[str, Any]]:
     """
     Fetch all resources (people, employees, contractors, etc.) in the system.
     Use for resource directory, capacity planning, or role lookup.
+    Pass since_version (a "version" from an earlier delta, or from
+    pmo://data/versions) to get only what changed since then:
+    [{"version", "since_version", "full", "inserted", "updated", "deleted"}],
+    where deleted lists resource_id values. full=True means the version was too old
+    and inserted holds the whole dataset.
     """
     try:
-        url = f"{api_url}/resources"
-        response = requests.get(url)
-        response.raise_for_status()
-        return response.json()
+        rows = _scatter("GET", "/resources", _all_backends(), key="resource_id")
+        resources_snapshot.apply(rows)
+        if since_version is not None:
+            return [resources_snapshot.delta(since_version)]
+        return rows
+    except UpstreamOverloaded as e:
+        return _overloaded_error(e)
     except requests.exceptions.RequestException as e:
         return [{"error": f"API request failed: {str(e)}"}]
     except Exception as e:
@@ -174,32 +780,365 @@ def all_resources_doc() -> str:
 def all_resources_prompt() -> str:
     return load_prompt_txt("all_resources_summary.txt")
 
+# ================================================================================
+# RESOURCE DIRECTORY LOOKUP SECTION (indexed)
+# ================================================================================
+
+# Exact-match (case-insensitive) hash indexes: field -> value -> resource ids
+RESOURCE_HASH_FIELDS = [
+    "resource_id", "resource_name", "resource_email", "resource_type", "strategic_portfolio",
+    "product_line", "manager_name", "manager_email", "resource_role", "timesheet_resource_name",
+]
+# Word-prefix indexes: field -> sorted [(token, resource_id)]
+RESOURCE_PREFIX_FIELDS = ["resource_name", "resource_email", "resource_role", "manager_name"]
+
+_resource_hash_index: Dict[str, Dict[str, set]] = {f: {} for f in RESOURCE_HASH_FIELDS}
+_resource_prefix_index: Dict[str, List[Tuple[str, Any]]] = {f: [] for f in RESOURCE_PREFIX_FIELDS}
+_resource_index_lock = threading.Lock()
+
+def _norm(value: Any) -> str:
+    return str(value).strip().lower() if value is not None else ""
+
+def _tokens(value: Any) -> List[str]:
+    text = _norm(value)
+    for sep in "@.,-_/()":
+        text = text.replace(sep, " ")
+    return sorted(set(text.split()))
+
+def _resource_index(row: Dict[str, Any], add: bool) -> None:
+    rid = resources_snapshot.row_id(row)
+    for field in RESOURCE_HASH_FIELDS:
+        value = _norm(row.get(field))
+        if not value:
+            continue
+        ids = _resource_hash_index[field].setdefault(value, set())
+        if add:
+            ids.add(rid)
+        else:
+            ids.discard(rid)
+            if not ids:
+                del _resource_hash_index[field][value]
+    for field in RESOURCE_PREFIX_FIELDS:
+        entries = _resource_prefix_index[field]
+        for token in _tokens(row.get(field)):
+            if add:
+                bisect.insort(entries, (token, rid), key=lambda e: (e[0], str(e[1])))
+                continue
+            i = bisect.bisect_left(entries, (token, str(rid)), key=lambda e: (e[0], str(e[1])))
+            if i < len(entries) and entries[i] == (token, rid):
+                del entries[i]
+
+def _on_resources_changed(inserted, updated, deleted) -> None:
+    with _resource_index_lock:
+        for row in deleted:
+            _resource_index(row, add=False)
+        for old, new in updated:
+            _resource_index(old, add=False)
+            _resource_index(new, add=True)
+        for row in inserted:
+            _resource_index(row, add=True)
+
+resources_snapshot.add_listener(_on_resources_changed)
+
+def _prefix_ids(field: str, prefix: str) -> set:
+    entries = _resource_prefix_index[field]
+    i = bisect.bisect_left(entries, prefix, key=lambda e: e[0])
+    ids = set()
+    while i < len(entries) and entries[i][0].startswith(prefix):
+        ids.add(entries[i][1])
+        i += 1
+    return ids
+
+def _exact_ids(field: str, value: Any) -> set:
+    return set(_resource_hash_index[field].get(_norm(value), ()))
+
+def _lookup_name(name: str) -> set:
+    """Exact name/email/timesheet name first, then every query word as a name-word prefix."""
+    for field in ("resource_name", "resource_email", "timesheet_resource_name"):
+        ids = _exact_ids(field, name)
+        if ids:
+            return ids
+    ids = None
+    for token in _tokens(name):
+        hits = _prefix_ids("resource_name", token) | _prefix_ids("resource_email", token)
+        ids = hits if ids is None else ids & hits
+        if not ids:
+            break
+    return ids or set()
+
+def _lookup_attribute(field: str, value: Any) -> set:
+    """Exact case-insensitive match; falls back to word prefixes for free-text fields."""
+    ids = _exact_ids(field, value)
+    if ids or field not in RESOURCE_PREFIX_FIELDS:
+        return ids
+    for token in _tokens(value):
+        hits = _prefix_ids(field, token)
+        ids = hits if not ids else ids & hits
+        if not ids:
+            break
+    return ids
+
+@_tool
+def find_resources(
+    names: Optional[List[str]] = None,
+    resource_ids: Optional[List[int]] = None,
+    resource_role: Optional[str] = None,
+    strategic_portfolio: Optional[str] = None,
+    product_line: Optional[str] = None,
+    manager_name: Optional[str] = None,
+    resource_type: Optional[str] = None,
+    fields: Optional[List[str]] = None,
+    limit: int = 50
+) -> List[Dict[str, Any]]:
+    """
+    Look up resources (colleagues) from an in-memory index instead of pulling the whole directory.
+    - names: one or many names/emails to resolve in a single call (partial names match by word prefix);
+      each returned row carries the "query" it matched, unmatched names come back with "matches": 0
+    - resource_ids: exact resource ids
+    - resource_role, strategic_portfolio, product_line, manager_name, resource_type: case-insensitive
+      filters combined with AND (e.g. resource_role="data engineer")
+    - fields: columns to return (resource_id is always included); defaults to all columns
+    - limit: maximum rows returned per name (or overall without names)
+    """
+    try:
+        if resources_snapshot.is_stale():
+            fresh = get_all_resources()
+            if fresh and isinstance(fresh[0], dict) and "error" in fresh[0] and not resources_snapshot.rows:
+                return fresh
+
+        def project(row: Dict[str, Any]) -> Dict[str, Any]:
+            if not fields:
+                return dict(row)
+            out = {"resource_id": row.get("resource_id")}
+            out.update({f: row.get(f) for f in fields if f in row})
+            return out
+
+        with _resource_index_lock:
+            allowed = None
+            if resource_ids:
+                allowed = set()
+                for rid in resource_ids:
+                    allowed |= _exact_ids("resource_id", rid)
+            criteria = {
+                "resource_role": resource_role,
+                "strategic_portfolio": strategic_portfolio,
+                "product_line": product_line,
+                "manager_name": manager_name,
+                "resource_type": resource_type,
+            }
+            for field, value in criteria.items():
+                if value:
+                    ids = _lookup_attribute(field, value)
+                    allowed = ids if allowed is None else allowed & ids
+
+            def rows_for(ids) -> List[Dict[str, Any]]:
+                hits = [resources_snapshot.rows[i] for i in ids if i in resources_snapshot.rows]
+                hits.sort(key=lambda r: (_norm(r.get("resource_name")), str(r.get("resource_id"))))
+                return hits[:limit]
+
+            if not names:
+                if allowed is None:
+                    return [{"error": "Provide names, resource_ids or at least one attribute filter"}]
+                return [project(r) for r in rows_for(allowed)]
+
+            result = []
+            for name in names:
+                ids = _lookup_name(name)
+                if allowed is not None:
+                    ids &= allowed
+                hits = rows_for(ids)
+                if not hits:
+                    result.append({"query": name, "matches": 0})
+                for row in hits:
+                    result.append({"query": name, **project(row)})
+            return result
+    except Exception as e:
+        return [{"error": f"Unexpected error in find_resources: {str(e)}"}]
+
+@mcp.resource("pmo://docs/find_resources")
+def find_resources_doc() -> str:
+    return load_resource_txt("docs_find_resources.txt")
+
 # ================================================================================
 # RESOURCE ALLOCATION PLANNED/ACTUAL SECTION
 # ================================================================================
 
-@mcp.tool()
+# Upstream granularity fetched once per resource/window; coarser views are derived locally
+FINEST_INTERVAL = "Weekly"
+ALLOCATION_INTERVALS = ["Weekly", "Monthly", "Quarterly", "Yearly"]
+# Auto-selected interval is the finest one returning at most this many rows
+MAX_ALLOCATION_POINTS = int(os.getenv("PMO_MAX_ALLOCATION_POINTS", "60"))
+ALLOCATION_CACHE_SIZE = int(os.getenv("PMO_ALLOCATION_CACHE_SIZE", "256"))
+
+ALLOCATION_MEASURES = ["total_capacity", "allocation_hours_planned", "allocation_hours_actual", "available_capacity"]
+ALLOCATION_CUMULATIVE = {
+    "total_capacity": "total_capacity_cumulative",
+    "allocation_hours_planned": "cumulative_planned",
+    "allocation_hours_actual": "cumulative_actual",
+    "available_capacity": "available_capacity_cumulative",
+}
+_PERIOD_MONTHS = {"Monthly": 1, "Quarterly": 3, "Yearly": 12}
+
+# (resource_id, start_date, end_date) -> (fetched_at, series); insertion order = LRU order
+_allocation_cache: "OrderedDict[Tuple[int, str, str], Tuple[float, Dict[str, np.ndarray]]]" = OrderedDict()
+_allocation_cache_lock = threading.Lock()
+
+def _allocation_series(rows: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """Columnar copy of upstream interval rows: datetime64 bounds plus one float array per measure."""
+    rows = sorted((r for r in rows if isinstance(r, dict) and r.get("week_start")), key=lambda r: str(r["week_start"])[:10])
+    starts = np.array([str(r["week_start"])[:10] for r in rows], dtype="datetime64[D]")
+    ends = np.array([str(r.get("week_end") or "")[:10] or "NaT" for r in rows], dtype="datetime64[D]")
+    missing = np.isnat(ends)
+    ends[missing] = starts[missing] + 6
+    series = {"week_start": starts, "week_end": ends}
+    for m in ALLOCATION_MEASURES:
+        series[m] = np.array([_to_float(r.get(m)) or 0.0 for r in rows], dtype=float)
+    return series
+
+def _slice_series(series: Dict[str, np.ndarray], start: np.datetime64, end: np.datetime64) -> Dict[str, np.ndarray]:
+    mask = (series["week_end"] >= start) & (series["week_start"] <= end)
+    return {k: v[mask] for k, v in series.items()}
+
+def _fetch_weekly_allocation(resource_id: int, start_date: str, end_date: str, base_url: Optional[str] = None) -> Dict[str, np.ndarray]:
+    """
+    Finest-granularity series for a resource. Served from the cache when an
+    earlier fetch already covers the window, otherwise fetched once upstream
+    from base_url (default: the resource's shard).
+    """
+    start, end = np.datetime64(start_date[:10], "D"), np.datetime64(end_date[:10], "D")
+    now = time.time()
+    with _allocation_cache_lock:
+        for key, (fetched_at, series) in reversed(_allocation_cache.items()):
+            if key[0] != resource_id or now - fetched_at > SNAPSHOT_TTL:
+                continue
+            if np.datetime64(key[1], "D") <= start and end <= np.datetime64(key[2], "D"):
+                _allocation_cache.move_to_end(key)
+                return _slice_series(series, start, end)
+    params = {
+        "resource_id": resource_id,
+        "start_date": start_date,
+        "end_date": end_date,
+        "interval": FINEST_INTERVAL
+    }
+    rows = _upstream("GET", "/resource_capacity_allocation", base_url=base_url or _backend_for_resource(resource_id), params=params)
+    series = _allocation_series(rows)
+    with _allocation_cache_lock:
+        _allocation_cache[(resource_id, start_date[:10], end_date[:10])] = (now, series)
+        while len(_allocation_cache) > ALLOCATION_CACHE_SIZE:
+            _allocation_cache.popitem(last=False)
+    return series
+
+def _rollup_series(series: Dict[str, np.ndarray], interval: str, start: np.datetime64, end: np.datetime64) -> Dict[str, np.ndarray]:
+    """
+    Aggregate weekly rows into calendar months, quarters or years within [start, end].
+    Each week is spread evenly over its days, so a week straddling a month
+    boundary (or the window edge) contributes capacity and hours pro rata.
+    """
+    if interval == FINEST_INTERVAL or not len(series["week_start"]):
+        return series
+    starts, ends = series["week_start"], series["week_end"]
+    days = np.maximum((ends - starts).astype(int) + 1, 1)
+    row_idx = np.repeat(np.arange(len(starts)), days)
+    offsets = np.arange(days.sum()) - np.repeat(np.cumsum(days) - days, days)
+    dates = starts[row_idx] + offsets.astype("timedelta64[D]")
+    inside = (dates >= start) & (dates <= end)
+    dates, row_idx = dates[inside], row_idx[inside]
+    step = _PERIOD_MONTHS[interval]
+    months = dates.astype("datetime64[M]").astype(int)
+    period_keys, inverse = np.unique(months - months % step, return_inverse=True)
+    out = {
+        "week_start": np.maximum(period_keys.astype("datetime64[M]").astype("datetime64[D]"), start),
+        "week_end": np.minimum((period_keys + step).astype("datetime64[M]").astype("datetime64[D]") - 1, end),
+    }
+    for m in ALLOCATION_MEASURES:
+        out[m] = np.bincount(inverse, weights=(series[m] / days)[row_idx], minlength=len(period_keys))
+    return out
+
+def _choose_interval(series: Dict[str, np.ndarray], start: np.datetime64, end: np.datetime64) -> Tuple[str, Dict[str, np.ndarray]]:
+    for interval in ALLOCATION_INTERVALS:
+        rolled = _rollup_series(series, interval, start, end)
+        if len(rolled["week_start"]) <= MAX_ALLOCATION_POINTS:
+            break
+    return interval, rolled
+
+def _series_rows(series: Dict[str, np.ndarray], interval: str, include_cumulative: bool = False) -> List[Dict[str, Any]]:
+    columns = {m: np.round(series[m], 2) for m in ALLOCATION_MEASURES}
+    if include_cumulative:
+        # running totals are derived, so they are only materialized on request
+        for m, cum in ALLOCATION_CUMULATIVE.items():
+            columns[cum] = np.round(np.cumsum(series[m]), 2)
+    starts = series["week_start"].astype(str).tolist()
+    ends = series["week_end"].astype(str).tolist()
+    lists = {k: v.tolist() for k, v in columns.items()}
+    rows = []
+    for i in range(len(starts)):
+        row = {"week_start": starts[i], "week_end": ends[i], "interval": interval}
+        for k, values in lists.items():
+            row[k] = values[i]
+        rows.append(row)
+    return rows
+
+def _fetch_allocation_matrix(resource_ids: List[int], start_date: str, end_date: str) -> Dict[str, Any]:
+    """
+    Weekly series for many resources aligned on one week grid.
+    Returns {"resource_ids", "week_start", "week_end", <measure>: 2-D array (resource x week)};
+    weeks missing for a resource are zero-filled.
+    """
+    resource_ids = list(dict.fromkeys(resource_ids))
+    backends = _resource_backends(resource_ids)
+    with ThreadPoolExecutor(max_workers=max(1, min(UPSTREAM_WORKERS, len(resource_ids)))) as pool:
+        all_series = list(pool.map(
+            lambda rid: _with_backoff(lambda: _fetch_weekly_allocation(rid, start_date, end_date, backends[rid])), resource_ids))
+    grid = np.unique(np.concatenate([s["week_start"] for s in all_series] or [np.array([], dtype="datetime64[D]")]))
+    ends = np.full(len(grid), np.datetime64("NaT"), dtype="datetime64[D]")
+    matrix: Dict[str, Any] = {"resource_ids": resource_ids, "week_start": grid}
+    for m in ALLOCATION_MEASURES:
+        matrix[m] = np.zeros((len(resource_ids), len(grid)))
+    for r, series in enumerate(all_series):
+        cols = np.searchsorted(grid, series["week_start"])
+        ends[cols] = series["week_end"]
+        for m in ALLOCATION_MEASURES:
+            matrix[m][r, cols] = series[m]
+    missing = np.isnat(ends)
+    ends[missing] = grid[missing] + 6
+    matrix["week_end"] = ends
+    return matrix
+
+@_tool
 def get_resource_allocation_planned_actual(
     resource_id: int,
     start_date: str,
     end_date: str,
-    interval: str = "Weekly"
+    interval: Optional[str] = None,
+    include_cumulative: bool = False
 ) -> List[Dict[str, Any]]:
     """
     Fetch planned and actual allocation/capacity for a resource over a time interval.
-    Use resource_id from get_all_resources. Interval can be 'Weekly' or 'Monthly'.
+    Use resource_id from get_all_resources. Interval can be 'Weekly', 'Monthly',
+    'Quarterly' or 'Yearly'; leave it empty to get the finest interval that keeps
+    the response small. Switching interval for the same resource and window is
+    answered locally without another upstream request.
+    Weekly rows are whole upstream weeks, so the first and last may start before
+    start_date or end after end_date; Monthly/Quarterly/Yearly rows are clipped to
+    [start_date, end_date] and only count the days inside it.
+    Cumulative columns are only returned when include_cumulative is True
+    (set it only when the user asks for cumulative/running totals).
     """
     try:
-        params = {
-            "resource_id": resource_id,
-            "start_date": start_date,
-            "end_date": end_date,
-            "interval": interval
-        }
-        url = f"{api_url}/resource_capacity_allocation"
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        return response.json()
+        if interval:
+            matches = [i for i in ALLOCATION_INTERVALS if i.lower() == interval.strip().lower()]
+            if not matches:
+                return [{"error": f"Unsupported interval '{interval}'. Use one of {ALLOCATION_INTERVALS}"}]
+            interval = matches[0]
+        series = _fetch_weekly_allocation(resource_id, start_date, end_date)
+        start, end = np.datetime64(start_date[:10], "D"), np.datetime64(end_date[:10], "D")
+        if interval:
+            rolled = _rollup_series(series, interval, start, end)
+        else:
+            interval, rolled = _choose_interval(series, start, end)
+        return _series_rows(rolled, interval, include_cumulative)
+    except UpstreamOverloaded as e:
+        return _overloaded_error(e)
     except requests.exceptions.RequestException as e:
         return [{"error": f"API request failed: {str(e)}"}]
     except Exception as e:
@@ -213,5 +1152,1004 @@ def resource_capacity_allocation_planned_actual_doc() -> str:
 def resource_capacity_allocation_planned_actual_prompt() -> str:
     return load_prompt_txt("resource_capacity_allocation_planned_actual.txt")
 
+# ================================================================================
+# CAPACITY PLANNING SECTION (what-if reallocation)
+# ================================================================================
+
+def _overlap_fraction(week_start: np.ndarray, week_end: np.ndarray, start: np.datetime64, end: np.datetime64) -> np.ndarray:
+    """Share of each week's days that fall inside [start, end]."""
+    days = (week_end - week_start).astype(int) + 1
+    inside = (np.minimum(week_end, end) - np.maximum(week_start, start)).astype(int) + 1
+    return np.clip(inside / np.maximum(days, 1), 0.0, 1.0)
+
+def _capacity_stats(capacity: np.ndarray, planned: np.ndarray) -> Dict[str, np.ndarray]:
+    cap_total = capacity.sum(axis=1)
+    planned_total = planned.sum(axis=1)
+    over = np.maximum(planned - capacity, 0.0)
+    return {
+        "total_capacity": cap_total,
+        "allocation_hours_planned": planned_total,
+        "utilization": np.divide(planned_total, cap_total, out=np.zeros_like(planned_total), where=cap_total > 0),
+        "over_allocated_hours": over.sum(axis=1),
+        "over_allocated_weeks": (over > 0).sum(axis=1),
+    }
+
+@_tool
+def simulate_reallocation(
+    start_date: str,
+    end_date: str,
+    scenarios: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """
+    What-if capacity planning: move planned hours between resources and compare
+    utilization and over-allocation before and after. Many scenarios run in one call.
+    - start_date, end_date: evaluation window (YYYY-MM-DD)
+    - scenarios: [{"name": "A to B from July",
+                   "transfers": [{"from_resource_id": 1, "to_resource_id": 2, "hours_per_week": 10,
+                                  "start_date": "2025-07-01", "end_date": "2025-09-30"}]}]
+      Transfer dates default to the evaluation window. A transfer never moves more
+      hours than the source resource has planned in a week.
+    Returns one row per scenario with per-resource before/after/delta figures.
+    """
+    try:
+        if not scenarios:
+            return [{"error": "Provide at least one scenario with transfers"}]
+        resource_ids = []
+        for sc in scenarios:
+            for t in sc.get("transfers") or []:
+                resource_ids += [int(t["from_resource_id"]), int(t["to_resource_id"])]
+        if not resource_ids:
+            return [{"error": "Scenarios contain no transfers"}]
+        matrix = _fetch_allocation_matrix(resource_ids, start_date, end_date)
+        ids = matrix["resource_ids"]
+        row_of = {rid: i for i, rid in enumerate(ids)}
+        capacity = matrix["total_capacity"]
+        base_planned = matrix["allocation_hours_planned"]
+        window_start, window_end = np.datetime64(start_date[:10], "D"), np.datetime64(end_date[:10], "D")
+        before = _capacity_stats(capacity, base_planned)
+        names = {rid: (resources_snapshot.rows.get(rid) or {}).get("resource_name") for rid in ids}
+
+        result = []
+        for n, sc in enumerate(scenarios):
+            planned = base_planned.copy()
+            moved_total = 0.0
+            for t in sc.get("transfers") or []:
+                src, dst = row_of[int(t["from_resource_id"])], row_of[int(t["to_resource_id"])]
+                t_start = np.datetime64(str(t.get("start_date") or start_date)[:10], "D")
+                t_end = np.datetime64(str(t.get("end_date") or end_date)[:10], "D")
+                frac = _overlap_fraction(matrix["week_start"], matrix["week_end"], max(t_start, window_start), min(t_end, window_end))
+                moved = np.minimum(float(t.get("hours_per_week") or 0.0) * frac, planned[src])
+                planned[src] -= moved
+                planned[dst] += moved
+                moved_total += float(moved.sum())
+            after = _capacity_stats(capacity, planned)
+            resources = []
+            for rid in ids:
+                i = row_of[rid]
+                entry = {"resource_id": rid, "resource_name": names.get(rid)}
+                for key in ("allocation_hours_planned", "utilization", "over_allocated_hours", "over_allocated_weeks"):
+                    digits = 4 if key == "utilization" else 2
+                    b, a = before[key][i].item(), after[key][i].item()
+                    entry[f"{key}_before"] = round(b, digits)
+                    entry[f"{key}_after"] = round(a, digits)
+                    entry[f"{key}_delta"] = round(a - b, digits)
+                resources.append(entry)
+            over_before = float(before["over_allocated_hours"].sum())
+            over_after = float(after["over_allocated_hours"].sum())
+            result.append({
+                "scenario": sc.get("name") or f"scenario_{n + 1}",
+                "hours_moved": round(moved_total, 2),
+                "over_allocated_hours_before": round(over_before, 2),
+                "over_allocated_hours_after": round(over_after, 2),
+                "over_allocated_hours_delta": round(over_after - over_before, 2),
+                "resources": resources,
+            })
+        return result
+    except UpstreamOverloaded as e:
+        return _overloaded_error(e)
+    except requests.exceptions.RequestException as e:
+        return [{"error": f"API request failed: {str(e)}"}]
+    except (KeyError, TypeError, ValueError) as e:
+        return [{"error": f"Invalid scenario definition: {str(e)}"}]
+    except Exception as e:
+        return [{"error": f"Unexpected error in simulate_reallocation: {str(e)}"}]
+
+@mcp.resource("pmo://docs/simulate_reallocation")
+def simulate_reallocation_doc() -> str:
+    return load_resource_txt("docs_simulate_reallocation.txt")
+
+# ================================================================================
+# PLANNED VS ACTUAL VARIANCE SECTION (anomaly scan)
+# ================================================================================
+
+def _run_lengths(mask: np.ndarray) -> np.ndarray:
+    """Length of the run of True values ending at each position, row-wise."""
+    idx = np.arange(mask.shape[1])
+    last_false = np.maximum.accumulate(np.where(~mask, idx, -1), axis=1)
+    return np.where(mask, idx - last_false, 0)
+
+def _rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Trailing mean over `window` columns; the first window-1 columns average what is available."""
+    csum = np.cumsum(values, axis=1)
+    shifted = np.zeros_like(csum)
+    shifted[:, window:] = csum[:, :-window]
+    counts = np.minimum(np.arange(1, values.shape[1] + 1), window)
+    return (csum - shifted) / counts
+
+def _all_resource_ids() -> List[int]:
+    if resources_snapshot.is_stale():
+        fresh = get_all_resources()
+        if fresh and isinstance(fresh[0], dict) and "error" in fresh[0] and not resources_snapshot.rows:
+            raise RuntimeError(fresh[0]["error"])
+    return sorted(rid for rid in resources_snapshot.rows if isinstance(rid, int))
+
+@_tool
+def variance_anomalies(
+    start_date: str,
+    end_date: str,
+    resource_ids: Optional[List[int]] = None,
+    window: int = 4,
+    z_threshold: float = 2.5,
+    min_bias_hours: float = 2.0,
+    min_run: int = 4,
+    top_n: int = 20
+) -> List[Dict[str, Any]]:
+    """
+    Scan planned vs actual hours (variance = actual - planned) of every resource
+    (or the given resource_ids) for systematic drift, using completed weeks only.
+    - spike: weeks whose variance is at least z_threshold standard deviations
+      away from the resource's own mean variance
+    - sustained_bias: at least min_run consecutive weeks whose trailing
+      `window`-week mean variance stays above min_bias_hours in one direction
+    Returns the top_n anomalies, strongest first, with the weeks that triggered them.
+    """
+    try:
+        ids = list(resource_ids) if resource_ids else _all_resource_ids()
+        if not ids:
+            return [{"error": "No resources to scan"}]
+        matrix = _fetch_allocation_matrix(ids, start_date, end_date)
+        done = matrix["week_end"] <= np.datetime64("today", "D")
+        weeks = matrix["week_start"][done]
+        planned = matrix["allocation_hours_planned"][:, done]
+        actual = matrix["allocation_hours_actual"][:, done]
+        if not weeks.size:
+            return []
+        window = max(1, min(window, weeks.size))
+        variance = actual - planned
+        mean = variance.mean(axis=1)
+        std = variance.std(axis=1)
+        z = np.divide(variance - mean[:, None], std[:, None], out=np.zeros_like(variance), where=std[:, None] > 0)
+        rolling = _rolling_mean(variance, window)
+        week_labels = weeks.astype(str).tolist()
+        names = {rid: (resources_snapshot.rows.get(rid) or {}).get("resource_name") for rid in matrix["resource_ids"]}
+
+        def period(r: int, t: int, with_z: bool = False) -> Dict[str, Any]:
+            entry = {
+                "week_start": week_labels[t],
+                "allocation_hours_planned": round(float(planned[r, t]), 2),
+                "allocation_hours_actual": round(float(actual[r, t]), 2),
+                "variance": round(float(variance[r, t]), 2),
+            }
+            if with_z:
+                entry["z_score"] = round(float(z[r, t]), 2)
+            return entry
+
+        anomalies = []
+        spikes = np.abs(z) >= z_threshold
+        for r in np.flatnonzero(spikes.any(axis=1)):
+            cols = np.flatnonzero(spikes[r])
+            peak = cols[np.argmax(np.abs(z[r, cols]))]
+            anomalies.append({
+                "resource_id": matrix["resource_ids"][r],
+                "resource_name": names.get(matrix["resource_ids"][r]),
+                "type": "spike",
+                "direction": "over" if variance[r, peak] > 0 else "under",
+                "score": round(float(abs(z[r, peak])), 2),
+                "mean_variance": round(float(mean[r]), 2),
+                "periods": [period(r, t, with_z=True) for t in cols],
+            })
+        for direction, biased in (("over", rolling >= min_bias_hours), ("under", rolling <= -min_bias_hours)):
+            runs = _run_lengths(biased)
+            longest = runs.max(axis=1)
+            for r in np.flatnonzero(longest >= min_run):
+                end = int(np.argmax(runs[r]))
+                begin = max(0, end - int(longest[r]) - window + 2)
+                # trim the window lead-in/out to the weeks that actually drift this way
+                same_way = np.flatnonzero(np.sign(variance[r, begin:end + 1]) == (1 if direction == "over" else -1))
+                if same_way.size < min_run:
+                    continue
+                begin, end = begin + int(same_way[0]), begin + int(same_way[-1])
+                span = variance[r, begin:end + 1]
+                # t-like score: mean drift over the run relative to the resource's noise (floored at 1h)
+                score = abs(span.mean()) * np.sqrt(span.size) / max(float(std[r]), 1.0)
+                anomalies.append({
+                    "resource_id": matrix["resource_ids"][r],
+                    "resource_name": names.get(matrix["resource_ids"][r]),
+                    "type": "sustained_bias",
+                    "direction": direction,
+                    "score": round(float(score), 2),
+                    "mean_variance": round(float(span.mean()), 2),
+                    "run_weeks": int(span.size),
+                    "periods": [period(r, t) for t in range(begin, end + 1)],
+                })
+        anomalies.sort(key=lambda a: a["score"], reverse=True)
+        return anomalies[:top_n]
+    except UpstreamOverloaded as e:
+        return _overloaded_error(e)
+    except requests.exceptions.RequestException as e:
+        return [{"error": f"API request failed: {str(e)}"}]
+    except Exception as e:
+        return [{"error": f"Unexpected error in variance_anomalies: {str(e)}"}]
+
+@mcp.resource("pmo://docs/variance_anomalies")
+def variance_anomalies_doc() -> str:
+    return load_resource_txt("docs_variance_anomalies.txt")
+
+# ================================================================================
+# CAPACITY FORECAST SECTION
+# ================================================================================
+
+FORECAST_METHODS = ["trailing", "seasonal", "blend"]
+SEASON_WEEKS = 52
+
+@_tool
+def forecast_capacity(
+    periods: int = 13,
+    as_of: Optional[str] = None,
+    resource_ids: Optional[List[int]] = None,
+    resource_role: Optional[str] = None,
+    strategic_portfolio: Optional[str] = None,
+    method: str = "blend",
+    trailing_weeks: int = 8,
+    include_series: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    Project capacity and utilization `periods` weeks ahead for a whole team in one call.
+    Expected demand per week is the larger of the known planned allocation and a model of
+    actual hours: "trailing" (mean of the last trailing_weeks), "seasonal" (same week last
+    year) or "blend" (average of both). Capacity comes from the upstream future capacity,
+    falling back to the trailing average.
+    - as_of: forecast start (YYYY-MM-DD, default today)
+    - resource_ids / resource_role / strategic_portfolio: team selection (default everyone)
+    - include_series: also return the weekly projection per resource
+    Returns one row with the team projection per week and a per-resource summary,
+    resources that run out of capacity first listed first.
+    """
+    try:
+        if method not in FORECAST_METHODS:
+            return [{"error": f"Unknown method '{method}'. Use one of {FORECAST_METHODS}"}]
+        periods = max(1, int(periods))
+        trailing_weeks = max(1, int(trailing_weeks))
+        if resource_ids:
+            ids = list(resource_ids)
+        else:
+            ids = _all_resource_ids()
+            with _resource_index_lock:
+                for field, value in (("resource_role", resource_role), ("strategic_portfolio", strategic_portfolio)):
+                    if value:
+                        match = _lookup_attribute(field, value)
+                        ids = [rid for rid in ids if rid in match]
+        if not ids:
+            return [{"error": "No resources match the team selection"}]
+
+        as_of_day = np.datetime64(as_of[:10] if as_of else "today", "D")
+        history_start = as_of_day - 7 * (SEASON_WEEKS + trailing_weeks)
+        horizon_end = as_of_day + 7 * periods - 1
+        matrix = _fetch_allocation_matrix(ids, str(history_start), str(horizon_end))
+        weeks = matrix["week_start"]
+        past = matrix["week_end"] < as_of_day
+        future_cols = np.flatnonzero(~past)[:periods]
+        if not future_cols.size:
+            return [{"error": "Upstream returned no weeks after as_of"}]
+        past_cols = np.flatnonzero(past)
+        capacity = matrix["total_capacity"]
+        actual = matrix["allocation_hours_actual"]
+
+        recent = past_cols[-trailing_weeks:]
+        n_res = len(matrix["resource_ids"])
+        trailing = actual[:, recent].mean(axis=1) if recent.size else np.zeros(n_res)
+        trailing_cap = capacity[:, recent].mean(axis=1) if recent.size else np.zeros(n_res)
+        trailing_model = np.repeat(trailing[:, None], future_cols.size, axis=1)
+        # same week last year by calendar date; weeks without history fall back to the trailing mean
+        last_year = np.searchsorted(weeks, weeks[future_cols] - 7 * SEASON_WEEKS)
+        found = (last_year < weeks.size) & (weeks[np.minimum(last_year, weeks.size - 1)] == weeks[future_cols] - 7 * SEASON_WEEKS)
+        seasonal_model = trailing_model.copy()
+        seasonal_model[:, found] = actual[:, last_year[found]]
+        model = {"trailing": trailing_model, "seasonal": seasonal_model,
+                 "blend": (trailing_model + seasonal_model) / 2}[method]
+
+        planned = matrix["allocation_hours_planned"][:, future_cols]
+        demand = np.maximum(planned, model)
+        cap = capacity[:, future_cols]
+        cap = np.where(cap > 0, cap, trailing_cap[:, None])
+        available = cap - demand
+        utilization = np.divide(demand, cap, out=np.zeros_like(demand), where=cap > 0)
+        short = available < 0
+        first_short = np.where(short.any(axis=1), short.argmax(axis=1), -1)
+
+        week_labels = weeks[future_cols].astype(str).tolist()
+        names = {rid: (resources_snapshot.rows.get(rid) or {}).get("resource_name") for rid in matrix["resource_ids"]}
+        team_cap, team_demand = cap.sum(axis=0), demand.sum(axis=0)
+        team = [{
+            "week_start": week_labels[j],
+            "total_capacity": round(float(team_cap[j]), 2),
+            "forecast_demand": round(float(team_demand[j]), 2),
+            "available_capacity": round(float(team_cap[j] - team_demand[j]), 2),
+            "utilization": round(float(team_demand[j] / team_cap[j]), 4) if team_cap[j] > 0 else None,
+            "resources_over_capacity": int(short[:, j].sum()),
+        } for j in range(future_cols.size)]
+
+        resources = []
+        for r, rid in enumerate(matrix["resource_ids"]):
+            entry = {
+                "resource_id": rid,
+                "resource_name": names.get(rid),
+                "first_week_over_capacity": week_labels[first_short[r]] if first_short[r] >= 0 else None,
+                "weeks_over_capacity": int(short[r].sum()),
+                "avg_utilization": round(float(utilization[r].mean()), 4),
+                "available_capacity_total": round(float(available[r].sum()), 2),
+                "min_available_capacity": round(float(available[r].min()), 2),
+            }
+            if include_series:
+                entry["series"] = [{
+                    "week_start": week_labels[j],
+                    "total_capacity": round(float(cap[r, j]), 2),
+                    "allocation_hours_planned": round(float(planned[r, j]), 2),
+                    "forecast_demand": round(float(demand[r, j]), 2),
+                    "available_capacity": round(float(available[r, j]), 2),
+                } for j in range(future_cols.size)]
+            resources.append(entry)
+        resources.sort(key=lambda e: (e["first_week_over_capacity"] or "9999", -e["avg_utilization"]))
+        team_short = [w["week_start"] for w in team if w["available_capacity"] < 0]
+        return [{
+            "as_of": str(as_of_day),
+            "method": method,
+            "periods": int(future_cols.size),
+            "team_first_week_over_capacity": team_short[0] if team_short else None,
+            "team": team,
+            "resources": resources,
+        }]
+    except UpstreamOverloaded as e:
+        return _overloaded_error(e)
+    except requests.exceptions.RequestException as e:
+        return [{"error": f"API request failed: {str(e)}"}]
+    except Exception as e:
+        return [{"error": f"Unexpected error in forecast_capacity: {str(e)}"}]
+
+@mcp.resource("pmo://docs/forecast_capacity")
+def forecast_capacity_doc() -> str:
+    return load_resource_txt("docs_forecast_capacity.txt")
+
+# ================================================================================
+# PORTFOLIO SUMMARY SECTION (materialized)
+# ================================================================================
+
+PROJECT_FLAG_FIELDS = ["current_status", "rag_status", "project_type", "vitality", "strategic", "aim", "technology_project"]
+PROJECT_SUM_FIELDS = REVENUE_HORIZON_FIELDS + [
+    "project_resource_hours_planned",
+    "project_resource_hours_actual",
+    "project_resource_cost_planned",
+    "project_resource_cost_actual",
+]
+PROJECT_DATE_FIELDS = ["start_date_est", "end_date_est"]
+# a project missing any of these is counted (and listed) under projects_missing_data
+PROJECT_REQUIRED_FIELDS = ["start_date_est", "end_date_est", "current_status", "rag_status"]
+RESOURCE_FLAG_FIELDS = ["resource_role", "resource_type"]
+SUMMARY_MISSING_IDS = 20
+
+# (strategic_portfolio, product_line) -> {"counts": Counter, "sums": defaultdict(float)}
+# counts keys: "project_count", "resource_count", ("flag", field, value),
+#              ("date", field, YYYY-MM-DD), ("missing", project_id)
+_summary_cells: Dict[Tuple[Any, Any], Dict[str, Any]] = {}
+_summary_lock = threading.Lock()
+
+def _blank(value: Any) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip())
+
+def _summary_update(row: Dict[str, Any], sign: int, count_key: str, flag_fields: List[str], sum_fields: List[str]) -> None:
+    key = (row.get("strategic_portfolio"), row.get("product_line"))
+    cell = _summary_cells.get(key)
+    if cell is None:
+        cell = _summary_cells[key] = {"counts": Counter(), "sums": defaultdict(float)}
+    counts, sums = cell["counts"], cell["sums"]
+    touched = [count_key] + [("flag", f, row.get(f)) for f in flag_fields]
+    if count_key == "project_count":
+        touched += [("date", f, str(row[f])[:10]) for f in PROJECT_DATE_FIELDS if not _blank(row.get(f))]
+        if any(_blank(row.get(f)) for f in PROJECT_REQUIRED_FIELDS):
+            touched.append(("missing", row.get("project_id")))
+    for k in touched:
+        counts[k] += sign
+        if counts[k] <= 0:
+            del counts[k]
+    for f in sum_fields:
+        sums[f] += sign * (_to_float(row.get(f)) or 0.0)
+    if not counts:
+        del _summary_cells[key]
+
+def _on_projects_changed_summary(inserted, updated, deleted) -> None:
+    with _summary_lock:
+        for row in deleted:
+            _summary_update(row, -1, "project_count", PROJECT_FLAG_FIELDS, PROJECT_SUM_FIELDS)
+        for old, new in updated:
+            _summary_update(old, -1, "project_count", PROJECT_FLAG_FIELDS, PROJECT_SUM_FIELDS)
+            _summary_update(new, +1, "project_count", PROJECT_FLAG_FIELDS, PROJECT_SUM_FIELDS)
+        for row in inserted:
+            _summary_update(row, +1, "project_count", PROJECT_FLAG_FIELDS, PROJECT_SUM_FIELDS)
+
+def _on_resources_changed_summary(inserted, updated, deleted) -> None:
+    with _summary_lock:
+        for row in deleted:
+            _summary_update(row, -1, "resource_count", RESOURCE_FLAG_FIELDS, ["yearly_capacity"])
+        for old, new in updated:
+            _summary_update(old, -1, "resource_count", RESOURCE_FLAG_FIELDS, ["yearly_capacity"])
+            _summary_update(new, +1, "resource_count", RESOURCE_FLAG_FIELDS, ["yearly_capacity"])
+        for row in inserted:
+            _summary_update(row, +1, "resource_count", RESOURCE_FLAG_FIELDS, ["yearly_capacity"])
+
+projects_snapshot.add_listener(_on_projects_changed_summary)
+resources_snapshot.add_listener(_on_resources_changed_summary)
+
+def _summary_view(counts: Counter, sums: Dict[str, float]) -> Dict[str, Any]:
+    """Turn merged counters into the JSON shape returned by get_portfolio_summary."""
+    flags: Dict[str, Dict[str, int]] = {}
+    dates: Dict[str, List[str]] = {}
+    missing = []
+    for k, n in counts.items():
+        if not isinstance(k, tuple):
+            continue
+        if k[0] == "flag":
+            flags.setdefault(k[1], {})["(blank)" if _blank(k[2]) else str(k[2])] = n
+        elif k[0] == "date":
+            dates.setdefault(k[1], []).append(k[2])
+        elif k[0] == "missing":
+            missing.append(k[1])
+    view: Dict[str, Any] = {
+        "project_count": counts.get("project_count", 0),
+        "resource_count": counts.get("resource_count", 0),
+    }
+    for f in PROJECT_SUM_FIELDS:
+        view[f] = round(sums.get(f, 0.0), 2)
+    view["yearly_capacity"] = round(sums.get("yearly_capacity", 0.0), 1)
+    view["start_date_est_min"] = min(dates.get("start_date_est", []), default=None)
+    view["end_date_est_max"] = max(dates.get("end_date_est", []), default=None)
+    for f in PROJECT_FLAG_FIELDS:
+        view[f] = dict(sorted(flags.get(f, {}).items()))
+    for f in RESOURCE_FLAG_FIELDS:
+        view[f] = dict(sorted(flags.get(f, {}).items()))
+    view["projects_missing_data"] = len(missing)
+    view["projects_missing_data_ids"] = sorted(missing, key=str)[:SUMMARY_MISSING_IDS]
+    return view
+
+@_tool
+def get_portfolio_summary(
+    strategic_portfolio: Optional[str] = None,
+    include_product_lines: bool = True
+) -> List[Dict[str, Any]]:
+    """
+    Precomputed summary of projects and resources, kept up to date as the data changes,
+    so summaries do not need the full get_all_projects/get_all_resources downloads.
+    Returns one object with the overall totals and one entry per strategic portfolio
+    (with product line entries unless include_product_lines is False): project and
+    resource counts, status/RAG/type/flag distributions, start/end date span, revenue
+    estimates, planned/actual hours and cost, resource roles and types, yearly capacity
+    and projects with missing data.
+    - strategic_portfolio: limit the answer to one portfolio
+    """
+    try:
+        for snapshot, refresh in ((projects_snapshot, get_all_projects), (resources_snapshot, get_all_resources)):
+            if snapshot.is_stale():
+                fresh = refresh()
+                if fresh and isinstance(fresh[0], dict) and "error" in fresh[0] and not snapshot.rows:
+                    return fresh
+
+        def empty() -> Dict[str, Any]:
+            return {"counts": Counter(), "sums": defaultdict(float)}
+
+        def merge(into: Dict[str, Any], cell: Dict[str, Any]) -> None:
+            into["counts"].update(cell["counts"])
+            for f, v in cell["sums"].items():
+                into["sums"][f] += v
+
+        total = empty()
+        portfolios: Dict[Any, Dict[str, Any]] = {}
+        lines: Dict[Any, Dict[Any, Dict[str, Any]]] = {}
+        with _summary_lock:
+            for (portfolio, line), cell in _summary_cells.items():
+                if strategic_portfolio is not None and portfolio != strategic_portfolio:
+                    continue
+                merge(total, cell)
+                merge(portfolios.setdefault(portfolio, empty()), cell)
+                if include_product_lines:
+                    merge(lines.setdefault(portfolio, {}).setdefault(line, empty()), cell)
+
+        result_portfolios = []
+        for portfolio in sorted(portfolios, key=lambda p: str(p or "")):
+            entry = {"strategic_portfolio": portfolio, **_summary_view(**portfolios[portfolio])}
+            if include_product_lines:
+                entry["product_lines"] = [
+                    {"product_line": line, **_summary_view(**agg)}
+                    for line, agg in sorted(lines[portfolio].items(), key=lambda item: str(item[0] or ""))
+                ]
+            result_portfolios.append(entry)
+        return [{
+            "projects_version": projects_snapshot.version,
+            "resources_version": resources_snapshot.version,
+            "total": _summary_view(**total),
+            "portfolios": result_portfolios,
+        }]
+    except Exception as e:
+        return [{"error": f"Unexpected error in get_portfolio_summary: {str(e)}"}]
+
+@mcp.resource("pmo://docs/portfolio_summary")
+def portfolio_summary_doc() -> str:
+    return load_resource_txt("docs_portfolio_summary.txt")
+
+# ================================================================================
+# STAFFING SUGGESTIONS SECTION (assignment optimizer)
+# ================================================================================
+
+# Wall-clock budget for the local search after the greedy pass
+STAFFING_SEARCH_SECONDS = float(os.getenv("PMO_STAFFING_SEARCH_SECONDS", "1.0"))
+_EPS = 1e-6
+
+def _assign_staffing(
+    available: np.ndarray,
+    needs: np.ndarray,
+    candidates: List[np.ndarray],
+    order: List[int],
+    max_per_demand: int,
+    time_budget: float = STAFFING_SEARCH_SECONDS
+) -> Tuple[List[Dict[int, np.ndarray]], np.ndarray, int]:
+    """
+    Assign weekly demand hours (demand x week) to resource rows of the available
+    capacity matrix (resource x week). Greedy first: demands in the given order each
+    take the candidate covering most of their remaining need, up to max_per_demand
+    resources. Local search then works on demands still short: a demand at its
+    resource limit swaps its weakest resource for a candidate covering more, and
+    another demand's hours are moved off a shared candidate onto one of that
+    demand's alternatives when this frees capacity the short demand can use.
+    Every move strictly lowers total unmet hours.
+    Returns (per-demand {resource row: hours per week}, remaining need, moves made).
+    """
+    available = available.copy()
+    remaining = needs.copy()
+    assign: List[Dict[int, np.ndarray]] = [dict() for _ in range(len(needs))]
+    holders: Dict[int, set] = defaultdict(set)
+
+    def give(d: int, r: int, hours: np.ndarray) -> None:
+        current = assign[d].get(r)
+        assign[d][r] = hours if current is None else current + hours
+        holders[r].add(d)
+        if assign[d][r].sum() <= _EPS:
+            del assign[d][r]
+            holders[r].discard(d)
+
+    # rows with spare capacity, and per candidate pool how many it holds (pools are
+    # shared between demands with the same filters, so this is cached by identity)
+    has_free = available.sum(axis=1) > _EPS
+    pool_free: Dict[int, int] = {}
+
+    def touch(r: int) -> None:
+        free = available[r].sum() > _EPS
+        if free != has_free[r]:
+            has_free[r] = free
+            pool_free.clear()
+
+    def free_in(pool: np.ndarray) -> int:
+        key = id(pool)
+        if key not in pool_free:
+            pool_free[key] = int(has_free[pool].sum())
+        return pool_free[key]
+
+    def fill(d: int, r: int) -> None:
+        take = np.minimum(available[r], remaining[d])
+        available[r] -= take
+        remaining[d] -= take
+        give(d, r, take)
+        touch(r)
+
+    def mobile(r: int) -> bool:
+        return any(free_in(candidates[e]) - int(has_free[r]) > 0 for e in holders[r])
+
+    for d in order:
+        cand = candidates[d][has_free[candidates[d]]]
+        while len(assign[d]) < max_per_demand and remaining[d].sum() > _EPS and cand.size:
+            cover = np.minimum(available[cand], remaining[d]).sum(axis=1)
+            best = int(np.argmax(cover))
+            if cover[best] <= _EPS:
+                break
+            fill(d, int(cand[best]))
+
+    moves = 0
+    deadline = time.monotonic() + time_budget
+    improved = True
+
+    while improved and time.monotonic() < deadline:
+        improved = False
+        # rows held by a demand that has somewhere else to go (refreshed per pass and per move)
+        row_mobile = np.zeros(len(available), dtype=bool)
+        for e, held_rows in enumerate(assign):
+            if held_rows and free_in(candidates[e]):
+                row_mobile[list(held_rows)] = True
+        for d in order:
+            if remaining[d].sum() <= _EPS or time.monotonic() >= deadline:
+                continue
+            if len(assign[d]) >= max_per_demand and free_in(candidates[d]):
+                # at its resource limit: swap the weakest assigned resource for a candidate covering more
+                weakest = min(assign[d], key=lambda r: assign[d][r].sum())
+                held = assign[d][weakest]
+                others = candidates[d][has_free[candidates[d]] & ~np.isin(candidates[d], list(assign[d]))]
+                if others.size:
+                    cover = np.minimum(available[others], remaining[d] + held).sum(axis=1)
+                    best = int(np.argmax(cover))
+                    if cover[best] > held.sum() + _EPS:
+                        give(d, weakest, -held)
+                        available[weakest] += held
+                        remaining[d] += held
+                        touch(weakest)
+                        fill(d, int(others[best]))
+                        moves += 1
+                        improved = True
+                        if remaining[d].sum() <= _EPS:
+                            continue
+            # ejection: move another demand e off a candidate r1 onto a free alternative r2, then use r1
+            for r1 in candidates[d][row_mobile[candidates[d]]].tolist():
+                if time.monotonic() >= deadline:
+                    break
+                if r1 not in assign[d] and len(assign[d]) >= max_per_demand:
+                    continue
+                deficit = None
+                for e in sorted(holders[r1] - {d}):
+                    cand_e = candidates[e]
+                    if free_in(cand_e) - int(has_free[r1]) <= 0:
+                        continue
+                    if deficit is None:
+                        deficit = np.maximum(remaining[d] - available[r1], 0.0)
+                        if deficit.sum() <= _EPS:
+                            break
+                    held = assign[e][r1]
+                    alt = cand_e[has_free[cand_e] & (cand_e != r1)]
+                    moved = np.minimum(np.minimum(available[alt], held), deficit)
+                    gain = moved.sum(axis=1)
+                    if len(assign[e]) >= max_per_demand:
+                        # respect e's resource limit unless the move empties its slot on r1
+                        frees_slot = (held - moved).sum(axis=1) <= _EPS
+                        gain[~np.isin(alt, list(assign[e])) & ~frees_slot] = 0.0
+                    best = int(np.argmax(gain))
+                    if gain[best] <= _EPS:
+                        continue
+                    r2, m = int(alt[best]), moved[best]
+                    give(e, r1, -m)
+                    give(e, r2, m)
+                    available[r2] -= m
+                    available[r1] += m
+                    touch(r2)
+                    fill(d, r1)
+                    row_mobile[r1] = mobile(r1)
+                    row_mobile[r2] = True
+                    moves += 1
+                    improved = True
+                    deficit = np.maximum(remaining[d] - available[r1], 0.0)
+                    if deficit.sum() <= _EPS:
+                        break
+                if remaining[d].sum() <= _EPS:
+                    break
+    return assign, remaining, moves
+
+@_tool
+def suggest_staffing(
+    demands: List[Dict[str, Any]],
+    max_resources_per_demand: int = 2
+) -> List[Dict[str, Any]]:
+    """
+    Suggest which resources can staff a set of demand requests, using their
+    available capacity (total capacity minus planned allocation) per week.
+    - demands: [{"name": "Pricing rebuild", "resource_role": "Data Engineer",
+                 "hours_per_week": 20, "start_date": "2025-07-01", "end_date": "2025-09-30",
+                 "strategic_portfolio": "Market & Sell",   # optional candidate filter
+                 "product_line": "PAS",                     # optional candidate filter
+                 "priority": 1}]                            # optional, lower is staffed first
+    - max_resources_per_demand: how many people a demand may be split across
+    Returns one object with totals and, per demand, the suggested resources with
+    their hours, plus the hours and weeks that could not be covered.
+    """
+    try:
+        if not demands:
+            return [{"error": "Provide at least one demand"}]
+        if resources_snapshot.is_stale():
+            fresh = get_all_resources()
+            if fresh and isinstance(fresh[0], dict) and "error" in fresh[0] and not resources_snapshot.rows:
+                return fresh
+
+        pools: List[set] = []
+        with _resource_index_lock:
+            for dm in demands:
+                if not dm.get("resource_role"):
+                    return [{"error": f"Demand '{dm.get('name')}' needs a resource_role"}]
+                ids = _lookup_attribute("resource_role", dm["resource_role"])
+                for field in ("strategic_portfolio", "product_line"):
+                    if dm.get(field):
+                        ids &= _lookup_attribute(field, dm[field])
+                pools.append(ids)
+        resource_ids = sorted({rid for ids in pools for rid in ids})
+        windows = [(str(dm["start_date"])[:10], str(dm["end_date"])[:10]) for dm in demands]
+        start_date, end_date = min(w[0] for w in windows), max(w[1] for w in windows)
+
+        if resource_ids:
+            matrix = _fetch_allocation_matrix(resource_ids, start_date, end_date)
+            week_start, week_end = matrix["week_start"], matrix["week_end"]
+            available = np.maximum(matrix["total_capacity"] - matrix["allocation_hours_planned"], 0.0)
+        else:
+            week_start = np.arange(np.datetime64(start_date, "W"), np.datetime64(end_date, "W") + 1).astype("datetime64[D]")
+            week_end = week_start + 6
+            available = np.zeros((0, len(week_start)))
+        row_of = {rid: i for i, rid in enumerate(resource_ids)}
+
+        needs = np.zeros((len(demands), len(week_start)))
+        for d, (dm, (d_start, d_end)) in enumerate(zip(demands, windows)):
+            frac = _overlap_fraction(week_start, week_end, np.datetime64(d_start, "D"), np.datetime64(d_end, "D"))
+            needs[d] = float(dm.get("hours_per_week") or 0.0) * frac
+        # demands with the same filters share one candidate array (the local search caches per array)
+        shared: Dict[frozenset, np.ndarray] = {}
+        candidates = [shared.setdefault(frozenset(pool), np.array(sorted(row_of[rid] for rid in pool), dtype=int))
+                      for pool in pools]
+        # staff by priority, then the hardest to place (fewest candidates, most hours) first
+        order = sorted(range(len(demands)), key=lambda d: (float(demands[d].get("priority") or 0),
+                                                             candidates[d].size, -needs[d].sum()))
+        assign, remaining, moves = _assign_staffing(available, needs, candidates, order, max(1, max_resources_per_demand))
+
+        result_demands = []
+        for d, dm in enumerate(demands):
+            rows = []
+            for r, hours in sorted(assign[d].items(), key=lambda item: -item[1].sum()):
+                rid = resource_ids[r]
+                used = np.flatnonzero(hours > _EPS)
+                rows.append({
+                    "resource_id": rid,
+                    "resource_name": (resources_snapshot.rows.get(rid) or {}).get("resource_name"),
+                    "hours": round(float(hours.sum()), 2),
+                    "weeks": int(used.size),
+                    "first_week": str(week_start[used[0]]) if used.size else None,
+                    "last_week": str(week_start[used[-1]]) if used.size else None,
+                })
+            requested = float(needs[d].sum())
+            unmet = float(remaining[d].sum())
+            result_demands.append({
+                "demand": dm.get("name") or f"demand_{d + 1}",
+                "resource_role": dm.get("resource_role"),
+                "candidates": int(candidates[d].size),
+                "hours_requested": round(requested, 2),
+                "hours_assigned": round(requested - unmet, 2),
+                "hours_unmet": round(unmet, 2),
+                "coverage": round((requested - unmet) / requested, 4) if requested else 1.0,
+                "unmet_weeks": [str(w) for w in week_start[remaining[d] > 0.01]],
+                "assignments": rows,
+            })
+        return [{
+            "resources_considered": len(resource_ids),
+            "hours_requested": round(float(needs.sum()), 2),
+            "hours_assigned": round(float(needs.sum() - remaining.sum()), 2),
+            "hours_unmet": round(float(remaining.sum()), 2),
+            "local_search_moves": moves,
+            "demands": result_demands,
+        }]
+    except UpstreamOverloaded as e:
+        return _overloaded_error(e)
+    except requests.exceptions.RequestException as e:
+        return [{"error": f"API request failed: {str(e)}"}]
+    except (KeyError, TypeError, ValueError) as e:
+        return [{"error": f"Invalid demand definition: {str(e)}"}]
+    except Exception as e:
+        return [{"error": f"Unexpected error in suggest_staffing: {str(e)}"}]
+
+@mcp.resource("pmo://docs/suggest_staffing")
+def suggest_staffing_doc() -> str:
+    return load_resource_txt("docs_suggest_staffing.txt")
+
+# ================================================================================
+# DATA VERSIONS AND CHANGE NOTIFICATIONS SECTION
+# ================================================================================
+
+COLLECTIONS = {
+    "projects": (projects_snapshot, get_all_projects),
+    "resources": (resources_snapshot, get_all_resources),
+    "business_lines": (business_lines_snapshot, get_business_lines),
+}
+DATA_VERSIONS_URI = "pmo://data/versions"
+# Seconds between background refreshes of every collection (0 = only refresh on demand)
+REFRESH_INTERVAL = float(os.getenv("PMO_REFRESH_INTERVAL", "0"))
+
+# Connected client sessions and resource subscriptions; weak so closed sessions drop out
+_sessions: "weakref.WeakSet[Any]" = weakref.WeakSet()
+_subscriptions: Dict[str, "weakref.WeakSet[Any]"] = {}
+_notify_loop: Optional[asyncio.AbstractEventLoop] = None
+
+class PMOServer(Server):
+    """Low-level MCP server for the FastMCP app that also serves resource subscriptions."""
+
+    def get_capabilities(self, notification_options: NotificationOptions, experimental_capabilities: Dict[str, Dict[str, Any]]) -> types.ServerCapabilities:
+        capabilities = super().get_capabilities(notification_options, experimental_capabilities)
+        if capabilities.resources is not None:
+            capabilities.resources.subscribe = True
+        return capabilities
+
+# The transports run this server; its handlers delegate to the FastMCP app and
+# remember which sessions are connected so data changes can be pushed to them.
+server = PMOServer(mcp.name, instructions=mcp.instructions)
+
+def _remember_session() -> Optional[Any]:
+    global _notify_loop
+    try:
+        session = server.request_context.session
+    except LookupError:
+        return None
+    _sessions.add(session)
+    _notify_loop = asyncio.get_running_loop()
+    return session
+
+def _tracked(handler: Callable[..., Any]) -> Callable[..., Any]:
+    @functools.wraps(handler)
+    async def tracked(*args):
+        _remember_session()
+        return await handler(*args)
+    return tracked
+
+server.list_tools()(_tracked(mcp.list_tools))
+server.call_tool(validate_input=False)(_tracked(mcp.call_tool))
+server.list_resources()(_tracked(mcp.list_resources))
+server.read_resource()(_tracked(mcp.read_resource))
+server.list_resource_templates()(mcp.list_resource_templates)
+server.list_prompts()(mcp.list_prompts)
+server.get_prompt()(mcp.get_prompt)
+
+@server.subscribe_resource()
+async def _subscribe_resource(uri: AnyUrl) -> None:
+    session = _remember_session()
+    if session is not None:
+        _subscriptions.setdefault(str(uri), weakref.WeakSet()).add(session)
+
+@server.unsubscribe_resource()
+async def _unsubscribe_resource(uri: AnyUrl) -> None:
+    session = _remember_session()
+    if session is not None and str(uri) in _subscriptions:
+        _subscriptions[str(uri)].discard(session)
+
+async def _send_change_notifications(uris: List[str]) -> None:
+    # the resource list itself is fixed, so only subscribers of the changed URIs hear about it
+    for session in list(_sessions):
+        try:
+            for uri in uris:
+                if session in _subscriptions.get(uri, ()):
+                    await session.send_resource_updated(AnyUrl(uri))
+        except Exception:
+            _sessions.discard(session)
+
+def _notify_on_change(collection: str):
+    def listener(inserted, updated, deleted) -> None:
+        loop = _notify_loop
+        if loop is None or loop.is_closed():
+            return
+        # may run on the event loop (tool call) or on the refresh thread
+        asyncio.run_coroutine_threadsafe(_send_change_notifications([f"pmo://data/{collection}", DATA_VERSIONS_URI]), loop)
+    return listener
+
+for _name, (_snapshot, _refresh) in COLLECTIONS.items():
+    _snapshot.add_listener(_notify_on_change(_name))
+
+@mcp.resource(DATA_VERSIONS_URI)
+def data_versions() -> str:
+    return json.dumps([snapshot.version_info() for snapshot, _ in COLLECTIONS.values()])
+
+@mcp.resource("pmo://data/projects")
+def projects_version() -> str:
+    return json.dumps(projects_snapshot.version_info())
+
+@mcp.resource("pmo://data/resources")
+def resources_version() -> str:
+    return json.dumps(resources_snapshot.version_info())
+
+@mcp.resource("pmo://data/business_lines")
+def business_lines_version() -> str:
+    return json.dumps(business_lines_snapshot.version_info())
+
+@_tool
+def refresh_pmo_data(collections: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Re-fetch PMO collections (projects, resources, business_lines; default all) and
+    report their data versions. A collection's version only increases when its
+    data actually changed; subscribed clients are notified at the same time.
+    """
+    names = collections or list(COLLECTIONS)
+    unknown = [n for n in names if n not in COLLECTIONS]
+    if unknown:
+        return [{"error": f"Unknown collection(s): {unknown}. Use {list(COLLECTIONS)}"}]
+    result = []
+    for name in names:
+        snapshot, refresh = COLLECTIONS[name]
+        before = snapshot.version
+        rows = refresh()
+        info = snapshot.version_info()
+        info["changed"] = snapshot.version != before
+        if rows and isinstance(rows[0], dict) and "error" in rows[0]:
+            info["error"] = rows[0]["error"]
+        result.append(info)
+    return result
+
+@mcp.resource("pmo://docs/data_versions")
+def data_versions_doc() -> str:
+    return load_resource_txt("docs_data_versions.txt")
+
+def _refresh_forever(interval: float) -> None:
+    while True:
+        time.sleep(interval)
+        for snapshot, refresh in COLLECTIONS.values():
+            refresh()
+
+def start_refresh_poller(interval: float = REFRESH_INTERVAL) -> Optional[threading.Thread]:
+    if interval <= 0:
+        return None
+    thread = threading.Thread(target=_refresh_forever, args=(interval,), name="pmo-refresh", daemon=True)
+    thread.start()
+    return thread
+
+class _ASGIEndpoint:
+    """Wraps an ASGI callable so Starlette routes raw ASGI traffic to it."""
+
+    def __init__(self, app: Callable[..., Any]):
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        await self.app(scope, receive, send)
+
+def _streamable_http_app():
+    from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+    from starlette.applications import Starlette
+    from starlette.routing import Route
+
+    manager = StreamableHTTPSessionManager(app=server, json_response=mcp.settings.json_response, stateless=mcp.settings.stateless_http,
+                                           security_settings=mcp.settings.transport_security)
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        async with manager.run():
+            yield
+
+    return Starlette(routes=[Route(mcp.settings.streamable_http_path, endpoint=_ASGIEndpoint(manager.handle_request))], lifespan=lifespan)
+
+def _sse_app():
+    from mcp.server.sse import SseServerTransport
+    from starlette.applications import Starlette
+    from starlette.routing import Mount, Route
+
+    sse = SseServerTransport(mcp.settings.message_path, security_settings=mcp.settings.transport_security)
+
+    async def handle_sse(scope, receive, send) -> None:
+        async with sse.connect_sse(scope, receive, send) as (read_stream, write_stream):
+            await server.run(read_stream, write_stream, server.create_initialization_options())
+
+    return Starlette(routes=[Route(mcp.settings.sse_path, endpoint=_ASGIEndpoint(handle_sse), methods=["GET"]),
+                             Mount(mcp.settings.message_path, app=sse.handle_post_message)])
+
+async def _run_stdio() -> None:
+    from mcp.server.stdio import stdio_server
+
+    async with stdio_server() as (read_stream, write_stream):
+        await server.run(read_stream, write_stream, server.create_initialization_options())
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="PMO MCP server")
+    parser.add_argument("--transport", choices=["stdio", "streamable-http", "sse"], default="stdio")
+    parser.add_argument("--host", default=mcp.settings.host, help="bind address for the HTTP transports")
+    parser.add_argument("--port", type=int, default=mcp.settings.port, help="port for the HTTP transports")
+    args = parser.parse_args(argv)
+    start_refresh_poller()
+    if args.transport == "stdio":
+        anyio.run(_run_stdio)
+        return
+    import uvicorn
+
+    app = _streamable_http_app() if args.transport == "streamable-http" else _sse_app()
+    uvicorn.run(app, host=args.host, port=args.port, log_level=mcp.settings.log_level.lower())
+
 if __name__ == "__main__":
-    mcp.run()
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1,272 @@
+"""
+Local stand-in for the PMO REST API that pmo.py talks to (normally http://localhost:5000).
+
+Serves deterministic projects, resources, business lines and synthetic
+capacity/allocation series from memory, and lets tests or load runs change the
+data while it is running (update/add/delete) so version tracking and change
+notifications in pmo.py can be exercised without the real backend.
+
+Run standalone:
+    python pmo_stand_in_backend.py --port 5000 --projects 200 --resources 50
+"""
+import argparse
+import datetime
+import json
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+PORTFOLIOS = {
+    "Market & Sell": ["PAS", "NA Industry Performance"],
+    "Vehicles In Use": ["VIN Solutions", "Cross-Product"],
+    "Auto Insights": ["Cross-Product", "Forecasting"],
+}
+ROLES = ["Data Engineer", "Full Stack Developer", "Business Analyst", "Project Manager", "QA Engineer"]
+FIRST_NAMES = ["Jane", "Raj", "Maria", "Chen", "Alex", "Priya", "Tom", "Aisha", "Luca", "Sofia"]
+LAST_NAMES = ["Smith", "Kumar", "Garcia", "Wei", "Brown", "Patel", "Jones", "Khan", "Rossi", "Novak"]
+
+
+def _make_projects(n: int, rnd: random.Random, portfolios: Dict[str, List[str]], first_id: int = 1) -> List[Dict[str, Any]]:
+    rows = []
+    names = list(portfolios)
+    for pid in range(first_id, first_id + n):
+        portfolio = names[pid % len(names)]
+        product_line = portfolios[portfolio][pid % len(portfolios[portfolio])]
+        base = round(rnd.uniform(50_000, 2_000_000), 2)
+        growth = round(rnd.uniform(-0.05, 0.25), 3)
+        start = datetime.date(2025, 1, 1) + datetime.timedelta(days=rnd.randint(0, 300))
+        rows.append({
+            "project_id": pid,
+            "project_name": f"Project {pid:04d}",
+            "strategic_portfolio": portfolio,
+            "product_line": product_line,
+            "project_type": rnd.choice(["Blade Runner", "Run", "Change"]),
+            "vitality": rnd.choice(["YES", "NO"]),
+            "strategic": rnd.choice(["YES", "NO"]),
+            "aim": rnd.choice(["YES", "NO"]),
+            "revenue_est_growth_pa": growth,
+            "revenue_est_current_year": base,
+            "revenue_est_current_year_plus_1": round(base * (1 + growth), 2),
+            "revenue_est_current_year_plus_2": round(base * (1 + growth) ** 2, 2),
+            "revenue_est_current_year_plus_3": round(base * (1 + growth) ** 3, 2),
+            "start_date_est": start.isoformat(),
+            "end_date_est": (start + datetime.timedelta(days=rnd.randint(60, 540))).isoformat(),
+            "current_status": rnd.choice(["Work In Progress", "Not Started", "Completed"]),
+            "rag_status": rnd.choice(["Red", "Amber", "Green", "N/A"]),
+            "technology_project": rnd.choice(["YES", "NO"]),
+            "project_resource_hours_planned": round(rnd.uniform(100, 5000), 1),
+            "project_resource_hours_actual": round(rnd.uniform(0, 5000), 1),
+        })
+    return rows
+
+
+def _make_resources(n: int, rnd: random.Random, portfolios: Dict[str, List[str]], first_id: int = 1) -> List[Dict[str, Any]]:
+    rows = []
+    names = list(portfolios)
+    for rid in range(first_id, first_id + n):
+        first, last = FIRST_NAMES[rid % len(FIRST_NAMES)], LAST_NAMES[(rid // len(FIRST_NAMES)) % len(LAST_NAMES)]
+        portfolio = names[rid % len(names)]
+        rows.append({
+            "resource_id": rid,
+            "resource_name": f"{first} {last} {rid}",
+            "resource_email": f"{first.lower()}.{last.lower()}{rid}@example.com",
+            "resource_type": rnd.choice(["Employee", "Contractor"]),
+            "strategic_portfolio": portfolio,
+            "product_line": portfolios[portfolio][rid % len(portfolios[portfolio])],
+            "manager_name": f"{FIRST_NAMES[(rid + 3) % len(FIRST_NAMES)]} Manager",
+            "resource_role": ROLES[rid % len(ROLES)],
+            "yearly_capacity": 1800,
+        })
+    return rows
+
+
+def allocation_rows(resource_id: int, start_date: str, end_date: str, interval: str = "Weekly") -> List[Dict[str, Any]]:
+    """Deterministic weekly (or monthly) capacity/allocation rows for a resource."""
+    start = datetime.date.fromisoformat(start_date[:10])
+    end = datetime.date.fromisoformat(end_date[:10])
+    rows = []
+    day = start - datetime.timedelta(days=start.weekday())
+    while day <= end:
+        week_end = day + datetime.timedelta(days=6)
+        rnd = random.Random(resource_id * 100_003 + day.toordinal())
+        capacity = 35.0
+        planned = round(capacity * (0.5 + 0.5 * ((resource_id * 7 + day.isocalendar()[1]) % 10) / 10), 1)
+        actual = round(max(0.0, planned + rnd.gauss(resource_id % 3 - 1, 2.0)), 1) if week_end < datetime.date.today() else 0.0
+        rows.append({
+            "week_start": day.isoformat(),
+            "week_end": week_end.isoformat(),
+            "total_capacity": capacity,
+            "allocation_hours_planned": planned,
+            "allocation_hours_actual": actual,
+            "available_capacity": round(capacity - planned, 1),
+        })
+        day = week_end + datetime.timedelta(days=1)
+    if interval.lower() != "weekly":
+        by_month: Dict[str, Dict[str, Any]] = {}
+        for r in rows:
+            month = r["week_start"][:7]
+            agg = by_month.setdefault(month, {"week_start": month + "-01", "week_end": r["week_end"],
+                                              "total_capacity": 0.0, "allocation_hours_planned": 0.0,
+                                              "allocation_hours_actual": 0.0, "available_capacity": 0.0})
+            agg["week_end"] = r["week_end"]
+            for k in ("total_capacity", "allocation_hours_planned", "allocation_hours_actual", "available_capacity"):
+                agg[k] = round(agg[k] + r[k], 1)
+        rows = list(by_month.values())
+    return rows
+
+
+def _matches(row: Dict[str, Any], flt: Dict[str, Any]) -> bool:
+    value, target = row.get(flt.get("column")), flt.get("value")
+    op = flt.get("operator", "=")
+    if op in ("=", "=="):
+        return value == target
+    if op == "!=":
+        return value != target
+    if op.lower() == "in":
+        return value in (target or [])
+    if op.lower() == "like":
+        return str(target).strip("%").lower() in str(value).lower()
+    try:
+        return {"<": value < target, "<=": value <= target, ">": value > target, ">=": value >= target}[op]
+    except (KeyError, TypeError):
+        return False
+
+
+class StandInBackend:
+    """In-memory PMO API served over HTTP on a background thread."""
+
+    def __init__(self, projects: int = 20, resources: int = 10, seed: int = 7,
+                 portfolios: Optional[Dict[str, List[str]]] = None, host: str = "127.0.0.1", port: int = 0,
+                 first_id: int = 1):
+        # first_id lets several instances act as shards of one id space
+        rnd = random.Random(seed)
+        self.portfolios = portfolios or PORTFOLIOS
+        self.projects = _make_projects(projects, rnd, self.portfolios, first_id)
+        self.resources = _make_resources(resources, rnd, self.portfolios, first_id)
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.latency = 0.0
+        backend = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, payload: Any, status: int = 200):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                backend._route(self, "GET")
+
+            def do_POST(self):
+                backend._route(self, "POST")
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StandInBackend":
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # --- data changes -----------------------------------------------------------
+
+    def update_project(self, project_id: int, **fields) -> None:
+        with self.lock:
+            for row in self.projects:
+                if row["project_id"] == project_id:
+                    row.update(fields)
+
+    def add_project(self, row: Dict[str, Any]) -> None:
+        with self.lock:
+            self.projects.append(row)
+
+    def delete_project(self, project_id: int) -> None:
+        with self.lock:
+            self.projects = [r for r in self.projects if r["project_id"] != project_id]
+
+    def update_resource(self, resource_id: int, **fields) -> None:
+        with self.lock:
+            for row in self.resources:
+                if row["resource_id"] == resource_id:
+                    row.update(fields)
+
+    # --- request routing --------------------------------------------------------
+
+    def _route(self, handler, method: str) -> None:
+        if self.latency:
+            threading.Event().wait(self.latency)
+        parsed = urlparse(handler.path)
+        params = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        with self.lock:
+            self.request_count += 1
+            projects = [dict(r) for r in self.projects]
+            resources = [dict(r) for r in self.resources]
+        if method == "GET" and parsed.path == "/business_lines":
+            lines = sorted({(r["strategic_portfolio"], r["product_line"]) for r in projects})
+            return handler._send([{"strategic_portfolio": p, "product_line": l} for p, l in lines])
+        if method == "GET" and parsed.path == "/projects":
+            return handler._send(projects)
+        if method == "GET" and parsed.path == "/resources":
+            return handler._send(resources)
+        if method == "GET" and parsed.path == "/resource_capacity_allocation":
+            try:
+                resource_id = int(params["resource_id"])
+                rows = allocation_rows(resource_id, params["start_date"], params["end_date"],
+                                       params.get("interval", "Weekly"))
+            except (KeyError, ValueError) as e:
+                return handler._send({"error": str(e)}, status=400)
+            # like a real shard, only the resources it holds have allocations
+            if not any(r["resource_id"] == resource_id for r in resources):
+                return handler._send({"error": f"resource {resource_id} not found"}, status=404)
+            return handler._send(rows)
+        if method == "POST" and parsed.path == "/projects/dynamic_filter":
+            length = int(handler.headers.get("Content-Length") or 0)
+            body = json.loads(handler.rfile.read(length) or b"{}")
+            filters = body.get("filters") or []
+            combine = any if str(body.get("logical_operator") or "AND").upper() == "OR" else all
+            rows = [r for r in projects if not filters or combine(_matches(r, f) for f in filters)]
+            fields = body.get("fields") or []
+            if fields and "all_columns" not in fields:
+                keep = {"project_id", "project_name"} | set(fields)
+                rows = [{k: v for k, v in r.items() if k in keep} for r in rows]
+            return handler._send(rows)
+        handler._send({"error": f"no route for {method} {parsed.path}"}, status=404)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the PMO API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--projects", type=int, default=200)
+    parser.add_argument("--resources", type=int, default=50)
+    args = parser.parse_args()
+    backend = StandInBackend(args.projects, args.resources, host=args.host, port=args.port)
+    print(f"PMO stand-in backend listening on {backend.url}", flush=True)
+    try:
+        backend.server.serve_forever()
+    except KeyboardInterrupt:
+        backend.stop()
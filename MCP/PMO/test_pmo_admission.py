@@ -0,0 +1,124 @@
+"""Admission control in front of the upstream PMO API: limits, priority queue, overload."""
+import json
+import threading
+import time
+
+import anyio
+import pytest
+
+import pmo
+from mcp.shared.memory import create_connected_server_and_client_session
+
+
+def _wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_lookups_are_admitted_before_bulk_requests():
+    gate = pmo.EndpointGate("test", limit=1, queue_size=8)
+    gate.acquire()
+    order = []
+
+    def worker(name, priority):
+        gate.acquire(priority)
+        order.append(name)
+        gate.release()
+
+    bulk = threading.Thread(target=worker, args=("bulk", pmo.PRIORITY_BULK))
+    bulk.start()
+    _wait_until(lambda: gate.metrics()["queue_depth"] == 1)
+    lookup = threading.Thread(target=worker, args=("lookup", pmo.PRIORITY_LOOKUP))
+    lookup.start()
+    _wait_until(lambda: gate.metrics()["queue_depth"] == 2)
+
+    gate.release()
+    bulk.join(2)
+    lookup.join(2)
+    assert order == ["lookup", "bulk"]
+    metrics = gate.metrics()
+    assert metrics["active"] == 0 and metrics["admitted"] == 3 and metrics["max_queue_depth"] == 2
+
+
+def test_full_queue_and_expired_wait_fail_fast():
+    gate = pmo.EndpointGate("test", limit=1, queue_size=0)
+    gate.acquire()
+    started = time.monotonic()
+    with pytest.raises(pmo.UpstreamOverloaded, match="already queued"):
+        gate.acquire()
+    assert time.monotonic() - started < 0.1
+
+    gate.queue_size = 1
+    with pytest.raises(pmo.UpstreamOverloaded, match="no slot within"):
+        gate.acquire(timeout=0.05)
+    assert gate.metrics()["rejected"] == 2
+    assert gate.metrics()["queue_depth"] == 0
+
+
+@pytest.fixture
+def one_slot(monkeypatch):
+    """Every endpoint admits a single request and queues none."""
+    monkeypatch.setattr(pmo, "_gates", {})
+    monkeypatch.setattr(pmo, "UPSTREAM_CONCURRENCY", 1)
+    monkeypatch.setattr(pmo, "UPSTREAM_QUEUE_SIZE", 0)
+
+
+def test_tools_report_overload_and_metrics_show_it(one_slot, start_backend):
+    backend = start_backend(projects=4, resources=4)
+    backend.latency = 0.3
+    results = {}
+
+    def call(rid):
+        results[rid] = pmo.get_resource_allocation_planned_actual(rid, "2032-03-01", "2032-03-28", interval="Weekly")
+
+    threads = [threading.Thread(target=call, args=(rid,)) for rid in (1, 2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+
+    overloaded = [r[0] for r in results.values() if r and r[0].get("overloaded")]
+    served = [r for r in results.values() if r and "error" not in r[0]]
+    assert len(overloaded) == 1 and len(served) == 1
+    assert overloaded[0]["retry_after_s"] > 0
+
+    metrics = json.loads(pmo.upstream_metrics())
+    allocation = next(m for m in metrics if m["endpoint"].endswith("/resource_capacity_allocation"))
+    assert allocation["admitted"] == 1 and allocation["rejected"] == 1 and allocation["active"] == 0
+
+
+def test_fan_out_scans_back_off_instead_of_failing(one_slot, start_backend, monkeypatch):
+    monkeypatch.setattr(pmo, "UPSTREAM_WORKERS", 3)
+    backend = start_backend(projects=4, resources=4)
+    backend.latency = 0.1
+    anomalies = pmo.variance_anomalies("2025-01-06", "2025-06-29", resource_ids=[1, 2, 3], z_threshold=0)
+    assert anomalies and not any("error" in a for a in anomalies)
+
+    allocation = next(m for m in json.loads(pmo.upstream_metrics()) if m["endpoint"].endswith("/resource_capacity_allocation"))
+    assert allocation["admitted"] == 3 and allocation["rejected"] >= 1
+
+
+def test_tool_waiting_for_admission_does_not_block_the_event_loop(start_backend, monkeypatch):
+    monkeypatch.setattr(pmo, "_gates", {})
+    monkeypatch.setattr(pmo, "UPSTREAM_CONCURRENCY", 1)
+    backend = start_backend(projects=4, resources=4)
+    gate = pmo._gate(backend.url, "/resource_capacity_allocation")
+    gate.acquire()  # the only slot is taken, so the tool call queues
+
+    async def scenario():
+        async with create_connected_server_and_client_session(pmo.server) as client:
+            async with anyio.create_task_group() as tg:
+                tg.start_soon(client.call_tool, "get_resource_allocation_planned_actual",
+                              {"resource_id": 1, "start_date": "2032-03-01", "end_date": "2032-03-28"})
+                with anyio.fail_after(2):
+                    while gate.metrics()["queue_depth"] == 0:
+                        await anyio.sleep(0.01)
+                started = time.monotonic()
+                await client.send_ping()
+                answered_in = time.monotonic() - started
+                gate.release()
+            return answered_in
+
+    assert anyio.run(scenario) < 1.0
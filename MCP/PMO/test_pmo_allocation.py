@@ -0,0 +1,89 @@
+"""Allocation rollups derived locally from one weekly upstream fetch."""
+import pytest
+
+import pmo
+from pmo_stand_in_backend import allocation_rows
+
+
+@pytest.fixture
+def backend(start_backend):
+    return start_backend(projects=3, resources=4)
+
+
+def _total(rows, measure="allocation_hours_planned"):
+    return sum(r[measure] for r in rows)
+
+
+def test_week_straddling_a_month_boundary_is_split_pro_rata(backend):
+    (week,) = allocation_rows(2, "2030-01-28", "2030-02-03")
+    jan, feb = pmo.get_resource_allocation_planned_actual(2, "2030-01-28", "2030-02-03", interval="Monthly")
+    assert (jan["week_start"], jan["week_end"]) == ("2030-01-28", "2030-01-31")
+    assert (feb["week_start"], feb["week_end"]) == ("2030-02-01", "2030-02-03")
+    for m in pmo.ALLOCATION_MEASURES:
+        assert jan[m] == pytest.approx(week[m] * 4 / 7, abs=0.01)
+        assert feb[m] == pytest.approx(week[m] * 3 / 7, abs=0.01)
+
+
+def test_coarser_intervals_are_clipped_to_the_window_and_keep_totals(backend):
+    start, end = "2030-01-10", "2030-11-20"
+    weekly = pmo.get_resource_allocation_planned_actual(1, start, end, interval="Weekly")
+    monthly = pmo.get_resource_allocation_planned_actual(1, start, end, interval="monthly")
+    quarterly = pmo.get_resource_allocation_planned_actual(1, start, end, interval="Quarterly")
+
+    # weekly rows are upstream weeks, returned whole even where they cross the window edge
+    assert (weekly[0]["week_start"], weekly[-1]["week_end"]) == ("2030-01-07", "2030-11-24")
+    assert _total(weekly) == pytest.approx(_total(allocation_rows(1, start, end)))
+    for rows in (monthly, quarterly):
+        assert (rows[0]["week_start"], rows[-1]["week_end"]) == (start, end)
+    assert len(monthly) == 11 and len(quarterly) == 4
+    assert {r["interval"] for r in monthly} == {"Monthly"}
+    for m in pmo.ALLOCATION_MEASURES:
+        assert _total(monthly, m) == pytest.approx(_total(quarterly, m), abs=0.05)
+    # the partial first and last weeks only count their days inside the window
+    inside = _total(weekly) - weekly[0]["allocation_hours_planned"] * 3 / 7 - weekly[-1]["allocation_hours_planned"] * 4 / 7
+    assert _total(monthly) == pytest.approx(inside, abs=0.05)
+
+
+def test_cumulative_columns_only_on_request(backend):
+    base = pmo.get_resource_allocation_planned_actual(1, "2030-01-07", "2030-03-31", interval="Weekly")
+    full = pmo.get_resource_allocation_planned_actual(1, "2030-01-07", "2030-03-31", interval="Weekly",
+                                                     include_cumulative=True)
+    assert set(base[0]) == {"week_start", "week_end", "interval", *pmo.ALLOCATION_MEASURES}
+    assert set(full[0]) == set(base[0]) | set(pmo.ALLOCATION_CUMULATIVE.values())
+    assert [{k: r[k] for k in base[0]} for r in full] == base
+    for measure, cumulative in pmo.ALLOCATION_CUMULATIVE.items():
+        running = 0.0
+        for row in full:
+            running += row[measure]
+            assert row[cumulative] == pytest.approx(running, abs=0.01)
+
+
+def test_interval_is_chosen_from_the_window_length(backend):
+    def picked(start, end):
+        rows = pmo.get_resource_allocation_planned_actual(3, start, end)
+        assert len(rows) <= pmo.MAX_ALLOCATION_POINTS
+        return rows[0]["interval"]
+
+    assert picked("2030-01-01", "2030-06-30") == "Weekly"
+    assert picked("2030-01-01", "2034-12-31") == "Monthly"
+    assert picked("2030-01-01", "2039-12-31") == "Quarterly"
+    assert picked("2030-01-01", "2049-12-31") == "Yearly"
+
+
+def test_switching_interval_is_answered_from_the_cache(backend):
+    pmo.get_resource_allocation_planned_actual(4, "2030-01-01", "2030-12-31", interval="Weekly")
+    fetched = backend.request_count
+    for interval in ("Monthly", "Quarterly", "Yearly", None):
+        assert "error" not in pmo.get_resource_allocation_planned_actual(4, "2030-01-01", "2030-12-31", interval=interval)[0]
+    # a window inside the cached one is sliced locally as well
+    assert len(pmo.get_resource_allocation_planned_actual(4, "2030-03-01", "2030-03-31", interval="Monthly")) == 1
+    assert backend.request_count == fetched
+
+    pmo.get_resource_allocation_planned_actual(4, "2031-01-01", "2031-03-31")
+    assert backend.request_count == fetched + 1
+
+
+def test_unknown_interval_is_rejected_without_an_upstream_call(backend):
+    result = pmo.get_resource_allocation_planned_actual(1, "2030-01-01", "2030-03-31", interval="Daily")
+    assert "Unsupported interval" in result[0]["error"]
+    assert backend.request_count == 0
@@ -0,0 +1,62 @@
+"""find_resources answered from the hash and word-prefix indexes over the resource snapshot."""
+import pytest
+
+import pmo
+
+
+@pytest.fixture
+def backend(start_backend):
+    return start_backend(projects=3, resources=25, refresh=["resources"])
+
+
+def _ids(rows):
+    return [r["resource_id"] for r in rows]
+
+
+def test_names_resolve_exactly_or_by_word_prefix(backend):
+    before = backend.request_count
+    rows = pmo.find_resources(names=["raj smith 1", "RAJ", "ra ku", "raj.garcia21@example.com", "Nobody Here"])
+    by_query = {}
+    for r in rows:
+        by_query.setdefault(r["query"], []).append(r)
+
+    assert _ids(by_query["raj smith 1"]) == [1]
+    assert sorted(_ids(by_query["RAJ"])) == [1, 11, 21]
+    assert _ids(by_query["ra ku"]) == [11]
+    assert _ids(by_query["raj.garcia21@example.com"]) == [21]
+    assert by_query["Nobody Here"] == [{"query": "Nobody Here", "matches": 0}]
+    assert by_query["raj smith 1"][0]["resource_email"] == "raj.smith1@example.com"
+    assert backend.request_count == before
+
+
+def test_attribute_filters_combine_with_and(backend):
+    engineers = pmo.find_resources(resource_role="data engineer")
+    assert sorted(_ids(engineers)) == [5, 10, 15, 20, 25]
+    assert _ids(pmo.find_resources(resource_role="Data Engineer", strategic_portfolio="market & sell")) == [15]
+    # free-text fields also match on word prefixes
+    assert sorted(_ids(pmo.find_resources(resource_role="engin"))) == [4, 5, 9, 10, 14, 15, 19, 20, 24, 25]
+
+    rows = pmo.find_resources(names=["raj"], resource_role="full stack developer")
+    assert sorted(_ids(rows)) == [1, 11, 21]
+    assert pmo.find_resources(names=["raj"], resource_role="QA Engineer") == [{"query": "raj", "matches": 0}]
+
+
+def test_ids_fields_and_limit(backend):
+    rows = pmo.find_resources(resource_ids=[3, 7, 999], fields=["resource_role", "not_a_column"])
+    # sorted by name: Aisha (7) before Chen (3)
+    assert rows == [{"resource_id": r, "resource_role": pmo.resources_snapshot.rows[r]["resource_role"]} for r in (7, 3)]
+    assert len(pmo.find_resources(strategic_portfolio="Auto Insights", limit=3)) == 3
+
+
+def test_indexes_follow_upstream_changes(backend):
+    backend.update_resource(3, resource_role="Astronaut", resource_name="Zed Quinn 3")
+    pmo.refresh_pmo_data(["resources"])
+    assert _ids(pmo.find_resources(resource_role="astronaut")) == [3]
+    assert 3 not in _ids(pmo.find_resources(resource_role="Project Manager"))
+    assert _ids(pmo.find_resources(names=["zed"])) == [3]
+    assert pmo.find_resources(names=["Maria Smith 3"]) == [{"query": "Maria Smith 3", "matches": 0}]
+
+
+def test_a_lookup_needs_some_criterion(backend):
+    assert "Provide names" in pmo.find_resources()[0]["error"]
+    assert "Provide names" in pmo.find_resources(fields=["resource_role"])[0]["error"]
@@ -0,0 +1,87 @@
+"""forecast_capacity: team demand and capacity projected from planned hours and past actuals."""
+import datetime
+
+import pytest
+
+import pmo
+import pmo_stand_in_backend
+
+AS_OF = "2025-07-07"
+WEEKS = ["2025-07-07", "2025-07-14", "2025-07-21", "2025-07-28"]
+
+
+@pytest.fixture
+def backend(monkeypatch, start_backend):
+    real_rows = pmo_stand_in_backend.allocation_rows
+
+    def overbooked_rows(resource_id, start_date, end_date, interval="Weekly"):
+        rows = real_rows(resource_id, start_date, end_date, interval)
+        for r in rows:
+            if resource_id == 1 and r["week_start"] >= "2025-07-21":
+                r["allocation_hours_planned"] = 40.0
+        return rows
+
+    monkeypatch.setattr(pmo_stand_in_backend, "allocation_rows", overbooked_rows)
+    return start_backend(projects=3, resources=10, refresh=["resources"])
+
+
+def _history(resource_id):
+    start = datetime.date.fromisoformat(AS_OF) - datetime.timedelta(weeks=60)
+    rows = pmo_stand_in_backend.allocation_rows(resource_id, start.isoformat(), "2025-08-03")
+    return {r["week_start"]: r for r in rows}
+
+
+def _expected_demand(resource_id, method):
+    weeks = _history(resource_id)
+    past = [r["allocation_hours_actual"] for w, r in sorted(weeks.items()) if w < AS_OF][-8:]
+    trailing = sum(past) / len(past)
+    demand = []
+    for w in WEEKS:
+        last_year = (datetime.date.fromisoformat(w) - datetime.timedelta(weeks=52)).isoformat()
+        seasonal = weeks[last_year]["allocation_hours_actual"]
+        model = {"trailing": trailing, "seasonal": seasonal, "blend": (trailing + seasonal) / 2}[method]
+        demand.append(max(weeks[w]["allocation_hours_planned"], model))
+    return demand
+
+
+@pytest.mark.parametrize("method", pmo.FORECAST_METHODS)
+def test_demand_follows_the_chosen_model(backend, method):
+    (result,) = pmo.forecast_capacity(periods=4, as_of=AS_OF, resource_ids=[1, 2], method=method, include_series=True)
+    assert result["method"] == method and result["periods"] == 4 and result["as_of"] == AS_OF
+    series = {r["resource_id"]: r["series"] for r in result["resources"]}
+    for rid in (1, 2):
+        assert [w["week_start"] for w in series[rid]] == WEEKS
+        assert [w["forecast_demand"] for w in series[rid]] == pytest.approx(_expected_demand(rid, method), abs=0.01)
+        assert all(w["available_capacity"] == pytest.approx(w["total_capacity"] - w["forecast_demand"], abs=0.01)
+                   for w in series[rid])
+    for j, week in enumerate(result["team"]):
+        assert week["forecast_demand"] == pytest.approx(sum(series[r][j]["forecast_demand"] for r in (1, 2)), abs=0.02)
+        assert week["total_capacity"] == 70.0
+
+
+def test_resources_running_out_of_capacity_come_first(backend):
+    (result,) = pmo.forecast_capacity(periods=4, as_of=AS_OF, resource_ids=[2, 1])
+    first = result["resources"][0]
+    assert first["resource_id"] == 1 and first["first_week_over_capacity"] == "2025-07-21"
+    assert first["weeks_over_capacity"] == 2 and first["min_available_capacity"] == -5.0
+    assert result["resources"][1]["first_week_over_capacity"] is None
+    assert "series" not in first
+    assert [w["resources_over_capacity"] for w in result["team"]] == [0, 0, 1, 1]
+
+
+def test_team_is_selected_by_role_and_portfolio(backend):
+    (qa,) = pmo.forecast_capacity(periods=2, as_of=AS_OF, resource_role="qa engineer")
+    assert sorted(r["resource_id"] for r in qa["resources"]) == [4, 9]
+    (team,) = pmo.forecast_capacity(periods=2, as_of=AS_OF, resource_role="QA Engineer",
+                                    strategic_portfolio="vehicles in use")
+    assert [r["resource_id"] for r in team["resources"]] == [4]
+
+
+@pytest.mark.parametrize("kwargs, message", [
+    ({"method": "arima"}, "Unknown method"),
+    ({"resource_role": "Astronaut"}, "No resources match"),
+    ({"as_of": "2025-02-30"}, "error in forecast_capacity"),
+])
+def test_bad_requests_are_reported(backend, kwargs, message):
+    result = pmo.forecast_capacity(**kwargs)
+    assert len(result) == 1 and message in result[0]["error"]
@@ -0,0 +1,103 @@
+"""Data version tracking and change notifications of the PMO server.
+
+Talks to pmo.py over an in-memory MCP client session.
+"""
+import json
+
+import anyio
+import pytest
+
+import pmo
+from mcp import types
+from mcp.shared.memory import create_connected_server_and_client_session
+
+
+@pytest.fixture
+def backend(start_backend):
+    return start_backend(projects=12, resources=6)
+
+
+def _tool_json(result):
+    return [json.loads(c.text) for c in result.content]
+
+
+def test_version_bumps_only_on_change(backend):
+    pmo.refresh_pmo_data(["projects"])
+    first = pmo.projects_snapshot.version
+
+    unchanged = pmo.refresh_pmo_data(["projects"])[0]
+    assert unchanged["version"] == first
+    assert unchanged["changed"] is False
+
+    backend.update_project(3, rag_status="Red", revenue_est_current_year=1.0)
+    changed = pmo.refresh_pmo_data(["projects"])[0]
+    assert changed["version"] == first + 1
+    assert changed["changed"] is True
+    assert changed["row_count"] == 12
+
+
+def test_subscribers_are_notified_when_refresh_sees_new_data(backend):
+    received = []
+
+    async def on_message(message):
+        if isinstance(message, types.ServerNotification):
+            received.append(message.root)
+
+    async def scenario():
+        async with create_connected_server_and_client_session(pmo.server, message_handler=on_message) as client:
+            await client.subscribe_resource("pmo://data/projects")
+            await client.call_tool("refresh_pmo_data", {"collections": ["projects"]})
+            await anyio.sleep(0.1)
+            received.clear()
+
+            # nothing changed upstream: no notifications
+            await client.call_tool("refresh_pmo_data", {"collections": ["projects"]})
+            await anyio.sleep(0.1)
+            assert received == []
+
+            backend.delete_project(5)
+            result = await client.call_tool("refresh_pmo_data", {"collections": ["projects"]})
+            await anyio.sleep(0.1)
+            versions = await client.read_resource("pmo://data/versions")
+            return _tool_json(result), json.loads(versions.contents[0].text)
+
+    refreshed, versions = anyio.run(scenario)
+
+    updated = [n.params.uri for n in received if isinstance(n, types.ResourceUpdatedNotification)]
+    assert "pmo://data/projects" in {str(u) for u in updated}
+    assert not any(isinstance(n, types.ResourceListChangedNotification) for n in received)
+    assert refreshed[0]["changed"] is True
+    projects = next(v for v in versions if v["collection"] == "projects")
+    assert projects["version"] == refreshed[0]["version"]
+    assert projects["row_count"] == 11
+
+
+def test_initialize_advertises_resource_subscriptions():
+    options = pmo.server.create_initialization_options()
+    assert not options.capabilities.resources.listChanged
+    assert options.capabilities.resources.subscribe is True
+
+
+def test_since_version_returns_only_the_changes(backend):
+    full = pmo.get_all_projects(since_version=0)[0]
+    assert full["full"] is True and len(full["inserted"]) == 12
+    version = full["version"]
+
+    assert pmo.get_all_projects(since_version=version)[0] == {
+        "collection": "projects", "version": version, "since_version": version,
+        "full": False, "inserted": [], "updated": [], "deleted": [],
+    }
+
+    backend.update_project(2, rag_status="Red", current_status="Completed")
+    backend.delete_project(4)
+    backend.add_project(dict(backend.projects[0], project_id=500, project_name="New"))
+    delta = pmo.get_all_projects(since_version=version)[0]
+    assert delta["full"] is False
+    assert delta["version"] == version + 1
+    assert [r["project_id"] for r in delta["inserted"]] == [500]
+    assert [(r["project_id"], r["current_status"]) for r in delta["updated"]] == [(2, "Completed")]
+    assert delta["deleted"] == [4]
+
+    # deltas chain: nothing new since the version just returned
+    again = pmo.get_all_projects(since_version=delta["version"])[0]
+    assert again["inserted"] == again["updated"] == again["deleted"] == []
@@ -0,0 +1,64 @@
+"""What-if reallocation of planned hours between resources."""
+import pytest
+
+import pmo
+from pmo_stand_in_backend import allocation_rows
+
+START, END = "2030-01-07", "2030-02-03"  # four whole weeks
+
+
+@pytest.fixture
+def backend(start_backend):
+    return start_backend(projects=3, resources=4)
+
+
+def _planned(resource_id):
+    return [r["allocation_hours_planned"] for r in allocation_rows(resource_id, START, END)]
+
+
+def test_scenarios_move_hours_and_report_over_allocation(backend):
+    result = pmo.simulate_reallocation(START, END, [
+        {"name": "ten a week", "transfers": [{"from_resource_id": 1, "to_resource_id": 2, "hours_per_week": 10}]},
+        {"transfers": [{"from_resource_id": 1, "to_resource_id": 2, "hours_per_week": 10, "start_date": "2030-01-10"}]},
+        {"name": "everything", "transfers": [{"from_resource_id": 1, "to_resource_id": 2, "hours_per_week": 500}]},
+    ])
+    # both resources are fetched once for all scenarios
+    assert backend.request_count == 2
+
+    ten, partial, everything = result
+    assert ten["scenario"] == "ten a week" and partial["scenario"] == "scenario_2"
+    assert ten["hours_moved"] == 40.0
+    src, dst = ten["resources"]
+    assert (src["resource_id"], dst["resource_id"]) == (1, 2)
+    assert src["allocation_hours_planned_delta"] == -40.0 and dst["allocation_hours_planned_delta"] == 40.0
+    assert dst["allocation_hours_planned_before"] == pytest.approx(sum(_planned(2)))
+    expected_over = sum(max(p + 10 - 35, 0) for p in _planned(2))
+    assert ten["over_allocated_hours_before"] == 0.0
+    assert ten["over_allocated_hours_after"] == pytest.approx(expected_over, abs=0.01)
+    assert dst["over_allocated_weeks_after"] == sum(p + 10 > 35 for p in _planned(2))
+    assert dst["utilization_after"] == pytest.approx((sum(_planned(2)) + 40) / (4 * 35), abs=1e-4)
+
+    # a transfer starting on a Thursday moves 4/7 of the first week
+    assert partial["hours_moved"] == pytest.approx(10 * 4 / 7 + 30, abs=0.01)
+    # never more than the source has planned
+    assert everything["hours_moved"] == pytest.approx(sum(_planned(1)))
+    assert everything["resources"][0]["allocation_hours_planned_after"] == 0.0
+
+
+@pytest.mark.parametrize("scenarios, message", [
+    ([], "at least one scenario"),
+    ([{"name": "idle", "transfers": []}], "no transfers"),
+    ([{"transfers": [{"from_resource_id": 1, "hours_per_week": 5}]}], "Invalid scenario definition"),
+    ([{"transfers": [{"from_resource_id": "one", "to_resource_id": 2}]}], "Invalid scenario definition"),
+])
+def test_bad_scenarios_are_reported(backend, scenarios, message):
+    result = pmo.simulate_reallocation(START, END, scenarios)
+    assert len(result) == 1 and message in result[0]["error"]
+    assert backend.request_count == 0
+
+
+def test_bad_dates_are_reported(backend):
+    result = pmo.simulate_reallocation("2030-13-01", END, [
+        {"transfers": [{"from_resource_id": 1, "to_resource_id": 2, "hours_per_week": 5}]}])
+    assert "Month out of range" in result[0]["error"]
+    assert backend.request_count == 0
@@ -0,0 +1,84 @@
+"""Row-hash snapshots and the revenue cube maintained from their diffs."""
+from collections import defaultdict
+
+import pytest
+
+import pmo
+
+
+def _expected(projects, group_by, horizon=(0, 1, 2, 3)):
+    totals = defaultdict(lambda: {"revenue_total": 0.0, "project_count": 0})
+    for row in projects:
+        acc = totals[tuple(row[d] for d in group_by)]
+        acc["revenue_total"] += sum(row[pmo.REVENUE_HORIZON_FIELDS[h]] for h in horizon)
+        acc["project_count"] += 1
+    return {k: {"revenue_total": round(v["revenue_total"], 2), "project_count": v["project_count"]}
+            for k, v in totals.items()}
+
+
+def test_snapshot_hands_listeners_only_the_changed_rows():
+    snapshot = pmo.CollectionSnapshot("things", "id")
+    seen = []
+    snapshot.add_listener(lambda ins, upd, dele: seen.append((ins, upd, dele)))
+    rows = [{"id": i, "value": i * 10} for i in range(1, 4)]
+
+    assert snapshot.apply(rows)
+    first = snapshot.version
+    assert [r["id"] for r in seen[-1][0]] == [1, 2, 3]
+    assert not snapshot.apply([dict(r) for r in rows])
+    assert snapshot.version == first and len(seen) == 1
+
+    assert snapshot.apply([{"id": 1, "value": 10}, {"id": 2, "value": 21}, {"id": 4, "value": 40}])
+    inserted, updated, deleted = seen[-1]
+    assert [r["id"] for r in inserted] == [4]
+    assert updated == [({"id": 2, "value": 20}, {"id": 2, "value": 21})]
+    assert deleted == [{"id": 3, "value": 30}]
+
+    delta = snapshot.delta(first)
+    assert not delta["full"] and delta["version"] == first + 1
+    assert [r["id"] for r in delta["inserted"]] == [4] and [r["id"] for r in delta["updated"]] == [2]
+    assert delta["deleted"] == [3]
+    assert snapshot.delta(snapshot.floor - 1)["full"] and snapshot.delta(first + 5)["full"]
+
+
+def test_keyless_rows_are_keyed_by_hash():
+    snapshot = pmo.CollectionSnapshot("lines", None)
+    snapshot.apply([{"a": 1}, {"a": 2}])
+    snapshot.apply([{"a": 2}, {"a": 3}])
+    assert sorted(r["a"] for r in snapshot.rows.values()) == [2, 3]
+
+
+def test_revenue_rollup_follows_upstream_changes(start_backend):
+    backend = start_backend(projects=30, resources=3, seed=5, refresh=["projects"])
+
+    by_portfolio = {(r["strategic_portfolio"],): r for r in pmo.revenue_rollup()}
+    expected = _expected(backend.projects, ["strategic_portfolio"])
+    assert {k: {f: r[f] for f in ("revenue_total", "project_count")} for k, r in by_portfolio.items()} == expected
+
+    backend.update_project(4, revenue_est_current_year=0.0, vitality="YES")
+    backend.delete_project(5)
+    pmo.refresh_pmo_data(["projects"])
+    requests_before = backend.request_count
+    rows = pmo.revenue_rollup(group_by=["strategic_portfolio", "vitality"], filters={"vitality": "YES"}, horizon=[0])
+    assert backend.request_count == requests_before
+
+    yes = [r for r in backend.projects if r["vitality"] == "YES"]
+    expected = _expected(yes, ["strategic_portfolio", "vitality"], horizon=(0,))
+    assert {(r["strategic_portfolio"], r["vitality"]): {f: r[f] for f in ("revenue_total", "project_count")}
+            for r in rows} == expected
+    assert all(set(r) >= {"revenue_est_current_year", "avg_revenue_est_growth_pa"} for r in rows)
+    assert "revenue_est_current_year_plus_1" not in rows[0]
+
+    total = pmo.revenue_rollup(group_by=[])
+    assert len(total) == 1 and total[0]["project_count"] == 29
+    assert total[0]["revenue_total"] == pytest.approx(_expected(backend.projects, [])[()]["revenue_total"], abs=0.05)
+
+
+@pytest.mark.parametrize("kwargs, message", [
+    ({"group_by": ["region"]}, "Unknown revenue dimension"),
+    ({"filters": {"colour": "red"}}, "Unknown revenue dimension"),
+    ({"horizon": [4]}, "Horizon year offsets"),
+])
+def test_revenue_rollup_rejects_bad_arguments(kwargs, message):
+    result = pmo.revenue_rollup(**kwargs)
+    assert len(result) == 1 and message in result[0]["error"]
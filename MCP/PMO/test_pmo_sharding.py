@@ -0,0 +1,105 @@
+"""Scatter-gather of the PMO tools across backends sharded by strategic portfolio."""
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import pmo
+
+ROOT = Path(__file__).resolve().parent
+
+
+@pytest.fixture
+def shards(monkeypatch, start_backend):
+    default = start_backend(projects=6, resources=3, portfolios={"Auto Insights": ["Forecasting"]})
+    market = start_backend(projects=5, resources=3, portfolios={"Market & Sell": ["PAS"]}, first_id=1001, default=False)
+    vehicles = start_backend(projects=4, resources=3, portfolios={"Vehicles In Use": ["VIN Solutions"]}, first_id=2001,
+                             default=False)
+    monkeypatch.setattr(pmo, "BACKENDS", {"Market & Sell": market.url, "Vehicles In Use": vehicles.url})
+    # every test starts without known resources, as a freshly started server would
+    pmo.resources_snapshot.apply([])
+    return {"default": default, "market": market, "vehicles": vehicles}
+
+
+def _counts(shards):
+    return {name: b.request_count for name, b in shards.items()}
+
+
+def test_all_projects_are_gathered_from_every_shard_in_id_order(shards):
+    rows = pmo.get_all_projects()
+    ids = [r["project_id"] for r in rows]
+    assert len(ids) == 15
+    assert ids == sorted(ids)
+    assert {r["strategic_portfolio"] for r in rows} == {"Auto Insights", "Market & Sell", "Vehicles In Use"}
+    assert _counts(shards) == {"default": 1, "market": 1, "vehicles": 1}
+
+
+def test_portfolio_filter_is_pushed_down_to_its_shard(shards):
+    rows = pmo.get_filtered_projects(
+        fields=["strategic_portfolio"],
+        filters=[{"column": "strategic_portfolio", "operator": "=", "value": "Vehicles In Use"},
+                 {"column": "project_id", "operator": ">", "value": 2001}],
+    )
+    assert [r["project_id"] for r in rows] == [2002, 2003, 2004]
+    assert _counts(shards) == {"default": 0, "market": 0, "vehicles": 1}
+
+    rows = pmo.get_filtered_projects(filters=[{"column": "strategic_portfolio", "operator": "in",
+                                               "value": ["Market & Sell", "Auto Insights"]}])
+    assert len(rows) == 11
+    assert _counts(shards) == {"default": 1, "market": 1, "vehicles": 1}
+
+
+def test_or_with_other_columns_asks_every_shard(shards):
+    rows = pmo.get_filtered_projects(
+        filters=[{"column": "strategic_portfolio", "operator": "=", "value": "Market & Sell"},
+                 {"column": "rag_status", "operator": "=", "value": "Red"}],
+        logical_operator="OR",
+    )
+    assert all(r["strategic_portfolio"] == "Market & Sell" or r["rag_status"] == "Red" for r in rows)
+    assert _counts(shards) == {"default": 1, "market": 1, "vehicles": 1}
+
+
+def test_allocation_is_routed_to_the_resource_shard(shards):
+    rows = pmo.get_resource_allocation_planned_actual(2002, "2031-01-06", "2031-02-02", interval="Weekly")
+    assert len(rows) == 4 and "error" not in rows[0]
+    # one resource download from each shard to learn the portfolio, then the allocation
+    assert _counts(shards) == {"default": 1, "market": 1, "vehicles": 2}
+
+    rows = pmo.get_resource_allocation_planned_actual(2003, "2031-01-06", "2031-02-02", interval="Weekly")
+    assert "error" not in rows[0]
+    assert _counts(shards) == {"default": 1, "market": 1, "vehicles": 3}
+
+
+def test_unknown_resource_is_an_error_not_a_default_shard_request(shards):
+    (error,) = pmo.get_resource_allocation_planned_actual(999, "2031-01-06", "2031-02-02")
+    assert "Unknown resource_id(s) [999]" in error["error"]
+    assert _counts(shards) == {"default": 1, "market": 1, "vehicles": 1}
+
+
+FRESH_PROCESS = """
+import json, pmo
+print(json.dumps({
+    "allocation": pmo.get_resource_allocation_planned_actual(2002, "2025-03-03", "2025-03-30", interval="Weekly"),
+    "reallocation": pmo.simulate_reallocation("2031-01-06", "2031-02-02", [
+        {"transfers": [{"from_resource_id": 1002, "to_resource_id": 2001, "hours_per_week": 5}]}]),
+    "variance": pmo.variance_anomalies("2025-01-06", "2025-06-29", resource_ids=[2001, 1003], z_threshold=0),
+    "forecast": pmo.forecast_capacity(periods=4, as_of="2025-07-07", resource_ids=[1, 2003]),
+}))
+"""
+
+
+def test_tools_route_by_resource_in_a_fresh_process(shards):
+    env = dict(os.environ, PMO_API_URL=shards["default"].url,
+               PMO_BACKENDS=json.dumps({"Market & Sell": shards["market"].url, "Vehicles In Use": shards["vehicles"].url}))
+    out = subprocess.run([sys.executable, "-c", FRESH_PROCESS], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True, timeout=60).stdout
+    results = json.loads(out.strip().splitlines()[-1])
+    # the stand-in shards answer 404 for resources they do not hold, so any misrouting shows up as an error
+    for name, rows in results.items():
+        assert rows and not any("error" in r for r in rows), (name, rows)
+    assert {r["resource_id"] for r in results["reallocation"][0]["resources"]} == {1002, 2001}
+    assert {r["resource_id"] for r in results["variance"]} == {1003, 2001}
+    assert {r["resource_id"] for r in results["forecast"][0]["resources"]} == {1, 2003}
@@ -0,0 +1,59 @@
+"""Staffing optimizer: greedy assignment, local search repair and the suggest_staffing tool."""
+import numpy as np
+import pytest
+
+import pmo
+
+
+def test_local_search_frees_the_only_candidate_of_a_later_demand():
+    available = np.array([[20.0, 20.0], [10.0, 10.0]])
+    needs = np.array([[10.0, 10.0], [15.0, 15.0]])
+    flexible, pinned = np.array([0, 1]), np.array([0])
+    # the flexible demand goes first and greedily lands on row 0, the pinned demand's only option
+    _, greedy_left, _ = pmo._assign_staffing(available, needs, [flexible, pinned], [0, 1], 2, time_budget=0)
+    assert greedy_left.sum() == 10.0
+
+    assign, remaining, moves = pmo._assign_staffing(available, needs, [flexible, pinned], [0, 1], 2)
+    assert remaining.sum() == 0.0 and moves >= 1
+    used = sum(h for a in assign for h in a.values())
+    assert np.all(assign[1][0] == [15.0, 15.0])
+    assert np.all(used <= available.sum(axis=0))
+
+
+def test_assignments_respect_capacity_limits_and_candidates():
+    rng = np.random.default_rng(3)
+    available = rng.uniform(0, 20, (300, 12))
+    needs = rng.uniform(0, 30, (40, 12))
+    roles = rng.integers(0, 5, 300)
+    pools = [np.flatnonzero(roles == r) for r in range(5)]
+    candidates = [pools[int(rng.integers(0, 5))] for _ in range(40)]
+    assign, remaining, _ = pmo._assign_staffing(available, needs, candidates, list(range(40)), 2)
+    used = np.zeros_like(available)
+    for d, rows in enumerate(assign):
+        assert len(rows) <= 2
+        for r, hours in rows.items():
+            assert r in candidates[d] and np.all(hours >= 0)
+            used[r] += hours
+    assert np.all(used <= available + 1e-9)
+    assert np.allclose(sum((sum(a.values()) if a else 0) for a in assign) + remaining.sum(axis=0), needs.sum(axis=0))
+
+
+def test_suggest_staffing_tool(start_backend):
+    backend = start_backend(projects=5, resources=25, refresh=["resources"])
+    result = pmo.suggest_staffing([
+        {"name": "Pipelines", "resource_role": "data engineer", "hours_per_week": 30,
+         "start_date": "2033-01-03", "end_date": "2033-02-27"},
+        {"name": "QA sweep", "resource_role": "QA Engineer", "hours_per_week": 10,
+         "start_date": "2033-02-01", "end_date": "2033-03-31", "strategic_portfolio": "Market & Sell"},
+        {"name": "Nobody", "resource_role": "Astronaut", "hours_per_week": 5,
+         "start_date": "2033-01-03", "end_date": "2033-01-30"},
+    ])[0]
+    roles = {r["resource_id"]: r for r in backend.resources}
+
+    assert result["hours_assigned"] + result["hours_unmet"] == pytest.approx(result["hours_requested"])
+    pipelines, qa, nobody = result["demands"]
+    assert pipelines["candidates"] == 5 and 0 < len(pipelines["assignments"]) <= 2
+    assert all(roles[a["resource_id"]]["resource_role"] == "Data Engineer" for a in pipelines["assignments"])
+    assert all(roles[a["resource_id"]]["strategic_portfolio"] == "Market & Sell" for a in qa["assignments"])
+    assert nobody["candidates"] == 0 and nobody["hours_assigned"] == 0 and nobody["coverage"] == 0
+    assert len(nobody["unmet_weeks"]) == 4
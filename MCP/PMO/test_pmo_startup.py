@@ -0,0 +1,99 @@
+"""Cold-start budget of the PMO server.
+
+Clients spawn pmo.py over stdio for every query, so the time from process start to
+the `initialize` response is on the critical path. The budget is in seconds and can
+be tuned for slower machines with PMO_STARTUP_BUDGET_S.
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+import zipfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent
+STARTUP_BUDGET_S = float(os.getenv("PMO_STARTUP_BUDGET_S", "1.5"))
+INITIALIZE = {
+    "jsonrpc": "2.0", "id": 1, "method": "initialize",
+    "params": {"protocolVersion": "2025-06-18", "capabilities": {}, "clientInfo": {"name": "startup-test", "version": "0"}},
+}
+
+
+def _time_to_initialize(cmd) -> float:
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=ROOT, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL, text=True)
+    try:
+        proc.stdin.write(json.dumps(INITIALIZE) + "\n")
+        proc.stdin.flush()
+        response = json.loads(proc.stdout.readline())
+        elapsed = time.perf_counter() - start
+    finally:
+        proc.kill()
+        proc.wait()
+    assert response["id"] == 1 and "result" in response
+    return elapsed
+
+
+def _best_of(cmd, runs: int = 3) -> float:
+    return min(_time_to_initialize(cmd) for _ in range(runs))
+
+
+def test_script_starts_within_budget():
+    elapsed = _best_of([sys.executable, "pmo.py"])
+    assert elapsed < STARTUP_BUDGET_S, f"pmo.py took {elapsed:.3f}s to answer initialize (budget {STARTUP_BUDGET_S}s)"
+
+
+def test_pyz_starts_within_budget(tmp_path):
+    from build_pmo_pyz import build
+
+    target = build(str(tmp_path / "pmo.pyz"))
+    elapsed = _best_of([sys.executable, target])
+    assert elapsed < STARTUP_BUDGET_S, f"pmo.pyz took {elapsed:.3f}s to answer initialize (budget {STARTUP_BUDGET_S}s)"
+
+
+def test_pyz_falls_back_to_source_on_another_python(tmp_path):
+    from build_pmo_pyz import build
+
+    built = zipfile.ZipFile(build(str(tmp_path / "pmo.pyz")))
+    assert {"pmo.py", "pmo.pyc"} <= set(built.namelist())
+    # a bytecode magic number no interpreter uses, as if the archive came from another Python
+    foreign = tmp_path / "foreign.pyz"
+    with zipfile.ZipFile(foreign, "w") as out:
+        for name in built.namelist():
+            data = built.read(name)
+            out.writestr(name, b"\x00\x00\r\n" + data[4:] if name == "pmo.pyc" else data)
+    assert _time_to_initialize([sys.executable, str(foreign)]) > 0
+
+
+def test_heavy_modules_are_not_imported_at_startup():
+    code = "import sys, pmo; print(json.dumps(sorted(m for m in ('numpy', 'requests') if m in sys.modules)))"
+    out = subprocess.run([sys.executable, "-c", "import json; " + code], cwd=ROOT,
+                         capture_output=True, text=True, check=True).stdout
+    assert json.loads(out) == []
+
+
+def test_docs_are_cached_until_the_file_changes(tmp_path, monkeypatch):
+    sys.path.insert(0, str(ROOT))
+    import pmo
+
+    (tmp_path / "resources").mkdir()
+    doc = tmp_path / "resources" / "docs_x.txt"
+    doc.write_text("first", encoding="utf-8")
+    monkeypatch.setattr(pmo, "PMO_DIR", str(tmp_path))
+    assert pmo.load_resource_txt("docs_x.txt") == "first"
+
+    opened = []
+    real_open = open
+    monkeypatch.setattr("builtins.open", lambda *a, **k: opened.append(a[0]) or real_open(*a, **k))
+    assert pmo.load_resource_txt("docs_x.txt") == "first"
+    assert opened == []
+
+    doc.write_text("second", encoding="utf-8")
+    os.utime(doc, (time.time() + 5, time.time() + 5))
+    assert pmo.load_resource_txt("docs_x.txt") == "second"
+    with pytest.raises(FileNotFoundError):
+        pmo.load_resource_txt("missing.txt")
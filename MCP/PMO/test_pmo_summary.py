@@ -0,0 +1,46 @@
+"""The materialized portfolio summary matches a recomputation from the raw rows."""
+from collections import Counter
+
+import pmo
+
+
+def _expected(projects, resources, portfolio):
+    p = [r for r in projects if r["strategic_portfolio"] == portfolio]
+    res = [r for r in resources if r["strategic_portfolio"] == portfolio]
+    return {
+        "project_count": len(p),
+        "resource_count": len(res),
+        "revenue_est_current_year": round(sum(r["revenue_est_current_year"] for r in p), 2),
+        "project_resource_hours_planned": round(sum(r["project_resource_hours_planned"] for r in p), 2),
+        "start_date_est_min": min(r["start_date_est"] for r in p),
+        "end_date_est_max": max(r["end_date_est"] for r in p),
+        "rag_status": dict(Counter(r["rag_status"] or "(blank)" for r in p)),
+        "resource_role": dict(Counter(r["resource_role"] for r in res)),
+        "yearly_capacity": float(sum(r["yearly_capacity"] for r in res)),
+    }
+
+
+def test_summary_tracks_changes_incrementally(start_backend):
+    backend = start_backend(projects=40, resources=15, seed=11, refresh=["projects", "resources"])
+
+    backend.update_project(7, rag_status=None, revenue_est_current_year=1.5)
+    backend.delete_project(8)
+    backend.add_project(dict(backend.projects[0], project_id=900, strategic_portfolio="Auto Insights",
+                             product_line="Forecasting", start_date_est="2024-02-01"))
+    backend.update_resource(3, resource_role="QA Engineer", yearly_capacity=900)
+    pmo.refresh_pmo_data(["projects", "resources"])
+
+    summary = pmo.get_portfolio_summary()[0]
+    assert summary["projects_version"] == pmo.projects_snapshot.version
+    assert summary["total"]["project_count"] == 40
+    assert summary["total"]["resource_count"] == 15
+    for entry in summary["portfolios"]:
+        expected = _expected(backend.projects, backend.resources, entry["strategic_portfolio"])
+        assert {k: entry[k] for k in expected} == expected
+        assert sum(line["project_count"] for line in entry["product_lines"]) == entry["project_count"]
+    assert 7 in summary["total"]["projects_missing_data_ids"]
+
+    only = pmo.get_portfolio_summary(strategic_portfolio="Auto Insights", include_product_lines=False)[0]
+    assert [p["strategic_portfolio"] for p in only["portfolios"]] == ["Auto Insights"]
+    assert "product_lines" not in only["portfolios"][0]
+    assert only["portfolios"][0]["start_date_est_min"] == "2024-02-01"
@@ -0,0 +1,61 @@
+"""variance_anomalies: spikes and sustained planned vs actual drift over completed weeks."""
+import pytest
+
+import pmo
+import pmo_stand_in_backend
+
+START, END = "2025-01-06", "2025-12-28"
+DRIFT_WEEKS = [f"2025-{m}" for m in ("05-05", "05-12", "05-19", "05-26", "06-02", "06-09", "06-16", "06-23")]
+
+
+@pytest.fixture
+def backend(monkeypatch, start_backend):
+    real_rows = pmo_stand_in_backend.allocation_rows
+
+    def drifting_rows(resource_id, start_date, end_date, interval="Weekly"):
+        rows = real_rows(resource_id, start_date, end_date, interval)
+        for r in rows:
+            if resource_id == 2 and r["week_start"] == "2025-03-03":
+                r["allocation_hours_actual"] += 30
+            if resource_id == 3 and r["week_start"] in DRIFT_WEEKS:
+                r["allocation_hours_actual"] += 8
+        return rows
+
+    monkeypatch.setattr(pmo_stand_in_backend, "allocation_rows", drifting_rows)
+    return start_backend(projects=3, resources=4, refresh=["resources"])
+
+
+def test_spikes_and_sustained_bias_are_found(backend):
+    anomalies = pmo.variance_anomalies(START, END)
+    scores = [a["score"] for a in anomalies]
+    assert scores == sorted(scores, reverse=True)
+
+    spikes = [a for a in anomalies if a["type"] == "spike"]
+    assert [(a["resource_id"], a["direction"]) for a in spikes] == [(2, "over")]
+    (week,) = spikes[0]["periods"]
+    assert week["week_start"] == "2025-03-03" and week["z_score"] >= 2.5
+    assert week["variance"] == pytest.approx(week["allocation_hours_actual"] - week["allocation_hours_planned"], abs=0.01)
+    assert spikes[0]["resource_name"] == pmo.resources_snapshot.rows[2]["resource_name"]
+
+    drift = [a for a in anomalies if a["type"] == "sustained_bias" and a["resource_id"] == 3]
+    assert len(drift) == 1 and drift[0]["direction"] == "over"
+    weeks = [p["week_start"] for p in drift[0]["periods"]]
+    assert set(DRIFT_WEEKS) <= set(weeks) and drift[0]["run_weeks"] == len(weeks)
+    assert drift[0]["mean_variance"] > 4
+    assert not any(a["resource_id"] in (1, 4) for a in anomalies)
+
+
+def test_selection_thresholds_and_top_n(backend):
+    only_three = pmo.variance_anomalies(START, END, resource_ids=[3])
+    assert {a["resource_id"] for a in only_three} == {3}
+    assert backend.request_count == 2  # the resource snapshot, then one allocation fetch
+
+    assert not [a for a in pmo.variance_anomalies(START, END, resource_ids=[3], min_bias_hours=20)
+                if a["type"] == "sustained_bias"]
+    assert len(pmo.variance_anomalies(START, END, top_n=1)) == 1
+
+
+def test_future_weeks_are_ignored_and_bad_dates_reported(backend):
+    assert pmo.variance_anomalies("2099-01-05", "2099-03-29", resource_ids=[1, 2]) == []
+    result = pmo.variance_anomalies("2025-02-30", END, resource_ids=[1])
+    assert len(result) == 1 and "error" in result[0]